@@ -0,0 +1,56 @@
+import asyncio
+import inspect
+
+from metrics import METRICS, log
+
+
+async def _call_backend(backend, query):
+    if inspect.iscoroutinefunction(backend):
+        return await backend(query)
+    # sync backends (CustomSearch) run in the default thread pool
+    return await asyncio.to_thread(backend, query)
+
+
+async def search_rows(rows, make_query, backend, score, on_result, concurrency=4, bucket=None):
+    """Search every row concurrently and hand results back in input order.
+
+    make_query(row) -> query string
+    backend(query) -> list of CustomSearch-shaped result dicts (sync or async)
+    score(row, results) -> best video dict or None
+    on_result(idx, row, video_info) is called strictly in row order, so the
+    caller can append to its output file as results become contiguous.
+    A failed search is reported as None, like the serial path.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    done = {}
+    next_idx = 0
+
+    async def run(idx, row):
+        async with semaphore:
+            if bucket is not None:
+                await bucket.acquire_async()
+            try:
+                query = make_query(row)
+                results = await _call_backend(backend, query)
+                video_info = score(row, results)
+            except Exception as e:
+                log.warning(f"Search Error: {e}")
+                METRICS.incr('search_errors')
+                video_info = None
+        return idx, row, video_info
+
+    tasks = [asyncio.ensure_future(run(idx, row)) for idx, row in enumerate(rows)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            idx, row, video_info = await finished
+            done[idx] = (row, video_info)
+            while next_idx in done:
+                on_result(next_idx, *done.pop(next_idx))
+                next_idx += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def run_search_rows(*args, **kwargs):
+    return asyncio.run(search_rows(*args, **kwargs))
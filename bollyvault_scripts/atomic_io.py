@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Whole-file writes that readers never see half done. The data goes to a
+# temp file made with mkstemp next to the target and is renamed over it, so
+# processes writing the same file never share a temp name; a failed write
+# removes its temp file and leaves the target as it was.
+
+
+@contextmanager
+def atomic_open(path, mode='w', **kwargs):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp makes the file 0600; the web server has to read what lands in public/
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_atomic(path, data):
+    with atomic_open(path, 'wb') as f:
+        f.write(data)
+
+
+def write_json_atomic(path, payload, **dump_kwargs):
+    # compact unless dump_kwargs say otherwise; a str payload is written as it is
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        if isinstance(payload, str):
+            f.write(payload)
+        else:
+            json.dump(payload, f, **{'ensure_ascii': False, 'separators': (',', ':'), **dump_kwargs})
@@ -0,0 +1,177 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from synthetic_data import write_dataset
+
+# Offline scale benchmarks for the matchers, title similarity and the json
+# export. Each stage runs in a forked child so its peak RSS is its own.
+
+def _run_main(module_name, argv):
+    module = __import__(module_name)
+    old_argv = sys.argv
+    sys.argv = [module_name] + argv
+    try:
+        module.main()
+    finally:
+        sys.argv = old_argv
+
+def stage_deepseek_match(paths, workdir):
+    _run_main('match_movies_to_videos_algo_deepseek', [
+        '--main', paths['movies'], '--video-links', paths['videos'],
+        '--output', os.path.join(workdir, 'deepseek_out.csv')])
+
+def stage_chatgpt_match(paths, workdir):
+    _run_main('match_movies_to_videos_algo_chatgpt', [
+        '--main_csv', paths['movies'], '--video_csv', paths['videos'],
+        '--output_csv', os.path.join(workdir, 'chatgpt_out.csv')])
+
+def stage_title_similarity(paths, workdir):
+    import csv
+    from similarity import score_many
+    with open(paths['movies'], newline='', encoding='utf-8') as f:
+        titles = [row['title'] for row in csv.DictReader(f)]
+    with open(paths['videos'], newline='', encoding='utf-8') as f:
+        results = [row['translated_title_n_desc'][:100] for _, row in zip(range(1000), csv.DictReader(f))]
+    # ten results per search, like one CustomSearch page; score_many only
+    # runs the difflib ratio on results whose LCS bound can still win
+    for i, title in enumerate(titles):
+        start = (i * 10) % max(1, len(results) - 10)
+        score_many(title, results[start:start + 10])
+
+def stage_json_export(paths, workdir):
+    from json_export import export_json
+    export_json(paths['output'], os.path.join(workdir, 'full.json'))
+
+def stage_json_export_incremental(paths, workdir):
+    # times the warm rerun; the cold run that builds the state is untimed
+    from json_export import export_json_incremental
+    target = os.path.join(workdir, 'incremental.json')
+    export_json_incremental(paths['output'], target)
+    return lambda: export_json_incremental(paths['output'], target)
+
+STAGES = {
+    'deepseek_match': stage_deepseek_match,
+    'chatgpt_match': stage_chatgpt_match,
+    'title_similarity': stage_title_similarity,
+    'json_export': stage_json_export,
+    'json_export_incremental': stage_json_export_incremental,
+}
+
+def _child(stage, paths, workdir, conn):
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            start = time.perf_counter()
+            timed = STAGES[stage](paths, workdir)
+            if callable(timed):
+                start = time.perf_counter()
+                timed()
+            seconds = time.perf_counter() - start
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        conn.send({'seconds': round(seconds, 4), 'peak_rss_mb': round(peak_kb / 1024, 1)})
+    except ImportError as e:
+        conn.send({'skipped': f"missing dependency: {e.name}"})
+    except Exception as e:
+        conn.send({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+def run_stage(stage, paths, workdir):
+    ctx = multiprocessing.get_context('fork')
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(stage, paths, workdir, child))
+    proc.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {'error': f"stage process exited with code {proc.exitcode}"}
+    proc.join()
+    return result
+
+def compare(results, baseline, time_threshold, memory_threshold, min_seconds=0.05):
+    """Return a list of human readable regressions against the baseline."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base or 'seconds' not in base or 'seconds' not in current:
+            continue
+        allowed = max(base['seconds'] * (1 + time_threshold), base['seconds'] + min_seconds)
+        if current['seconds'] > allowed:
+            regressions.append(f"{key}: {current['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        if current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + memory_threshold):
+            regressions.append(f"{key}: {current['peak_rss_mb']:.1f}MB vs baseline {base['peak_rss_mb']:.1f}MB")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic data.')
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='Comma separated video row counts, e.g. 1000,10000,100000,1000000')
+    parser.add_argument('--stages', default=','.join(STAGES), help='Comma separated stages to run')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'bollyvault_bench'),
+                        help='Where synthetic datasets are generated and reused')
+    parser.add_argument('--output', default='benchmark_results.json', help='Results json')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='Baseline json to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+    parser.add_argument('--time-threshold', type=float, default=0.2, help='Allowed relative slowdown')
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help='Allowed relative peak RSS growth')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        sys.exit(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for rows in sizes:
+        directory = os.path.join(args.data_dir, str(rows))
+        paths = {name: os.path.join(directory, f'{name}.csv') for name in ('movies', 'videos', 'output')}
+        if not all(os.path.exists(p) for p in paths.values()):
+            print(f"[BENCH] Generating {rows} rows in {directory}")
+            paths = write_dataset(directory, rows)
+        for stage in stages:
+            with tempfile.TemporaryDirectory() as workdir:
+                result = run_stage(stage, paths, workdir)
+            results[f'{stage}@{rows}'] = result
+            print(f"[BENCH] {stage}@{rows}: {result}")
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Wrote {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Saved baseline {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+        for line in regressions:
+            print(f"[REGRESSION] {line}")
+        if regressions:
+            sys.exit(1)
+        print("[BENCH] No regressions against baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import json
+import os
+
+from atomic_io import write_atomic
+from metrics import METRICS, log
+
+# Precomputed shelves and "view all" sort orders for the site, cut into small
+# pages next to bollyvault.json:
+#
+#   bollyvault_shards/manifest.json             {"build", "page_size", "count", "views"}
+#   bollyvault_shards/<view path>-<page>.json   one page of full records
+#
+# Every file is written compact plus .gz (and .br when the brotli module is
+# installed), so Caddy's file_server can send the precompressed copy as is.
+# Files whose bytes did not change are left alone to keep their ETags.
+
+PAGE_SIZE = 50
+
+
+def watch_link(record):
+    # the site calls it watch_link; straight out of the pipeline it is the csv column
+    return record.get('watch_link') or record.get('YouTube Link')
+
+
+def _rating(record):
+    return record.get('imdb_rating') or 0
+
+
+def _title(record):
+    return (record.get('title') or '').casefold()
+
+
+def _year(record):
+    return record.get('year_of_release') or 0
+
+
+# shelves mirror the page's categories; the page picks a random page of each
+SHELVES = {
+    'watch_now': (lambda r: True, None),
+    'top_rated': (lambda r: _rating(r) > 8, lambda r: -_rating(r)),
+    'classic': (lambda r: r.get('movie_era') == 'Classic', None),
+    'golden': (lambda r: r.get('movie_era') == 'Golden', None),
+    'modern': (lambda r: r.get('movie_era') == 'Modern', None),
+}
+
+# "view all" sort orders, movies with a watch link first like sortMovies()
+SORTS = {
+    'title': (_title, False),
+    '-title': (_title, True),
+    'year_of_release': (_year, False),
+    '-year_of_release': (_year, True),
+    '-imdb_rating': (_rating, True),
+}
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _compressed_variants(path, data):
+    variants = [(path + '.gz', gzip.compress(data, 9, mtime=0))]
+    brotli = _brotli()
+    if brotli is not None:
+        variants.append((path + '.br', brotli.compress(data)))
+    return variants
+
+
+def write_precompressed(path, data):
+    """Write data (bytes) and its .gz/.br siblings; return False when nothing changed."""
+    suffixes = ('.gz', '.br') if _brotli() else ('.gz',)
+    if os.path.exists(path) and all(os.path.exists(path + suffix) for suffix in suffixes):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    # compressed copies first, so the plain file is never newer than them
+    for variant_path, payload in _compressed_variants(path, data):
+        write_atomic(variant_path, payload)
+    write_atomic(path, data)
+    return True
+
+
+def precompress_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    for variant_path, payload in _compressed_variants(path, data):
+        write_atomic(variant_path, payload)
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def build_views(records):
+    """view name -> ordered records, for every shelf and sort order."""
+    views = {}
+    watchable = [r for r in records if watch_link(r)]
+    for name, (keep, key) in SHELVES.items():
+        shelf = [r for r in watchable if keep(r)]
+        views['shelf:' + name] = sorted(shelf, key=key) if key else shelf
+    for name, (key, reverse) in SORTS.items():
+        ordered = sorted(records, key=key, reverse=reverse)
+        # stable, so this keeps the sort within both groups
+        views['sort:' + name] = sorted(ordered, key=lambda r: not watch_link(r))
+    return views
+
+
+def shard_dir_for(output_json):
+    return os.path.splitext(output_json)[0] + '_shards'
+
+
+def write_category_shards(records, shard_dir, page_size=PAGE_SIZE):
+    os.makedirs(shard_dir, exist_ok=True)
+    build = hashlib.sha1()
+    manifest_views = {}
+    written = set()
+    changed = 0
+    for view, ordered in build_views(records).items():
+        kind, name = view.split(':', 1)
+        path_prefix = f"{kind}-{name.lstrip('-')}{'_desc' if name.startswith('-') else ''}"
+        pages = max(1, -(-len(ordered) // page_size))
+        for page in range(pages):
+            data = _encode(ordered[page * page_size:(page + 1) * page_size])
+            build.update(data)
+            filename = f'{path_prefix}-{page}.json'
+            written.add(filename)
+            changed += write_precompressed(os.path.join(shard_dir, filename), data)
+        manifest_views[view] = {'path': path_prefix, 'pages': pages, 'count': len(ordered)}
+
+    # pages past the end of a view that shrank
+    for filename in os.listdir(shard_dir):
+        base = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if base.endswith('.json') and base != 'manifest.json' and base not in written:
+            os.remove(os.path.join(shard_dir, filename))
+
+    manifest = {'build': build.hexdigest()[:12], 'page_size': page_size, 'count': len(records),
+                'views': manifest_views}
+    write_precompressed(os.path.join(shard_dir, 'manifest.json'), _encode(manifest))
+    METRICS.gauge('shard_pages', len(written))
+    log.info(f"[SHARDS] {len(written)} pages in {shard_dir} ({changed} rewritten)")
+    return manifest
+
+
+def write_site_files(output_json, records, search_index_path):
+    """Precompress the catalogue and search index, then write the category shards."""
+    precompress_file(output_json)
+    precompress_file(search_index_path)
+    return write_category_shards(records, shard_dir_for(output_json))
@@ -0,0 +1,46 @@
+import json
+import re
+
+# Allow/deny rules for search results, loaded once from a JSON config:
+#
+#   {"allow_channels": ["UC..."], "deny_channels": ["UC..."],
+#    "deny_title_keywords": ["song", "trailer", "review"], "min_duration_seconds": 3600}
+#
+# Channel ids live in sets and the keywords are folded into one compiled
+# pattern, so checking a result costs two hash lookups and one regex search.
+
+
+class ChannelRules:
+    def __init__(self, allow_channels=(), deny_channels=(), deny_title_keywords=(), min_duration_seconds=0):
+        self.allow_channels = frozenset(allow_channels)
+        self.deny_channels = frozenset(deny_channels)
+        self.min_duration_seconds = min_duration_seconds
+        keywords = sorted({k.strip().lower() for k in deny_title_keywords if k.strip()}, key=len, reverse=True)
+        self.deny_title_re = (
+            re.compile(r'\b(?:' + '|'.join(re.escape(k) for k in keywords) + r')\b', re.IGNORECASE)
+            if keywords else None)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        unknown = set(config) - {'allow_channels', 'deny_channels', 'deny_title_keywords', 'min_duration_seconds'}
+        if unknown:
+            raise ValueError(f"Unknown keys in {path}: {', '.join(sorted(unknown))}")
+        return cls(**config)
+
+    def is_allowed(self, channel_id):
+        return channel_id in self.allow_channels
+
+    def reject_reason(self, channel_id, title, duration_sec):
+        """Why a result is ruled out before scoring, or None if it is a candidate."""
+        if channel_id in self.deny_channels:
+            return 'denied channel'
+        if self.deny_title_re is not None:
+            match = self.deny_title_re.search(title)
+            if match:
+                return f"title keyword {match.group(0).lower()!r}"
+        # allow-listed channels are trusted to upload full movies
+        if duration_sec < self.min_duration_seconds and channel_id not in self.allow_channels:
+            return 'too short'
+        return None
@@ -0,0 +1,77 @@
+import csv
+import json
+import os
+
+from atomic_io import atomic_open
+
+
+class CheckpointedCSVWriter:
+    """CSV writer that flushes in batches and records a resume checkpoint.
+
+    Callers report finished units of work with mark(next_index, state_fn).
+    Every `batch_size` marks the buffered rows are written and fsynced, then
+    a checkpoint {next_index, offset, state} is written atomically. offset is
+    the output size at that point, so a resumed run first truncates any rows
+    written after the last checkpoint and then continues from next_index.
+    """
+
+    def __init__(self, path, header, batch_size=500, checkpoint_path=None, resume=False):
+        self.path = path
+        self.header = header
+        self.batch_size = max(1, batch_size)
+        self.checkpoint_path = checkpoint_path or path + '.ckpt'
+        self.checkpoint = None
+        if resume and os.path.exists(self.checkpoint_path) and os.path.exists(path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                self.checkpoint = json.load(f)
+
+        if self.checkpoint is not None:
+            self._f = open(path, 'r+', newline='', encoding='utf-8')
+            self._f.truncate(self.checkpoint['offset'])
+            self._f.seek(self.checkpoint['offset'])
+        else:
+            self._f = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._f)
+        self._dict_writer = csv.DictWriter(self._f, fieldnames=header)
+        if self.checkpoint is None:
+            self._writer.writerow(header)
+        self._rows = []
+        self._pending = 0
+
+    @property
+    def next_index(self):
+        return self.checkpoint['next_index'] if self.checkpoint else 0
+
+    @property
+    def state(self):
+        return self.checkpoint['state'] if self.checkpoint else None
+
+    def writerow(self, row):
+        self._rows.append(row)
+
+    def mark(self, next_index, state_fn):
+        # state_fn is only called when a checkpoint is actually written
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush(next_index, state_fn())
+
+    def flush(self, next_index, state):
+        for row in self._rows:
+            if isinstance(row, dict):
+                self._dict_writer.writerow(row)
+            else:
+                self._writer.writerow(row)
+        self._rows = []
+        self._pending = 0
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.checkpoint = {'next_index': next_index, 'offset': self._f.tell(), 'state': state}
+        with atomic_open(self.checkpoint_path, 'w', encoding='utf-8') as f:
+            json.dump(self.checkpoint, f)
+
+    def close(self, next_index, state_fn=None, completed=True):
+        self.flush(next_index, state_fn() if state_fn else None)
+        self._f.close()
+        # a finished run leaves no checkpoint behind
+        if completed and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
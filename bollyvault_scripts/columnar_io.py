@@ -0,0 +1,66 @@
+import json
+import os
+
+from atomic_io import atomic_open, write_json_atomic
+from metrics import log
+
+# Binary intermediates between pipeline stages. CSV stays the exchange format
+# at the edges; these files are derived caches that a rerun can load without
+# re-parsing text, and they are rebuilt whenever their source CSV changes.
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _meta_path(parquet_path):
+    return parquet_path + '.meta'
+
+
+def read_parquet_if_fresh(parquet_path, source_path, variant=''):
+    """Return the cached frame if it was built from source_path as it is now, else None."""
+    if not (parquet_path and os.path.exists(parquet_path) and os.path.exists(_meta_path(parquet_path))):
+        return None
+    if not have_pyarrow():
+        return None
+    with open(_meta_path(parquet_path), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta != {'source': source_signature(source_path), 'variant': variant}:
+        return None
+    import pandas as pd
+    return pd.read_parquet(parquet_path)
+
+
+def write_parquet(df, parquet_path, source_path, variant=''):
+    if not have_pyarrow():
+        log.warning("[COLUMNAR] pyarrow is not installed, skipping %s", parquet_path)
+        return False
+    # drop the meta first and write it last, so a crash in between leaves a
+    # cache that is never trusted
+    if os.path.exists(_meta_path(parquet_path)):
+        os.remove(_meta_path(parquet_path))
+    with atomic_open(parquet_path, 'wb') as f:
+        df.to_parquet(f, index=False)
+    write_json_atomic(_meta_path(parquet_path), {'source': source_signature(source_path), 'variant': variant})
+    return True
+
+
+def load_frame_cached(source_path, parquet_path, build, variant=''):
+    """build(source_path) -> frame, served from parquet_path while the source is unchanged."""
+    df = read_parquet_if_fresh(parquet_path, source_path, variant)
+    if df is not None:
+        log.info("[COLUMNAR] Loaded %d rows from %s", len(df), parquet_path)
+        return df
+    df = build(source_path)
+    if parquet_path:
+        write_parquet(df, parquet_path, source_path, variant)
+    return df
@@ -1,49 +1,175 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import codecs
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from metrics import METRICS, log
+from rate_limit import TokenBucket
+from poster_cache import PosterCache
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# the body past og:image is still read up to this many bytes: closing a response
+# with unread body makes urllib3 drop the socket, so only a fully read page
+# hands its keep-alive connection back to the pool
+DRAIN_LIMIT = 512 * 1024
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract IMDb poster urls from title pages.')
+    parser.add_argument('--input', default='imdb_links.txt', help='One IMDb title url per line')
+    parser.add_argument('--output', default='imdb_posters_500px.txt', help='Tab separated url/poster output')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent page fetches')
+    parser.add_argument('--rate', type=float, default=1.0, help='Global request rate limit per second')
+    parser.add_argument('--cache-db', default='imdb_posters_cache.sqlite', help='Poster metadata cache')
+    parser.add_argument('--no-cache', action='store_true', help='Fetch every title page unconditionally')
+    parser.add_argument('--max-age-days', type=float, default=30,
+                        help='Cached posters older than this are revalidated with a conditional GET')
+    parser.add_argument('--negative-max-age-hours', type=float, default=24,
+                        help='Pages without a poster are requested again after this long')
+    metrics.add_arguments(parser)
+    return parser.parse_args()
 
 def extract_imdb_id(url):
     match = re.search(r'/title/(tt\d+)', url)
     return match.group(1) if match else None
 
-def get_modified_poster_url(imdb_url, width=500):
-    headers = {'User-Agent': 'Mozilla/5.0'}
+def make_session(pool_size=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+class OgImageScanner(HTMLParser):
+    # stops caring about the page once og:image is seen or <head> is over
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.og_image = None
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta' and self.og_image is None:
+            attrs = dict(attrs)
+            if attrs.get('property') == 'og:image' and attrs.get('content'):
+                self.og_image = attrs['content']
+                self.done = True
+        elif tag == 'body':
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.done = True
+
+def scan_og_image(chunks, encoding='utf-8'):
+    # feeds byte chunks until og:image is found and leaves the rest of them to the caller
+    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    scanner = OgImageScanner()
+    for chunk in chunks:
+        scanner.feed(decoder.decode(chunk))
+        if scanner.done:
+            break
+    return scanner.og_image
+
+def drain(chunks, limit=DRAIN_LIMIT):
+    # True if the body ended within limit bytes and the connection can be reused
+    read = 0
+    for chunk in chunks:
+        read += len(chunk)
+        if read > limit:
+            return False
+    return True
+
+def modify_poster_url(original_url):
+    # Modify the URL to request the desired width
+    return re.sub(r'\._V1_.*?(\.jpg)$', f'._V1_UX384_.jpg', original_url)
+
+def get_modified_poster_url(imdb_url, width=500, session=None, cache=None, bucket=None):
+    session = session or make_session(1)
+    imdb_id = extract_imdb_id(imdb_url) if cache else None
+    entry = cache.get(imdb_id) if imdb_id else None
+    if entry and cache.is_fresh(entry):
+        cache.count('fresh')
+        return entry['poster_url']
+
+    headers = {}
+    if entry:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    if bucket:
+        bucket.acquire()  # Be polite and avoid overwhelming the server
+    log.debug(f"[POSTERS] Fetching {imdb_url}")
     try:
-        response = requests.get(imdb_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        meta_tag = soup.find('meta', property='og:image')
-        if meta_tag and meta_tag.get('content'):
-            original_url = meta_tag['content']
-            # Modify the URL to request the desired width
-            modified_url = re.sub(r'\._V1_.*?(\.jpg)$', f'._V1_UX384_.jpg', original_url)
-            return modified_url
-        else:
-            print(f"No og:image found for {imdb_url}")
-            return None
+        with session.get(imdb_url, headers=headers, timeout=10, stream=True) as response:
+            if response.status_code == 304 and entry:
+                cache.touch(imdb_id)
+                cache.count('not_modified')
+                return entry['poster_url']
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=8192)
+            original_url = scan_og_image(chunks, response.encoding)
+            if not drain(chunks):
+                METRICS.incr('poster_pages_cut_off')
+            validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        modified_url = modify_poster_url(original_url) if original_url else None
+        if imdb_id:
+            cache.put(imdb_id, modified_url, *validators)
+            cache.count('fetched')
+        if not modified_url:
+            log.debug(f"[POSTERS] No og:image found for {imdb_url}")
+        return modified_url
     except Exception as e:
-        print(f"Error processing {imdb_url}: {e}")
-        return None
+        log.warning(f"[POSTERS] Error processing {imdb_url}: {e}")
+        # a failed revalidation keeps serving the last known poster
+        return entry['poster_url'] if entry else None
+
+def extract_posters(urls, workers=4, rate=1.0, session=None, cache=None):
+    """Yield (url, poster url or None) in input order."""
+    session = session or make_session(workers)
+    bucket = TokenBucket(rate, capacity=workers)
+
+    def fetch(imdb_url):
+        # cache hits never take a rate-limit token
+        return imdb_url, get_modified_poster_url(imdb_url, width=500, session=session,
+                                                 cache=cache, bucket=bucket)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(fetch, urls)
 
 def main():
-    input_file = 'imdb_links.txt'
-    output_file = 'imdb_posters_500px.txt'
-
-    with open(input_file, 'r', encoding='utf-8') as infile, \
-         open(output_file, 'w', encoding='utf-8') as outfile:
-        for line in infile:
-            imdb_url = line.strip()
-            if not imdb_url:
-                continue
-            print(f"Processing: {imdb_url}")
-            poster_url = get_modified_poster_url(imdb_url, width=500)
+    args = parse_args()
+    metrics.setup(args)
+
+    with open(args.input, 'r', encoding='utf-8') as infile:
+        urls = [line.strip() for line in infile if line.strip()]
+
+    cache = None if args.no_cache else PosterCache(args.cache_db, max_age=args.max_age_days * 86400,
+                                                   negative_max_age=args.negative_max_age_hours * 3600)
+
+    with METRICS.stage('posters'), open(args.output, 'w', encoding='utf-8') as outfile:
+        for imdb_url, poster_url in extract_posters(urls, args.workers, args.rate, cache=cache):
             if poster_url:
                 outfile.write(f"{imdb_url}\t{poster_url}\n")
+                METRICS.incr('posters_found')
             else:
                 outfile.write(f"{imdb_url}\tNo poster found\n")
-            time.sleep(1)  # Be polite and avoid overwhelming the server
+                METRICS.incr('posters_missing')
+    log.info(f"[POSTERS] {METRICS.counters.get('posters_found', 0)} of {len(urls)} titles have a poster")
+
+    if cache:
+        for outcome, count in cache.counts.items():
+            METRICS.incr('poster_cache_' + outcome, count)
+        log.info(f"[CACHE] fresh={cache.counts['fresh']} not_modified={cache.counts['not_modified']} "
+                 f"fetched={cache.counts['fetched']}")
+        cache.close()
+    metrics.finish(args)
 
 if __name__ == "__main__":
     main()
-
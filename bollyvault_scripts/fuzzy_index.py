@@ -0,0 +1,176 @@
+import json
+import os
+import random
+import re
+import zlib
+from collections import defaultdict
+
+from atomic_io import write_json_atomic
+from metrics import log
+from text_normalize import TOKEN_RE, build_token_index
+
+# Approximate title matching for the matchers' --fuzzy mode.
+#
+# Every distinct word of the video descriptions gets a MinHash signature over
+# its character trigrams, and an LSH banding index maps signatures to buckets.
+# A title word's spelling variants ("dulhania" / "dulhaniya") are then the
+# vocabulary words sharing a bucket with it, verified by exact trigram
+# Jaccard, so no movie is ever compared against every video. A video is a
+# fuzzy candidate when it contains every title word or one of its variants,
+# in order, as a phrase.
+#
+# The index is kept next to the video csv as plain JSON: its settings and,
+# per word, one 64-bit key per band. Loading it refills the buckets from
+# those keys without hashing a single trigram again.
+
+INDEX_VERSION = 2
+MERSENNE = (1 << 61) - 1
+KEY_MASK = (1 << 64) - 1
+
+
+def shingles(token, k=3):
+    padded = f'^{token}$'
+    return {padded[i:i + k] for i in range(max(1, len(padded) - k + 1))}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashLSH:
+    """LSH over single words; bands * rows MinHash values per word."""
+
+    def __init__(self, bands=8, rows=2, k=3, min_length=4, seed=1):
+        self.settings = {'bands': bands, 'rows': rows, 'k': k, 'min_length': min_length, 'seed': seed}
+        self.bands = bands
+        self.rows = rows
+        self.k = k
+        # shorter words ("le", "se", "2") only ever match exactly
+        self.min_length = min_length
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE), rng.randrange(MERSENNE)) for _ in range(bands * rows)]
+        self._buckets = defaultdict(list)
+        self._tokens = {}  # token -> its band keys
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def _band_keys(self, token):
+        hashed = [zlib.crc32(s.encode('utf-8')) for s in shingles(token, self.k)]
+        signature = [min((a * x + b) % MERSENNE for x in hashed) for a, b in self._perms]
+        keys = []
+        for band in range(self.bands):
+            # a band's rows folded into one int; a rare collision only costs a Jaccard check
+            key = 0
+            for value in signature[band * self.rows:(band + 1) * self.rows]:
+                key = (key * MERSENNE + value) & KEY_MASK
+            keys.append(key)
+        return keys
+
+    def _insert(self, token, keys):
+        self._tokens[token] = keys
+        for band, key in enumerate(keys):
+            self._buckets[band, key].append(token)
+
+    def add(self, token):
+        if token in self._tokens or len(token) < self.min_length or token.isdigit():
+            return False
+        self._insert(token, self._band_keys(token))
+        return True
+
+    def update(self, tokens):
+        return sum(self.add(token) for token in tokens)
+
+    def query(self, token):
+        if len(token) < self.min_length or token.isdigit():
+            return set()
+        found = set()
+        for band, key in enumerate(self._band_keys(token)):
+            found.update(self._buckets.get((band, key), ()))
+        return found
+
+    def variants(self, token, threshold, vocabulary):
+        """{word: similarity} for word itself (if present) and its verified near spellings."""
+        found = {token: 1.0} if token in vocabulary else {}
+        base = shingles(token, self.k)
+        for other in self.query(token):
+            if other != token:
+                similarity = jaccard(base, shingles(other, self.k))
+                if similarity >= threshold:
+                    found[other] = similarity
+        return found
+
+    def save(self, path):
+        write_json_atomic(path, {'version': INDEX_VERSION, 'settings': self.settings, 'tokens': self._tokens})
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        if not isinstance(payload, dict) or payload.get('version') != INDEX_VERSION:
+            raise ValueError(f"{path} was written by another fuzzy index version")
+        lsh = cls(**payload['settings'])
+        for token, keys in payload['tokens'].items():
+            if len(keys) != lsh.bands or not all(isinstance(key, int) for key in keys):
+                raise ValueError(f"{path} has a malformed entry for {token!r}")
+            lsh._insert(token, keys)
+        return lsh
+
+
+def load_or_build(path, texts):
+    """The persisted LSH for these texts' vocabulary, extended with any new words and saved."""
+    lsh = None
+    if path and os.path.exists(path):
+        try:
+            lsh = MinHashLSH.load(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning(f"[FUZZY] Rebuilding {path}: {e}")
+            lsh = None
+    lsh = lsh or MinHashLSH()
+    vocabulary = set()
+    for text in texts:
+        vocabulary.update(TOKEN_RE.findall(text))
+    added = lsh.update(vocabulary)
+    if path and added:
+        lsh.save(path)
+    return lsh, added
+
+
+class FuzzyCandidates:
+    """Fuzzy title lookups over one set of videos (a VideoStore or a shard of it)."""
+
+    def __init__(self, videos, lsh, threshold=0.5, index=None):
+        self.videos = videos
+        self.lsh = lsh
+        self.threshold = threshold
+        self.index = build_token_index(videos.texts()) if index is None else index
+
+    def search(self, title):
+        """[(video_idx, similarity)] for videos containing the title up to spelling variants."""
+        words = TOKEN_RE.findall(title)
+        if not words:
+            return []
+        variants = [self.lsh.variants(word, self.threshold, self.index) for word in words]
+        if not all(variants):
+            return []
+
+        candidates = None
+        for word_variants in sorted(variants, key=len):
+            ids = set()
+            for variant in word_variants:
+                ids.update(self.index.get(variant, ()))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        pattern = re.compile(r'\b' + r'\W+'.join(
+            '(?:' + '|'.join(re.escape(v) for v in sorted(word_variants, key=len, reverse=True)) + ')'
+            for word_variants in variants) + r'\b')
+        found = []
+        for video_idx in sorted(candidates):
+            match = pattern.search(self.videos.text(video_idx))
+            if match:
+                matched = TOKEN_RE.findall(match.group(0))
+                similarity = sum(v.get(m, 0.0) for v, m in zip(variants, matched)) / len(variants)
+                found.append((video_idx, similarity))
+        return found
@@ -0,0 +1,70 @@
+import json
+import os
+
+from atomic_io import atomic_open
+
+# The image manifest poster_images.py writes, and the helpers the json
+# export uses to point records at the local copies. Kept apart from the
+# downloader so the export needs neither requests nor Pillow.
+#
+#   {"version", "settings": {"widths", "quality", "webp"},
+#    "images": {source url: {"etag", "last_modified", "checked_at", "sha256",
+#                            "files": [[width, name], ...]}}}
+
+MANIFEST_VERSION = 1
+IMAGE_COLUMNS = ['poster_path', 'poster_path_alt', 'Thumbnail']
+DEFAULT_WIDTH = 320  # 2x a card on the page
+
+
+def load_manifest(path, settings=None):
+    manifest = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            manifest = None
+    manifest = manifest or {'version': MANIFEST_VERSION, 'settings': settings, 'images': {}}
+    if settings is not None and manifest['settings'] != settings:
+        # other widths or quality: every source has to be fetched and resized again
+        for entry in manifest['images'].values():
+            entry['files'] = []
+        manifest['settings'] = settings
+    return manifest
+
+
+def save_manifest(path, manifest):
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def missing_files(manifest, directory):
+    """Names the manifest refers to that are not in directory, e.g. deleted or pruned by hand."""
+    return sorted({name for entry in manifest['images'].values() for _, name in entry['files']
+                   if not os.path.exists(os.path.join(directory, name))})
+
+
+def image_fields(entry, url_prefix, default_width=DEFAULT_WIDTH):
+    """(src, srcset) for one manifest entry; srcset is '' for unresized copies."""
+    files = sorted(entry['files'])
+    if not files:
+        return None, ''
+    fitting = [name for width, name in files if width >= default_width]
+    src = url_prefix + (fitting[0] if fitting else files[-1][1])
+    srcset = ', '.join(f"{url_prefix}{name} {width}w" for width, name in files if width)
+    return src, srcset
+
+
+def apply_image_manifest(records, manifest, url_prefix='/img/', columns=IMAGE_COLUMNS):
+    """Point the records' image columns at the local copies; adds <column>_srcset. Returns replacements."""
+    images = manifest['images']
+    replaced = 0
+    for record in records:
+        for column in columns:
+            entry = images.get(record.get(column))
+            src, srcset = image_fields(entry, url_prefix) if entry else (None, '')
+            if src:
+                record[column] = src
+                replaced += 1
+            if column in record:
+                record[column + '_srcset'] = srcset
+    return replaced
@@ -0,0 +1,222 @@
+import csv
+import hashlib
+import heapq
+import json
+import os
+from collections import defaultdict
+
+from atomic_io import atomic_open, write_json_atomic
+
+# Incremental matching for daily video scrapes. Next to its output csv a run
+# keeps its candidate state as JSON (<output>.candidates): every video's url
+# and content digest, each movie's candidates by url and the greedy assignment.
+# The next run diffs the video table against it, searches for candidates only
+# among new and changed rows, and replays the greedy pass only for movies
+# whose candidates changed and, in turn, for the movies that competed with
+# them for a video. Anything the diff cannot express (another movie list,
+# other options, reordered rows) means a full run.
+#
+# The greedy pass gives each movie, in matching order, its most preferred
+# candidate no earlier movie took. A rank(row, score) sort key says which is
+# most preferred; by default the highest score, then the earliest row.
+
+STATE_VERSION = 2
+
+
+def video_digest(text, year):
+    return hashlib.blake2b(f'{year}\0{text}'.encode('utf-8'), digest_size=8).digest()
+
+
+def by_score_then_row(row, score):
+    return -score, row
+
+
+def movies_signature(movies):
+    # (title, year) pairs in matching order
+    sha = hashlib.sha256()
+    for title, year in movies:
+        sha.update(f'{title}\t{year}\n'.encode('utf-8'))
+    return sha.hexdigest()
+
+
+class VideoDelta:
+    def __init__(self, urls, digests, positions, rows, dropped):
+        self.urls = urls            # row -> url, for the current videos
+        self.digests = digests
+        self.positions = positions  # url -> row
+        self.rows = rows            # new rows and rows whose text or year changed
+        self.dropped = dropped      # urls whose previous candidates no longer hold
+
+
+class MatchState:
+    def __init__(self, signature, options, urls, digests, candidates, best):
+        self.signature = signature
+        self.options = options
+        self.urls = urls
+        self.digests = digests
+        self.candidates = candidates  # movie idx -> [(url, score, year_match)] in row order
+        self.best = best              # movie idx -> url or None
+
+    @classmethod
+    def from_run(cls, signature, options, videos, candidates, best):
+        """State of a finished full run; candidates and best hold row numbers."""
+        urls, digests = [], []
+        for url, text, year in videos.rows():
+            urls.append(url)
+            digests.append(video_digest(text, year))
+        return cls(signature, options, urls, digests,
+                   {movie_idx: [(urls[row], score, year_match) for row, score, year_match in found]
+                    for movie_idx, found in sorted(candidates.items())},
+                   {movie_idx: None if row is None else urls[row] for movie_idx, row in best.items()})
+
+    def save(self, path):
+        write_json_atomic(path, {
+            'version': STATE_VERSION, 'signature': self.signature, 'options': self.options,
+            'urls': self.urls, 'digests': [digest.hex() for digest in self.digests],
+            'candidates': sorted(self.candidates.items()), 'best': sorted(self.best.items()),
+        })
+
+    @classmethod
+    def load(cls, path, signature, options):
+        """The saved state if it was made for these movies and options (a JSON-like dict), else None."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(payload, dict) or payload.get('version') != STATE_VERSION
+                or payload['signature'] != signature or payload['options'] != options):
+            return None
+        return cls(signature, options, payload['urls'], [bytes.fromhex(digest) for digest in payload['digests']],
+                   {movie_idx: [tuple(candidate) for candidate in found]
+                    for movie_idx, found in payload['candidates']},
+                   dict(payload['best']))
+
+    def diff(self, videos):
+        """VideoDelta against the current videos, or None when rows were reordered or a url repeats."""
+        previous = {url: (pos, digest) for pos, (url, digest) in enumerate(zip(self.urls, self.digests))}
+        urls, digests, positions, rows, dropped = [], [], {}, [], set()
+        last = -1
+        for row, (url, text, year) in enumerate(videos.rows()):
+            if url in positions:
+                return None
+            digest = video_digest(text, year)
+            urls.append(url)
+            digests.append(digest)
+            positions[url] = row
+            old = previous.get(url)
+            if old is None:
+                rows.append(row)
+                continue
+            # ties between candidates go to the earlier row, so the old rows must keep their order
+            if old[0] < last:
+                return None
+            last = old[0]
+            if old[1] != digest:
+                rows.append(row)
+                dropped.add(url)
+        dropped.update(url for url in previous if url not in positions)
+        return VideoDelta(urls, digests, positions, rows, dropped)
+
+    def update(self, delta, found, rank=by_score_then_row):
+        """Merge the candidates found among delta.rows and replay the greedy pass.
+
+        found: movie idx -> [(row, score, year_match)] for the new and changed rows.
+        Returns (candidates, best, used, affected) in current row numbers, where
+        affected are the movies whose output row has to be written again.
+        """
+        positions = delta.positions
+        candidates, dirty = {}, set()
+        for movie_idx, old in self.candidates.items():
+            added = found.get(movie_idx, [])
+            if added or any(url in delta.dropped for url, _, _ in old):
+                merged = sorted([(positions[url], score, year_match) for url, score, year_match in old
+                                 if url not in delta.dropped] + added)
+                if [(delta.urls[row], score, year_match) for row, score, year_match in merged] != old:
+                    dirty.add(movie_idx)
+            else:
+                merged = [(positions[url], score, year_match) for url, score, year_match in old]
+            candidates[movie_idx] = merged
+
+        best = {movie_idx: positions.get(url) for movie_idx, url in self.best.items()}
+        used_before = {row for row in best.values() if row is not None}
+        holders = defaultdict(list)
+        for movie_idx, movie_candidates in candidates.items():
+            for row, _, _ in movie_candidates:
+                holders[row].append(movie_idx)
+        changed, owner = reassign(candidates, holders, best, dirty, rank)
+
+        # movies listing a video that was taken or freed lose or gain an "other closer" link
+        affected = dirty | changed
+        for row in used_before.symmetric_difference(owner):
+            affected.update(holders[row])
+
+        self.urls, self.digests = delta.urls, delta.digests
+        for movie_idx in dirty:
+            self.candidates[movie_idx] = [(delta.urls[row], score, year_match)
+                                          for row, score, year_match in candidates[movie_idx]]
+        self.best = {movie_idx: None if row is None else delta.urls[row] for movie_idx, row in best.items()}
+        return candidates, best, set(owner), affected
+
+
+def reassign(candidates, holders, best, dirty, rank=by_score_then_row):
+    """Replay the greedy best-match pass starting from the dirty movies.
+
+    holders maps a row to the movies listing it; best (movie idx -> row)
+    holds the previous pass and is updated in place. A movie is redone when
+    its candidates changed, when an earlier movie freed a video it lists, or
+    when an earlier movie took its video; every other movie keeps its match.
+    Returns (changed movies, row -> owner).
+    """
+    owner = {row: movie_idx for movie_idx, row in best.items() if row is not None}
+
+    queue = sorted(dirty)
+    queued = set(dirty)
+    changed = set()
+    while queue:
+        movie_idx = heapq.heappop(queue)
+        queued.discard(movie_idx)
+        best_rank, choice = None, None
+        for row, score, _ in candidates[movie_idx]:
+            # only earlier movies have claimed anything at this point of the pass
+            if owner.get(row, movie_idx) >= movie_idx:
+                key = rank(row, score)
+                if best_rank is None or key < best_rank:
+                    best_rank, choice = key, row
+
+        previous = best[movie_idx]
+        if choice == previous:
+            continue
+        changed.add(movie_idx)
+        best[movie_idx] = choice
+        woken = []
+        if previous is not None and owner.get(previous) == movie_idx:
+            del owner[previous]
+            woken.extend(holders[previous])
+        if choice is not None:
+            if choice in owner:
+                woken.append(owner[choice])
+            owner[choice] = movie_idx
+        for other in woken:
+            if other > movie_idx and other not in queued:
+                queued.add(other)
+                heapq.heappush(queue, other)
+    return changed, owner
+
+
+def read_previous_output(path, header, num_movies):
+    """Rows of the last output csv, header first, or None when it cannot be patched."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    if not rows or rows[0] != header or len(rows) != num_movies + 1:
+        return None
+    return rows
+
+
+def write_output(path, rows):
+    with atomic_open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
@@ -0,0 +1,152 @@
+import json
+import os
+
+import pandas as pd
+
+from metrics import METRICS, log
+from atomic_io import write_json_atomic
+from columnar_io import load_frame_cached
+
+# Turns the search stage's output CSV into bollyvault.json, either as a full
+# rebuild or incrementally against a state file of what was exported before.
+
+STATE_VERSION = 1
+FRAME_CACHE_VARIANT = 'clean_frame/1'
+LIST_COLUMNS = ['genres', 'directors', 'writers', 'actors']
+
+
+def get_movie_era(year):
+    if pd.isna(year):
+        return 'Unknown'
+    if year <= 1980:
+        return 'Classic'
+    elif 1981 <= year <= 2000:
+        return 'Golden'
+    elif 2001 <= year <= 2020:
+        return 'Modern'
+    else:
+        return 'Contemporary'
+
+
+def clean_frame(df):
+    # Clean data
+    df['year_of_release'] = pd.to_numeric(df['year_of_release'], errors='coerce')
+    df = df[df['year_of_release'].between(1900, 2025)].copy()
+
+    df['runtime'] = pd.to_numeric(df['runtime'], errors='coerce').replace(-1, pd.NA)
+
+    # Handle string columns safely
+    df['imdb_votes'] = df['imdb_votes'].astype(str).str.replace(',', '').replace('nan', '0').astype(int)
+    for column in LIST_COLUMNS:
+        df[column] = df[column].fillna('').apply(lambda x: x.split('|') if x else [])
+    df['imdb_rating'] = pd.to_numeric(df['imdb_rating'], errors='coerce')
+    df['has_wins_nominations'] = df['wins_nominations'].notna() & (df['wins_nominations'] != '')
+
+    # Calculate movie era
+    df['movie_era'] = df['year_of_release'].apply(get_movie_era)
+    return df
+
+
+def add_relevance(df):
+    # Calculate IMDb relevance
+    min_votes = df['imdb_votes'].min()
+    max_votes = df['imdb_votes'].max()
+    df['normalized_votes'] = (df['imdb_votes'] - min_votes) / (max_votes - min_votes) if max_votes != min_votes else 0.0
+    df['imdb_relevance'] = (df['imdb_rating'] / 10 * 0.6) + (df['normalized_votes'] * 0.3) + (df['has_wins_nominations'] * 0.1)
+    return df
+
+
+def apply_relevance(record, min_votes, max_votes):
+    # per-record form of add_relevance, for the incremental export
+    if max_votes != min_votes:
+        normalized = (record['imdb_votes'] - min_votes) / (max_votes - min_votes)
+    else:
+        normalized = 0.0
+    rating = record.get('imdb_rating')
+    record['normalized_votes'] = round(normalized, 10)
+    if rating is None:
+        record['imdb_relevance'] = None
+    else:
+        relevance = (rating / 10 * 0.6) + (normalized * 0.3) + (bool(record['has_wins_nominations']) * 0.1)
+        record['imdb_relevance'] = round(relevance, 10)
+
+
+def read_clean_frame(output_csv):
+    return clean_frame(pd.read_csv(output_csv))
+
+
+def load_clean_frame(output_csv, frame_cache=None):
+    # the parquet copy skips the csv parse and string cleanup on reruns
+    df = load_frame_cached(output_csv, frame_cache, read_clean_frame, FRAME_CACHE_VARIANT)
+    for column in LIST_COLUMNS:
+        df[column] = df[column].apply(list)
+    return df
+
+
+def export_json(output_csv, output_json, frame_cache=None):
+    df = add_relevance(load_clean_frame(output_csv, frame_cache))
+    payload = df.to_json(orient='records')
+    write_json_atomic(output_json, payload)
+    METRICS.gauge('json_records', len(df))
+    log.info(f"[JSON] Successfully wrote {len(df)} records to {output_json}")
+    # same shape as export_json_incremental's result, for the site files built from it
+    return json.loads(payload)
+
+
+def _load_state(state_path, columns):
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        # a schema change invalidates every cached record
+        if state.get('version') == STATE_VERSION and state.get('columns') == columns:
+            return state
+    return {'version': STATE_VERSION, 'columns': columns, 'min_votes': None, 'max_votes': None, 'rows': {}}
+
+
+def export_json_incremental(output_csv, output_json, state_path=None):
+    """Re-export only rows whose content hash changed since the last run.
+
+    The state file maps imdb_id -> [row hash, exported record or None when
+    the row was filtered out]. Vote normalization is re-applied to unchanged
+    records only when the global min/max votes moved.
+    """
+    state_path = state_path or output_json + '.state'
+    raw = pd.read_csv(output_csv)
+    state = _load_state(state_path, list(raw.columns))
+    old_rows = state['rows']
+
+    ids = raw['imdb_id'].astype(str).tolist()
+    hashes = [str(h) for h in pd.util.hash_pandas_object(raw, index=False)]
+    changed_mask = [old_rows.get(i, (None,))[0] != h for i, h in zip(ids, hashes)]
+
+    changed = clean_frame(raw[changed_mask])
+    changed_records = json.loads(changed.to_json(orient='index')) if len(changed) else {}
+
+    new_rows = {}
+    records = []
+    fresh = []
+    for label, imdb_id, row_hash, is_changed in zip(raw.index, ids, hashes, changed_mask):
+        if is_changed:
+            record = changed_records.get(str(label))
+            if record is not None:
+                fresh.append(record)
+        else:
+            record = old_rows[imdb_id][1]
+        new_rows[imdb_id] = [row_hash, record]
+        if record is not None:
+            records.append(record)
+
+    votes = [r['imdb_votes'] for r in records]
+    min_votes, max_votes = (min(votes), max(votes)) if votes else (0, 0)
+    extremes_moved = (min_votes, max_votes) != (state['min_votes'], state['max_votes'])
+    for record in (records if extremes_moved else fresh):
+        apply_relevance(record, min_votes, max_votes)
+
+    write_json_atomic(output_json, records)
+    state.update({'min_votes': min_votes, 'max_votes': max_votes, 'rows': new_rows})
+    write_json_atomic(state_path, state)
+    METRICS.gauge('json_records', len(records))
+    METRICS.gauge('json_rows_recomputed', int(sum(changed_mask)))
+    log.info(f"[JSON] Wrote {len(records)} records to {output_json} "
+             f"({sum(changed_mask)} rows recomputed, normalization {'re-applied' if extremes_moved else 'unchanged'})")
+    return records
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 import argparse
 import pandas as pd
-import re
-import csv
-import os
-import sys
+from title_automaton import TitleAutomaton
+from sharded_matching import shard_bounds, discover_sharded
+from text_normalize import lower_many, title_pattern
+from checkpointed_output import CheckpointedCSVWriter
+from video_store import VideoStore, parse_numeric_year
+from video_dedup import DEDUP_MODES, MAX_DISTANCE, MIN_OVERLAP, dedup_videos
+from fuzzy_index import FuzzyCandidates, load_or_build
+from incremental_matching import MatchState, movies_signature, read_previous_output, write_output
+import metrics
+from metrics import METRICS, log
 
 def parse_args():
     p = argparse.ArgumentParser(
@@ -15,111 +21,322 @@ def parse_args():
     p.add_argument('--output_csv',    required=True, help="Where to write the matching results")
     p.add_argument('--other_closer_count', type=int, default=2,
                    help="How many other_closer links to output per movie (default=2)")
-    return p.parse_args()
+    p.add_argument('--engine', choices=['automaton', 'regex'], default='automaton',
+                   help="automaton: one Aho-Corasick pass over all videos (default); "
+                        "regex: legacy per-movie regex scan, kept for comparison")
+    p.add_argument('--workers', type=int, default=1,
+                   help="Shard candidate discovery across N processes (automaton engine only)")
+    p.add_argument('--batch_rows', type=int, default=500,
+                   help="Rows buffered between flush+fsync+checkpoint (default=500)")
+    p.add_argument('--resume', action='store_true',
+                   help="Continue a killed run from <output_csv>.ckpt")
+    p.add_argument('--video_store', default=None,
+                   help="Binary copy of the video table, memory-mapped on reruns and rebuilt when the csv changes")
+    p.add_argument('--fuzzy', action='store_true',
+                   help="Also match spelling variants of titles through a MinHash/LSH word index")
+    p.add_argument('--fuzzy_index', default=None,
+                   help="Persisted LSH index, extended with new words on each run (default: <video_csv>.lsh)")
+    p.add_argument('--fuzzy_threshold', type=float, default=0.5,
+                   help="Minimum character-trigram Jaccard for a word variant (default=0.5)")
+    p.add_argument('--dedup', choices=DEDUP_MODES, default='off',
+                   help="Collapse reuploads into clusters and match one representative per cluster: "
+                        "exact = same text and year, simhash = also near-identical text (default=off)")
+    p.add_argument('--dedup_distance', type=int, default=MAX_DISTANCE,
+                   help=f"Largest SimHash bit distance within a cluster (default={MAX_DISTANCE})")
+    p.add_argument('--dedup_report', default=None,
+                   help="Write the clusters with their member urls to this csv")
+    p.add_argument('--incremental', action='store_true',
+                   help="Only match videos that are new or changed since the last run and patch its output")
+    p.add_argument('--candidate_state', default=None,
+                   help="Candidates and matches kept for --incremental (default: <output_csv>.candidates)")
+    metrics.add_arguments(p)
+    args = p.parse_args()
+    if args.workers > 1 and args.engine != 'automaton':
+        p.error("--workers requires --engine automaton")
+    if args.incremental and args.resume:
+        p.error("--incremental cannot be combined with --resume")
+    return args
 
-def load_data(main_path, video_path):
+def load_data(main_path, video_path, video_store=None):
     movies = pd.read_csv(main_path, dtype={'title': str, 'year_of_release': int})
-    videos = pd.read_csv(video_path, dtype={'url': str,
-                                            'normalized_translated_title_n_desc': str,
-                                            'year_optional': str})
     # lowercase for matching
-    movies['title_lower'] = movies['title'].str.lower()
-    videos['norm_desc_lower'] = videos['normalized_translated_title_n_desc'].str.lower().fillna('')
-    # parse year_optional or NaN
-    videos['year_optional'] = pd.to_numeric(videos['year_optional'], errors='coerce')
+    movies['title_lower'] = lower_many(movies['title'], missing=None)
+    # videos go into a columnar store instead of a frame: no Series per row,
+    # lowercased descriptions in one buffer, years parsed like pd.to_numeric
+    load_options = dict(normalize=lower_many, year_parser=parse_numeric_year)
+    if video_store:
+        videos = VideoStore.from_csv_cached(video_path, video_store, **load_options)
+    else:
+        videos = VideoStore.from_csv(video_path, **load_options)
     return movies, videos
 
 def compile_pattern(title):
-    # \b ensures standalone words/spaces; escape special chars
-    return re.compile(r'\b' + re.escape(title) + r'\b')
+    return title_pattern(title)
 
 def score_match(title, vid_year, movie_year):
     word_count = len(title.split())
-    year_bonus = 1 if (not pd.isna(vid_year) and int(vid_year) == int(movie_year)) else 0
+    year_bonus = 1 if (vid_year is not None and vid_year == int(movie_year)) else 0
     return word_count + year_bonus, bool(year_bonus)
 
+def find_candidates_regex(movie, videos):
+    # legacy path: one regex scan over every video for this movie
+    title = movie['title_lower']
+    pat   = compile_pattern(title)
+    candidates = []
+    METRICS.observe('regex_evals_per_movie', len(videos))
+    for url, text, vid_year in videos.rows():
+        if pat.search(text):
+            sc, ym = score_match(title, vid_year, movie['year_of_release'])
+            candidates.append({'url': url, 'score': sc, 'year_match': ym})
+    return candidates
+
+def find_candidates_fuzzy(movie, videos, fuzzy, exact):
+    # spelling variants the exact engines miss; their word count is scaled by similarity
+    title = movie['title_lower']
+    if not isinstance(title, str):
+        return []
+    seen = {c['url'] for c in exact}
+    found = []
+    for video_idx, similarity in fuzzy.search(title):
+        url = videos.url(video_idx)
+        if url in seen:
+            continue
+        seen.add(url)
+        _, ym = score_match(title, videos.year(video_idx), movie['year_of_release'])
+        sc = round(len(title.split()) * similarity, 2) + (1 if ym else 0)
+        found.append({'url': url, 'score': sc, 'year_match': ym})
+    METRICS.incr('fuzzy_candidates', len(found))
+    return found
+
+def match_titles(title_items, videos):
+    # title_items: [(movie key, lowercased title, year_of_release), ...]
+    ac = TitleAutomaton()
+    movie_years = {}
+    for key, title, year in title_items:
+        ac.add(title, key)
+        movie_years[key] = year
+    ac.build()
+
+    candidates = {}
+    for url, text, vid_year in videos.rows():
+        for tid in ac.search(text):
+            for key in ac.keys_for(tid):
+                sc, ym = score_match(ac.title(tid), vid_year, movie_years[key])
+                candidates.setdefault(key, []).append({'url': url, 'score': sc, 'year_match': ym})
+    return candidates
+
+def find_candidates_automaton(movies, videos, workers=1):
+    # one automaton over all titles, one pass over all videos;
+    # candidate lists come out in video order, same as the regex path
+    title_items = [(key, title, year) for key, title, year in
+                   zip(movies.index, movies['title_lower'], movies['year_of_release'])
+                   if isinstance(title, str) and title]
+    if workers > 1:
+        shard_args = [(title_items, videos.slice(a, b))
+                      for a, b in shard_bounds(len(videos), workers)]
+        log.info(f"Matching {len(title_items)} titles over {len(shard_args)} video shards")
+        found = discover_sharded(match_titles, shard_args, workers)
+    else:
+        log.info(f"Matching {len(title_items)} titles in one pass")
+        found = match_titles(title_items, videos)
+
+    return {key: found.get(key, []) for key in movies.index}
+
+def load_fuzzy(args, videos):
+    if not args.fuzzy:
+        return None
+    with METRICS.stage('fuzzy_index'):
+        lsh, added = load_or_build(args.fuzzy_index or args.video_csv + '.lsh', videos.texts())
+        fuzzy = FuzzyCandidates(videos, lsh, args.fuzzy_threshold)
+    log.info(f"Fuzzy index covers {len(lsh)} words ({added} new)")
+    return fuzzy
+
+def output_headers(other_n):
+    headers = ['movie_title','year_of_release','best_url','best_score','best_year_matches']
+    for i in range(1, other_n+1):
+        headers += [f'other_closer_url{i}', f'other_closer_score{i}', f'other_closer_year_matches{i}']
+    return headers
+
+def pick_best(candidates, best_assigned):
+    # pick best non-assigned candidate
+    for c in sorted(candidates, key=lambda x: (-x['score'], x['url'])):
+        if c['url'] not in best_assigned:
+            return c
+    return None
+
+def output_row(m, candidates, best, other_n):
+    if best:
+        best_url, best_score, best_year = best['url'], best['score'], best['year_match']
+    else:
+        best_url = best_score = ''
+        best_year = False
+
+    # pick N other closer from all candidates (including those used as best elsewhere)
+    others = [c for c in sorted(candidates, key=lambda x: -x['score']) if c['url'] != best_url]
+    others = others[:other_n]
+
+    # build output row
+    row = {
+        'movie_title': m['title'],
+        'year_of_release': m['year_of_release'],
+        'best_url': best_url,
+        'best_score': best_score,
+        'best_year_matches': best_year
+    }
+    for idx in range(other_n):
+        key_url    = f'other_closer_url{idx+1}'
+        key_score  = f'other_closer_score{idx+1}'
+        key_ym     = f'other_closer_year_matches{idx+1}'
+        if idx < len(others):
+            row[key_url]   = others[idx]['url']
+            row[key_score] = others[idx]['score']
+            row[key_ym]    = others[idx]['year_match']
+            log.debug("  → Other %d: %s (score=%s, year_match=%s)",
+                      idx + 1, others[idx]['url'], others[idx]['score'], others[idx]['year_match'])
+        else:
+            row[key_url] = row[key_score] = row[key_ym] = ''
+    return row
+
+def state_candidates(candidates, url_rows):
+    # the state keeps (row, score, year_match) in row order
+    return sorted((url_rows[c['url']], c['score'], c['year_match']) for c in candidates)
+
+def run_candidates(m, videos, found, fuzzy):
+    # back from state rows to the candidate list of a full run:
+    # exact matches in video order, then the fuzzy ones in video order
+    candidates = [{'url': videos.url(row), 'score': score, 'year_match': ym} for row, score, ym in found]
+    if not fuzzy or not candidates:
+        return candidates
+    pat = compile_pattern(m['title_lower'])
+    exact = [pat.search(videos.text(row)) is not None for row, _, _ in found]
+    return ([c for c, e in zip(candidates, exact) if e]
+            + [c for c, e in zip(candidates, exact) if not e])
+
+def match_incremental(args, movies, videos, state, headers):
+    """Patch the previous output for new and changed videos; False when a full run is needed."""
+    delta = state.diff(videos)
+    rows = read_previous_output(args.output_csv, headers, len(movies))
+    if delta is None or rows is None:
+        return False
+    log.info(f"{len(delta.rows)} new or changed videos, {len(delta.dropped)} changed or removed since the last run")
+    METRICS.gauge('delta_videos', len(delta.rows))
+
+    found = {}
+    if delta.rows:
+        changed_videos = VideoStore()
+        for row in delta.rows:
+            changed_videos.append(videos.url(row), videos.text(row), videos.year(row))
+        fuzzy = load_fuzzy(args, changed_videos)
+        with METRICS.stage('candidates'):
+            exact = find_candidates_automaton(movies, changed_videos)
+            for pos, key in enumerate(movies.index):
+                candidates = exact[key]
+                if fuzzy is not None:
+                    candidates = candidates + find_candidates_fuzzy(movies.loc[key], changed_videos, fuzzy, candidates)
+                if candidates:
+                    found[pos] = state_candidates(candidates, delta.positions)
+
+    with METRICS.stage('best_matches'):
+        # the full run's preference: highest score, then the smallest url
+        candidates, best, _, affected = state.update(delta, found, rank=lambda row, score: (-score, delta.urls[row]))
+    log.info(f"Rematching {len(affected)} of {len(movies)} movies")
+    METRICS.gauge('rematched_movies', len(affected))
+
+    with METRICS.stage('write_output'):
+        for pos in sorted(affected):
+            m = movies.iloc[pos]
+            movie_candidates = run_candidates(m, videos, candidates[pos], args.fuzzy)
+            best_url = None if best[pos] is None else videos.url(best[pos])
+            best_c = next((c for c in movie_candidates if c['url'] == best_url), None)
+            row = output_row(m, movie_candidates, best_c, args.other_closer_count)
+            rows[pos + 1] = [row[h] for h in headers]
+        write_output(args.output_csv, rows)
+        METRICS.incr('rows_written', len(affected))
+    return True
+
 def main():
     args = parse_args()
-    movies, videos = load_data(args.main_csv, args.video_csv)
+    metrics.setup(args)
+    with METRICS.stage('load_data'):
+        movies, videos = load_data(args.main_csv, args.video_csv, args.video_store)
+    videos = dedup_videos(videos, args.dedup, args.dedup_distance, args.dedup_report)
+    METRICS.gauge('movies', len(movies))
+    METRICS.gauge('videos', len(videos))
 
     # sort movies so longest titles go first (to enforce longest-match priority)
     movies['title_len'] = movies['title_lower'].str.split().str.len()
     movies = movies.sort_values(by='title_len', ascending=False)
 
-    best_assigned = set()
     # prepare output file & header
     other_n = args.other_closer_count
-    headers = ['movie_title','year_of_release','best_url','best_score','best_year_matches']
-    for i in range(1, other_n+1):
-        headers += [f'other_closer_url{i}', f'other_closer_score{i}', f'other_closer_year_matches{i}']
+    headers = output_headers(other_n)
 
-    with open(args.output_csv, 'w', newline='', encoding='utf-8') as out_f:
-        writer = csv.DictWriter(out_f, fieldnames=headers)
-        writer.writeheader()
+    state_path = args.candidate_state or args.output_csv + '.candidates'
+    signature = movies_signature(zip(movies['title'], movies['year_of_release']))
+    options = {'other_closer_count': other_n, 'fuzzy_threshold': args.fuzzy_threshold if args.fuzzy else None,
+               'dedup': [args.dedup] + ([args.dedup_distance, MIN_OVERLAP] if args.dedup == 'simhash' else [None])}
+    if args.incremental:
+        state = MatchState.load(state_path, signature, options)
+        if state is not None and match_incremental(args, movies, videos, state, headers):
+            state.save(state_path)
+            log.info(f"All done. Results in: {args.output_csv}")
+            metrics.finish(args)
+            return
+        log.info("No usable state from a previous run, matching everything")
 
+    writer = CheckpointedCSVWriter(args.output_csv, headers, batch_size=args.batch_rows, resume=args.resume)
+    start = writer.next_index
+    best_assigned = set(writer.state['best_assigned']) if writer.state else set()
+    if start:
+        log.info(f"Resuming at movie {start + 1}/{len(movies)} with {len(best_assigned)} assigned videos")
+    remaining = movies.iloc[start:]
+
+    all_candidates = None
+    if args.engine == 'automaton':
+        with METRICS.stage('candidates'), metrics.profiled(args.profile is not None, args.profile or None):
+            all_candidates = find_candidates_automaton(remaining, videos, args.workers)
+        METRICS.incr('automaton_passes', len(videos))
+
+    fuzzy = load_fuzzy(args, videos)
+
+    url_rows = {url: row for row, (url, _, _) in enumerate(videos.rows())} if args.incremental else None
+    found, best_rows = {}, {}
+    regex_profile = args.profile is not None and args.engine == 'regex'
+    with METRICS.stage('assign_and_write'), metrics.profiled(regex_profile, args.profile or None):
         # process each movie
-        for _, m in movies.iterrows():
-            title = m['title_lower']
+        for pos, (key, m) in enumerate(remaining.iterrows(), start):
             year  = m['year_of_release']
-            pat   = compile_pattern(title)
-            print(f"[DEBUG] Processing movie: '{m['title']}' ({year})", file=sys.stderr)
+            log.debug("Processing movie: '%s' (%s)", m['title'], year)
 
             # find all candidate videos that contain this exact title
-            candidates = []
-            for _, v in videos.iterrows():
-                text = v['norm_desc_lower']
-                if pat.search(text):
-                    sc, ym = score_match(title, v['year_optional'], year)
-                    candidates.append({'url': v['url'], 'score': sc, 'year_match': ym})
-
-            # pick best non-assigned candidate
-            best = None
-            for c in sorted(candidates, key=lambda x: (-x['score'], x['url'])):
-                if c['url'] not in best_assigned:
-                    best = c
-                    break
+            if all_candidates is not None:
+                candidates = all_candidates[key]
+            else:
+                candidates = find_candidates_regex(m, videos)
+            if fuzzy is not None:
+                candidates = candidates + find_candidates_fuzzy(m, videos, fuzzy, candidates)
 
+            best = pick_best(candidates, best_assigned)
             if best:
                 best_assigned.add(best['url'])
-                print(f"[DEBUG]  → Best: {best['url']} (score={best['score']}, year_match={best['year_match']})",
-                      file=sys.stderr)
-                best_url, best_score, best_year = best['url'], best['score'], best['year_match']
+                log.debug("  → Best: %s (score=%s, year_match=%s)", best['url'], best['score'], best['year_match'])
             else:
-                print("[DEBUG]  → No best match found", file=sys.stderr)
-                best_url = best_score = ''
-                best_year = False
-
-            # pick N other closer from all candidates (including those used as best elsewhere)
-            others = [c for c in sorted(candidates, key=lambda x: -x['score']) if c['url'] != best_url]
-            others = others[:other_n]
-
-            # build output row
-            row = {
-                'movie_title': m['title'],
-                'year_of_release': year,
-                'best_url': best_url,
-                'best_score': best_score,
-                'best_year_matches': best_year
-            }
-            for idx in range(other_n):
-                key_url    = f'other_closer_url{idx+1}'
-                key_score  = f'other_closer_score{idx+1}'
-                key_ym     = f'other_closer_year_matches{idx+1}'
-                if idx < len(others):
-                    row[key_url]   = others[idx]['url']
-                    row[key_score] = others[idx]['score']
-                    row[key_ym]    = others[idx]['year_match']
-                    print(f"[DEBUG]  → Other {idx+1}: {others[idx]['url']} (score={others[idx]['score']}, year_match={others[idx]['year_match']})",
-                          file=sys.stderr)
-                else:
-                    row[key_url] = row[key_score] = row[key_ym] = ''
-
-            writer.writerow(row)
-            out_f.flush()
-            os.fsync(out_f.fileno())
-
-        print(f"[DEBUG] All done. Results in: {args.output_csv}", file=sys.stderr)
+                log.debug("  → No best match found")
+            if url_rows is not None:
+                found[pos] = state_candidates(candidates, url_rows)
+                best_rows[pos] = url_rows[best['url']] if best else None
+
+            writer.writerow(output_row(m, candidates, best, other_n))
+            writer.mark(pos + 1, lambda: {'best_assigned': list(best_assigned)})
+            METRICS.observe('candidates_per_movie', len(candidates))
+            METRICS.incr('rows_written')
+
+        writer.close(len(movies))
+    METRICS.incr('best_matched', len(best_assigned))
+    if args.incremental:
+        MatchState.from_run(signature, options, videos, found, best_rows).save(state_path)
+    log.info(f"All done. Results in: {args.output_csv}")
+    metrics.finish(args)
 
 if __name__ == '__main__':
     main()
-
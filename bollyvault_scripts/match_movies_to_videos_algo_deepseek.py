@@ -1,65 +1,136 @@
 import csv
-import re
 import argparse
 from collections import defaultdict
+from sharded_matching import shard_bounds, discover_sharded
+from text_normalize import TOKEN_RE, build_token_index, fold_title, fold_many, title_pattern
+from video_store import VideoStore
+from video_dedup import DEDUP_MODES, MAX_DISTANCE, MIN_OVERLAP, dedup_videos
+from fuzzy_index import FuzzyCandidates, load_or_build
+from checkpointed_output import CheckpointedCSVWriter
+from incremental_matching import MatchState, movies_signature, read_previous_output, write_output
+import metrics
+from metrics import METRICS, log
 
 def read_movies(filename):
     movies = []
     with open(filename, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
-            title = row['title'].strip().lower()
+            title = fold_title(row['title'])
             year = int(row['year_of_release'])
             movies.append({'title': title, 'year': year})
     movies.sort(key=lambda x: -len(x['title']))
     return movies
 
-def read_video_links(filename):
-    videos = []
-    with open(filename, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            normalized_title = row['normalized_translated_title_n_desc'].strip().lower()
-            year_optional = row['year_optional'].strip()
-            year = int(year_optional) if year_optional.isdigit() else None
-            videos.append({
-                'url': row['url'],
-                'normalized_title': normalized_title,
-                'year': year,
-                'translated_title': row['translated_title_n_desc']
-            })
-    return videos
-
-def find_best_matches(movies, videos):
-    best_matches = {}
-    used_video_indices = set()
-
-    for movie_idx, movie in enumerate(movies):
-        print(f"Processing movie {movie_idx + 1}/{len(movies)}: {movie['title']} ({movie['year']})")
+def read_video_links(filename, store_path=None):
+    if store_path:
+        return VideoStore.from_csv_cached(filename, store_path, normalize=fold_many)
+    return VideoStore.from_csv(filename, normalize=fold_many)
+
+def candidate_video_indices(title, index, num_videos):
+    # every \w+ run of the title is a whole token wherever \btitle\b matches,
+    # so intersecting the posting lists gives a superset of the real matches
+    tokens = set(TOKEN_RE.findall(title))
+    if not tokens:
+        return range(num_videos)
+    postings = sorted((index.get(token, []) for token in tokens), key=len)
+    if not postings[0]:
+        return []
+    result = set(postings[0])
+    for posting in postings[1:]:
+        result.intersection_update(posting)
+        if not result:
+            return []
+    return sorted(result)
+
+def find_candidates(movies, videos, index, offset=0, first_movie=0, fuzzy=None):
+    # offset maps shard-local video indices back to positions in the full list,
+    # first_movie does the same for a resumed run that skips finished movies
+    candidates = {}
+    for movie_idx, movie in enumerate(movies, first_movie):
+        pattern = title_pattern(movie['title'])
+        matches = []
+        probe = candidate_video_indices(movie['title'], index, len(videos))
+        METRICS.observe('regex_evals_per_movie', len(probe))
+        for video_idx in probe:
+            if pattern.search(videos.text(video_idx)):
+                score = len(movie['title'])
+                year_match = False
+
+                video_year = videos.year(video_idx)
+                if video_year is not None and video_year == movie['year']:
+                    score += 1000
+                    year_match = True
+
+                matches.append((video_idx + offset, score, year_match))
+
+        if fuzzy is not None:
+            # spelling variants score their title length scaled by similarity,
+            # so an exact occurrence always outranks them
+            exact = {video_idx for video_idx, _, _ in matches}
+            for video_idx, similarity in fuzzy.search(movie['title']):
+                if video_idx + offset in exact:
+                    continue
+                score = round(len(movie['title']) * similarity, 2)
+                video_year = videos.year(video_idx)
+                year_match = video_year is not None and video_year == movie['year']
+                if year_match:
+                    score += 1000
+                matches.append((video_idx + offset, score, year_match))
+                METRICS.incr('fuzzy_candidates')
+            matches.sort(key=lambda m: m[0])
+        candidates[movie_idx] = matches
+        METRICS.observe('candidates_per_movie', len(matches))
+    return candidates
+
+def discover_shard(movies, videos, offset, first_movie=0, fuzzy_args=None):
+    index = build_token_index(videos.texts())
+    fuzzy = FuzzyCandidates(videos, *fuzzy_args, index=index) if fuzzy_args else None
+    return find_candidates(movies, videos, index, offset, first_movie, fuzzy)
+
+def discover_candidates(movies, videos, workers, first_movie=0, fuzzy_args=None):
+    # fuzzy_args: (MinHashLSH over the video vocabulary, similarity threshold) or None
+    pending = movies[first_movie:]
+    if workers > 1:
+        log.info(f"Finding candidate videos with {workers} workers...")
+        shard_args = [(pending, videos.slice(a, b), a, first_movie, fuzzy_args)
+                      for a, b in shard_bounds(len(videos), workers)]
+        found = discover_sharded(discover_shard, shard_args, workers)
+        return {movie_idx: found.get(movie_idx, []) for movie_idx in range(first_movie, len(movies))}
+
+    log.info("Indexing video tokens...")
+    index = build_token_index(videos.texts())
+    log.info(f"Indexed {len(index)} distinct tokens")
+
+    log.info("Finding candidate videos...")
+    fuzzy = FuzzyCandidates(videos, *fuzzy_args, index=index) if fuzzy_args else None
+    return find_candidates(pending, videos, index, first_movie=first_movie, fuzzy=fuzzy)
+
+def find_best_matches(movies, videos, candidates, best_matches=None, used_video_indices=None,
+                      start=0, on_progress=None):
+    # best_matches/used_video_indices/start let a resumed run continue the greedy pass
+    best_matches = {} if best_matches is None else best_matches
+    used_video_indices = set() if used_video_indices is None else used_video_indices
+
+    for movie_idx in range(start, len(movies)):
+        movie = movies[movie_idx]
+        log.debug("Processing movie %d/%d: %s (%s)", movie_idx + 1, len(movies), movie['title'], movie['year'])
         best_score = -1
         best_video_idx = None
         best_year_match = False
 
-        for video_idx, video in enumerate(videos):
+        for video_idx, score, year_match in candidates[movie_idx]:
             if video_idx in used_video_indices:
                 continue
 
-            pattern = r'\b{}\b'.format(re.escape(movie['title']))
-            if re.search(pattern, video['normalized_title']):
-                score = len(movie['title'])
-                year_match = False
-
-                if video['year'] is not None and video['year'] == movie['year']:
-                    score += 1000
-                    year_match = True
-
-                if score > best_score:
-                    best_score = score
-                    best_video_idx = video_idx
-                    best_year_match = year_match
+            if score > best_score:
+                best_score = score
+                best_video_idx = video_idx
+                best_year_match = year_match
 
         if best_video_idx is not None:
-            print(f"Found best match: {videos[best_video_idx]['url']} with score {best_score}, year match {best_year_match}")
+            log.debug("Found best match: %s with score %s, year match %s",
+                      videos.url(best_video_idx), best_score, best_year_match)
             used_video_indices.add(best_video_idx)
             best_matches[movie_idx] = {
                 'video_idx': best_video_idx,
@@ -67,77 +138,107 @@ def find_best_matches(movies, videos):
                 'year_match': best_year_match
             }
         else:
-            print("No best match found.")
+            log.debug("No best match found.")
             best_matches[movie_idx] = None
 
+        if on_progress:
+            on_progress(movie_idx + 1)
+
     return best_matches, used_video_indices
 
-def find_other_closer_matches(movies, videos, used_video_indices, num_other):
+def find_other_closer_matches(movies, candidates, used_video_indices, num_other):
     other_matches = defaultdict(list)
 
-    for movie_idx, movie in enumerate(movies):
-        print(f"Finding other matches for movie {movie_idx + 1}/{len(movies)}: {movie['title']}")
-        candidates = []
+    for movie_idx, movie_candidates in candidates.items():
+        log.debug("Finding other matches for movie %d/%d: %s", movie_idx + 1, len(movies), movies[movie_idx]['title'])
+        remaining = [c for c in movie_candidates if c[0] not in used_video_indices]
+        remaining.sort(key=lambda x: (-x[1], -x[0]))
+        other_matches[movie_idx] = remaining[:num_other]
 
-        for video_idx, video in enumerate(videos):
-            if video_idx in used_video_indices:
-                continue
-
-            pattern = r'\b{}\b'.format(re.escape(movie['title']))
-            if re.search(pattern, video['normalized_title']):
-                score = len(movie['title'])
-                year_match = False
-
-                if video['year'] is not None and video['year'] == movie['year']:
-                    score += 1000
-                    year_match = True
-
-                candidates.append((video_idx, score, year_match))
-
-        candidates.sort(key=lambda x: (-x[1], -x[0]))
-        other_matches[movie_idx] = candidates[:num_other]
-
-        print(f"Found {len(other_matches[movie_idx])} other matches")
+        log.debug("Found %d other matches", len(other_matches[movie_idx]))
 
     return other_matches
 
-def write_output(movies, videos, best_matches, other_matches, output_file, num_other):
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        headers = ['movie_title', 'year_of_release', 'best_url', 'best_score', 'best_year_matches']
-        for i in range(num_other):
-            headers.extend([
-                f'other_closer_url{i+1}',
-                f'other_closer_score{i+1}',
-                f'other_closer_year_matches{i+1}'
-            ])
-        writer.writerow(headers)
-
-        for movie_idx, movie in enumerate(movies):
-            row = [movie['title'], movie['year']]
-            best_info = best_matches[movie_idx]
-
-            if best_info:
-                video = videos[best_info['video_idx']]
-                row.extend([
-                    video['url'],
-                    best_info['score'],
-                    best_info['year_match']
-                ])
-            else:
-                row.extend(['', '', ''])
-
-            others = other_matches.get(movie_idx, [])
-            for i in range(num_other):
-                if i < len(others):
-                    vid_idx, score, year_match = others[i]
-                    video = videos[vid_idx]
-                    row.extend([video['url'], score, year_match])
-                else:
-                    row.extend(['', '', ''])
-
-            writer.writerow(row)
-            f.flush()
+def output_headers(num_other):
+    headers = ['movie_title', 'year_of_release', 'best_url', 'best_score', 'best_year_matches']
+    for i in range(num_other):
+        headers.extend([
+            f'other_closer_url{i+1}',
+            f'other_closer_score{i+1}',
+            f'other_closer_year_matches{i+1}'
+        ])
+    return headers
+
+def output_row(movie, videos, best_info, others, num_other):
+    row = [movie['title'], movie['year']]
+
+    if best_info:
+        row.extend([
+            videos.url(best_info['video_idx']),
+            best_info['score'],
+            best_info['year_match']
+        ])
+    else:
+        row.extend(['', '', ''])
+
+    for i in range(num_other):
+        if i < len(others):
+            vid_idx, score, year_match = others[i]
+            row.extend([videos.url(vid_idx), score, year_match])
+        else:
+            row.extend(['', '', ''])
+    return row
+
+def fuzzy_settings(args, videos):
+    # (MinHashLSH covering these videos' words, threshold), or None without --fuzzy
+    if not args.fuzzy:
+        return None
+    with METRICS.stage('fuzzy_index'):
+        lsh, added = load_or_build(args.fuzzy_index or args.video_links + '.lsh', videos.texts())
+        log.info(f"Fuzzy index covers {len(lsh)} words ({added} new)")
+    return lsh, args.fuzzy_threshold
+
+def match_incremental(args, movies, videos, state):
+    """Patch the previous output for new and changed videos; False when a full run is needed."""
+    delta = state.diff(videos)
+    rows = read_previous_output(args.output, output_headers(args.num_other), len(movies))
+    if delta is None or rows is None:
+        return False
+    log.info(f"{len(delta.rows)} new or changed videos, {len(delta.dropped)} changed or removed since the last run")
+    METRICS.gauge('delta_videos', len(delta.rows))
+
+    found = {}
+    if delta.rows:
+        changed_videos = VideoStore()
+        for row in delta.rows:
+            changed_videos.append(videos.url(row), videos.text(row), videos.year(row))
+        fuzzy_args = fuzzy_settings(args, changed_videos)
+        with METRICS.stage('candidates'):
+            for movie_idx, matches in discover_candidates(movies, changed_videos, args.workers,
+                                                          fuzzy_args=fuzzy_args).items():
+                if matches:
+                    found[movie_idx] = [(delta.rows[idx], score, year_match) for idx, score, year_match in matches]
+
+    with METRICS.stage('best_matches'):
+        candidates, best, used_videos, affected = state.update(delta, found)
+    log.info(f"Rematching {len(affected)} of {len(movies)} movies")
+    METRICS.gauge('rematched_movies', len(affected))
+
+    with METRICS.stage('other_matches'):
+        other_matches = find_other_closer_matches(movies, {movie_idx: candidates[movie_idx] for movie_idx in affected},
+                                                  used_videos, args.num_other)
+
+    with METRICS.stage('write_output'):
+        for movie_idx in affected:
+            best_info = None
+            for video_idx, score, year_match in candidates[movie_idx]:
+                if video_idx == best[movie_idx]:
+                    best_info = {'video_idx': video_idx, 'score': score, 'year_match': year_match}
+            rows[movie_idx + 1] = output_row(movies[movie_idx], videos, best_info, other_matches[movie_idx],
+                                             args.num_other)
+        write_output(args.output, rows)
+        METRICS.incr('rows_written', len(affected))
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description='Match video links to movies.')
@@ -145,26 +246,105 @@ def main():
     parser.add_argument('--video-links', required=True, help='Video links CSV file')
     parser.add_argument('--output', required=True, help='Output CSV file')
     parser.add_argument('--num-other', type=int, default=2, help='Number of other close matches')
+    parser.add_argument('--workers', type=int, default=1, help='Shard candidate discovery across N processes')
+    parser.add_argument('--batch-rows', type=int, default=500,
+                        help='Movies processed between flush+fsync+checkpoint')
+    parser.add_argument('--resume', action='store_true', help='Continue a killed run from <output>.ckpt')
+    parser.add_argument('--video-store', default=None,
+                        help='Binary copy of the video table, memory-mapped on reruns and rebuilt when the csv changes')
+    parser.add_argument('--fuzzy', action='store_true',
+                        help='Also match spelling variants of titles through a MinHash/LSH word index')
+    parser.add_argument('--fuzzy-index', default=None,
+                        help='Persisted LSH index, extended with new words on each run (default: <video-links>.lsh)')
+    parser.add_argument('--fuzzy-threshold', type=float, default=0.5,
+                        help='Minimum character-trigram Jaccard for a word variant')
+    parser.add_argument('--dedup', choices=DEDUP_MODES, default='off',
+                        help='Collapse reuploads into clusters and match one representative per cluster: '
+                             'exact = same text and year, simhash = also near-identical text')
+    parser.add_argument('--dedup-distance', type=int, default=MAX_DISTANCE,
+                        help='Largest SimHash bit distance within a cluster (--dedup simhash)')
+    parser.add_argument('--dedup-report', default=None, help='Write the clusters with their member urls to this csv')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only match videos that are new or changed since the last run and patch its output')
+    parser.add_argument('--candidate-state', default=None,
+                        help='Candidates and matches kept for --incremental (default: <output>.candidates)')
+    metrics.add_arguments(parser)
     args = parser.parse_args()
-
-    print("Reading movies...")
-    movies = read_movies(args.main)
-    print(f"Loaded {len(movies)} movies")
-
-    print("Reading video links...")
-    videos = read_video_links(args.video_links)
-    print(f"Loaded {len(videos)} video links")
-
-    print("Matching best videos...")
-    best_matches, used_videos = find_best_matches(movies, videos)
-
-    print("Matching other close videos...")
-    other_matches = find_other_closer_matches(movies, videos, used_videos, args.num_other)
-
-    print("Writing output...")
-    write_output(movies, videos, best_matches, other_matches, args.output, args.num_other)
-
-    print("Completed successfully")
+    if args.incremental and args.resume:
+        parser.error('--incremental cannot be combined with --resume')
+    metrics.setup(args)
+
+    with METRICS.stage('read_input'):
+        log.info("Reading movies...")
+        movies = read_movies(args.main)
+        log.info(f"Loaded {len(movies)} movies")
+
+        log.info("Reading video links...")
+        videos = read_video_links(args.video_links, args.video_store)
+        log.info(f"Loaded {len(videos)} video links")
+    videos = dedup_videos(videos, args.dedup, args.dedup_distance, args.dedup_report)
+    METRICS.gauge('movies', len(movies))
+    METRICS.gauge('videos', len(videos))
+
+    state_path = args.candidate_state or args.output + '.candidates'
+    signature = movies_signature((movie['title'], movie['year']) for movie in movies)
+    options = {'num_other': args.num_other, 'fuzzy_threshold': args.fuzzy_threshold if args.fuzzy else None,
+               'dedup': [args.dedup] + ([args.dedup_distance, MIN_OVERLAP] if args.dedup == 'simhash' else [None])}
+    if args.incremental:
+        state = MatchState.load(state_path, signature, options)
+        if state is not None and match_incremental(args, movies, videos, state):
+            state.save(state_path)
+            log.info("Completed successfully")
+            metrics.finish(args)
+            return
+        log.info("No usable state from a previous run, matching everything")
+
+    writer = CheckpointedCSVWriter(args.output, output_headers(args.num_other),
+                                   batch_size=args.batch_rows, resume=args.resume)
+    state = writer.state or {'phase': 'best', 'best': {}, 'used': []}
+    start = writer.next_index
+    best_matches = {int(k): v for k, v in state['best'].items()}
+    used_videos = set(state['used'])
+    if writer.checkpoint:
+        log.info(f"Resuming {state['phase']} phase at movie {start + 1}/{len(movies)}")
+
+    def checkpoint_state(phase):
+        return lambda: {'phase': phase, 'best': best_matches, 'used': list(used_videos)}
+
+    # the other-closer phase needs every movie's candidates, the write phase only the rest
+    first_movie = start if state['phase'] == 'write' else 0
+    fuzzy_args = fuzzy_settings(args, videos)
+    with METRICS.stage('candidates'), metrics.profiled(args.profile is not None, args.profile or None):
+        candidates = discover_candidates(movies, videos, args.workers, first_movie, fuzzy_args)
+
+    if state['phase'] == 'best':
+        log.info("Matching best videos...")
+        with METRICS.stage('best_matches'):
+            find_best_matches(movies, videos, candidates, best_matches, used_videos, start,
+                              on_progress=lambda next_idx: writer.mark(next_idx, checkpoint_state('best')))
+            writer.flush(0, checkpoint_state('write')())
+        start = 0
+
+    log.info("Matching other close videos...")
+    with METRICS.stage('other_matches'):
+        pending = {movie_idx: candidates[movie_idx] for movie_idx in range(start, len(movies))}
+        other_matches = find_other_closer_matches(movies, pending, used_videos, args.num_other)
+
+    log.info("Writing output...")
+    with METRICS.stage('write_output'):
+        for movie_idx in range(start, len(movies)):
+            writer.writerow(output_row(movies[movie_idx], videos, best_matches[movie_idx],
+                                       other_matches.get(movie_idx, []), args.num_other))
+            writer.mark(movie_idx + 1, checkpoint_state('write'))
+            METRICS.incr('rows_written')
+        writer.close(len(movies))
+    METRICS.incr('best_matched', sum(1 for info in best_matches.values() if info))
+    if args.incremental:
+        best_rows = {movie_idx: info['video_idx'] if info else None for movie_idx, info in best_matches.items()}
+        MatchState.from_run(signature, options, videos, candidates, best_rows).save(state_path)
+
+    log.info("Completed successfully")
+    metrics.finish(args)
 
 if __name__ == '__main__':
     main()
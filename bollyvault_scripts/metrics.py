@@ -0,0 +1,159 @@
+import cProfile
+import inspect
+import io
+import json
+import logging
+import pstats
+import random
+import time
+from contextlib import contextmanager
+
+# Shared instrumentation for the pipeline scripts: per-stage timers, counters,
+# histograms, an opt-in cProfile wrapper and leveled logging. Hot loops log at
+# DEBUG, so they are silent unless -v is given.
+
+log = logging.getLogger('bollyvault')
+
+
+class Histogram:
+    # count/sum/min/max are exact; percentiles come from a bounded reservoir
+    RESERVOIR = 10000
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._sample = []
+        self._rng = random.Random(0)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._sample) < self.RESERVOIR:
+            self._sample.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < self.RESERVOIR:
+                self._sample[slot] = value
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        ordered = sorted(self._sample)
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            'count': self.count, 'mean': self.total / self.count, 'min': self.min, 'max': self.max,
+            'p50': pct(0.5), 'p90': pct(0.9), 'p99': pct(0.99),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def incr(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(value)
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            timer = self.timers.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            timer['seconds'] += elapsed
+            timer['calls'] += 1
+            log.info("[STAGE] %s took %.2fs", name, elapsed)
+
+    def summary(self):
+        return {
+            'timers': self.timers,
+            'counters': self.counters,
+            'gauges': self.gauges,
+            'histograms': {name: hist.summary() for name, hist in self.histograms.items()},
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+        log.info("[METRICS] Wrote %s", path)
+
+
+METRICS = Metrics()
+
+
+def timed_call(func, name, metrics=METRICS):
+    """Wrap a sync or async callable so each call's latency lands in a histogram."""
+    if inspect.iscoroutinefunction(func):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+    else:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+    return wrapper
+
+
+@contextmanager
+def profiled(enabled, output_path=None, top=25):
+    """cProfile the enclosed block when enabled; dump stats and log the top entries."""
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if output_path:
+            profiler.dump_stats(output_path)
+            log.warning("[PROFILE] Wrote %s (inspect with python -m pstats)", output_path)
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats('cumulative').print_stats(top)
+        log.warning("[PROFILE]\n%s", buf.getvalue())
+
+
+def add_arguments(parser):
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='-v logs per-item progress (DEBUG)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only log warnings and errors')
+    parser.add_argument('--metrics-json', default=None, help='Write stage timers, counters and histograms here')
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='PSTATS_FILE',
+                        help='Run the main stage under cProfile, optionally saving stats to a file')
+
+
+def setup(args):
+    level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=level, format='%(message)s')
+
+
+def finish(args):
+    if args.metrics_json:
+        METRICS.dump_json(args.metrics_json)
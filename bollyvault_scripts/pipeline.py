@@ -0,0 +1,303 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from atomic_io import atomic_open
+from image_manifest import load_manifest, missing_files
+from metrics import METRICS, log
+
+# One entry point for the whole pipeline. Stages declare the files they read
+# and write; a stage runs once every stage producing its inputs is done, and
+# is skipped when the fingerprint of its inputs, arguments, script and the
+# modules of this directory the script imports matches the last successful
+# run and its outputs are still the ones it wrote. A stage can also carry a
+# ttl, for scripts whose own caches expire (posters, images), and a check
+# for outputs its declared files only point at (the images' WebP copies).
+# Independent stages (search, matching, posters) run side by side.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATE_VERSION = 1
+SEARCH_SCRIPT = 'search_video_full_movie_and_process_output_json.py'
+MATCHERS = {
+    'deepseek': ('match_movies_to_videos_algo_deepseek.py', '--main', '--video-links', '--output'),
+    'chatgpt': ('match_movies_to_videos_algo_chatgpt.py', '--main_csv', '--video_csv', '--output_csv'),
+}
+
+
+class Stage:
+    # ttl: seconds after a successful run that it goes stale anyway (0: never skipped)
+    # check(): reasons the outputs are incomplete, e.g. missing files they refer to
+    def __init__(self, name, script, args, inputs, outputs, ttl=None, check=None):
+        self.name = name
+        self.script = os.path.join(HERE, script)
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.ttl = ttl
+        self.check = check
+
+    def command(self):
+        return [sys.executable, self.script] + self.args
+
+
+class FileHasher:
+    # sha256 of file contents, memoized by (size, mtime_ns) across runs
+    def __init__(self, memo):
+        self.memo = memo
+
+    def digest(self, path):
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        key = [st.st_size, st.st_mtime_ns]
+        cached = self.memo.get(path)
+        if cached and cached[:2] == key:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        self.memo[path] = key + [sha.hexdigest()]
+        return sha.hexdigest()
+
+
+def local_modules(script):
+    """The script and every module next to it that it imports, directly or through another one."""
+    directory = os.path.dirname(script)
+    found, todo = {script}, [script]
+    while todo:
+        path = todo.pop()
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), path)
+        # ast.walk also sees the imports done lazily inside functions
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = os.path.join(directory, name.split('.')[0] + '.py')
+                if module not in found and os.path.exists(module):
+                    found.add(module)
+                    todo.append(module)
+    return sorted(found)
+
+
+def fingerprint(stage, hasher):
+    payload = {
+        'code': {os.path.basename(path): hasher.digest(path) for path in local_modules(stage.script)},
+        'args': stage.args,
+        'inputs': {path: hasher.digest(path) for path in stage.inputs},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_state(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            return state
+    return {'version': STATE_VERSION, 'stages': {}, 'files': {}}
+
+
+def save_state(path, state):
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def is_up_to_date(stage, fp, state, hasher):
+    recorded = state['stages'].get(stage.name)
+    if not recorded or recorded['fingerprint'] != fp:
+        return False
+    # an output deleted or edited by hand since the last run also means rerun
+    if not all(hasher.digest(path) == digest for path, digest in recorded['outputs'].items()):
+        return False
+    if stage.ttl is not None and time.time() - recorded.get('ran_at', 0) >= stage.ttl:
+        log.info("[PIPELINE] %s last ran over %ds ago, running it again", stage.name, stage.ttl)
+        return False
+    problems = stage.check() if stage.check else []
+    if problems:
+        log.info("[PIPELINE] %s outputs are incomplete (%s), running it again",
+                 stage.name, ', '.join(problems[:5]) + (', ...' if len(problems) > 5 else ''))
+        return False
+    return True
+
+
+def run_stage(stage):
+    log.info("[PIPELINE] Running %s: %s", stage.name, shlex.join(stage.command()))
+    with METRICS.stage(stage.name):
+        return subprocess.run(stage.command()).returncode
+
+
+def run_pipeline(stages, state, state_path, jobs=2, force=(), dry_run=False):
+    """Run stages in dependency order; return the names of stages that failed or were blocked."""
+    hasher = FileHasher(state['files'])
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    deps = {stage.name: {producers[path] for path in stage.inputs if path in producers} for stage in stages}
+    pending = {stage.name: stage for stage in stages}
+    done, failed = set(), set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            progressed = False
+            for name, stage in list(pending.items()):
+                if deps[name] & failed:
+                    log.error("[PIPELINE] %s blocked by failed %s", name, ', '.join(sorted(deps[name] & failed)))
+                    failed.add(name)
+                elif deps[name] <= done:
+                    # dry runs pretend upstream stages ran, so their outputs may not exist yet
+                    missing = [path for path in stage.inputs if not os.path.exists(path)]
+                    if missing and not dry_run:
+                        log.error("[PIPELINE] %s is missing inputs: %s", name, ', '.join(missing))
+                        failed.add(name)
+                    else:
+                        fp = fingerprint(stage, hasher)
+                        if name not in force and is_up_to_date(stage, fp, state, hasher):
+                            log.info("[PIPELINE] %s is up to date, skipping", name)
+                            METRICS.incr('stages_skipped')
+                            done.add(name)
+                        elif dry_run:
+                            log.info("[PIPELINE] Would run %s", name)
+                            done.add(name)
+                        else:
+                            running[pool.submit(run_stage, stage)] = (stage, fp)
+                else:
+                    continue
+                del pending[name]
+                progressed = True
+
+            if not running:
+                if pending and not progressed:
+                    raise ValueError(f"Stages depend on each other in a cycle: {', '.join(sorted(pending))}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, fp = running.pop(future)
+                returncode = future.result()
+                if returncode != 0:
+                    log.error("[PIPELINE] %s failed with exit code %d", stage.name, returncode)
+                    failed.add(stage.name)
+                    continue
+                state['stages'][stage.name] = {
+                    'fingerprint': fp,
+                    'outputs': {path: hasher.digest(path) for path in stage.outputs},
+                    'ran_at': time.time(),
+                }
+                save_state(state_path, state)
+                METRICS.incr('stages_run')
+                done.add(stage.name)
+    # keeps the hash memo of inputs that were only checked; a dry run leaves the state alone
+    if not dry_run:
+        save_state(state_path, state)
+    return failed
+
+
+def build_stages(args):
+    stages = []
+    base = os.path.splitext(args.output_csv)[0]
+    if args.movies:
+        search_inputs = [args.movies] + ([args.channel_rules] if args.channel_rules else [])
+        search_args = [args.movies, '--output-csv', args.output_csv, '--skip-json']
+        if args.channel_rules:
+            search_args += ['--channel-rules', args.channel_rules]
+        stages.append(Stage('search', SEARCH_SCRIPT, search_args + shlex.split(args.search_args),
+                            inputs=search_inputs, outputs=[args.output_csv, base + '_channels.csv']))
+        export_args = [args.movies, '--output-csv', args.output_csv, '--only-process-json', '1']
+        export_inputs = [args.output_csv]
+        if args.images_dir:
+            stages.append(Stage('images', 'poster_images.py',
+                                ['--input', args.output_csv, '--output-dir', args.images_dir,
+                                 '--manifest', args.image_manifest] + shlex.split(args.images_args),
+                                inputs=[args.output_csv], outputs=[args.image_manifest],
+                                ttl=args.images_ttl_hours * 3600,
+                                check=lambda: missing_files(load_manifest(args.image_manifest), args.images_dir)))
+            export_args += ['--image-manifest', args.image_manifest]
+            export_inputs.append(args.image_manifest)
+        stages.append(Stage('export', SEARCH_SCRIPT, export_args + shlex.split(args.json_args),
+                            inputs=export_inputs,
+                            outputs=[base + '.json', base + '.search.json',
+                                     os.path.join(base + '_shards', 'manifest.json')]))
+    if args.videos:
+        main_csv = args.match_main or args.movies
+        script, main_flag, videos_flag, output_flag = MATCHERS[args.matcher]
+        stages.append(Stage('match', script,
+                            [main_flag, main_csv, videos_flag, args.videos, output_flag, args.matches]
+                            + shlex.split(args.match_args),
+                            inputs=[main_csv, args.videos], outputs=[args.matches]))
+    if args.imdb_links:
+        stages.append(Stage('posters', 'extract_imdb_posters.py',
+                            ['--input', args.imdb_links, '--output', args.posters_output]
+                            + shlex.split(args.poster_args),
+                            inputs=[args.imdb_links], outputs=[args.posters_output],
+                            ttl=args.posters_ttl_hours * 3600))
+    return stages
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the BollyVault pipeline, skipping unchanged stages.')
+    parser.add_argument('--movies', help='Movie list csv searched on YouTube (search + export stages)')
+    parser.add_argument('--output-csv', default='output.csv', help='Search stage output csv')
+    parser.add_argument('--channel-rules', default=None, help='Channel rules json for the search stage')
+    parser.add_argument('--images-dir', default=None,
+                        help='Store local WebP copies of posters and thumbnails here (images stage), e.g. ../public/img')
+    parser.add_argument('--image-manifest', default='image_manifest.json', help='Images stage manifest')
+    parser.add_argument('--images-ttl-hours', type=float, default=24,
+                        help='Run the images stage again after this long so expired images are revalidated '
+                             '(0: every time)')
+    parser.add_argument('--videos', help='Scraped video links csv (match stage)')
+    parser.add_argument('--match-main', default=None, help='Movies csv for the matcher (default: --movies)')
+    parser.add_argument('--matcher', choices=sorted(MATCHERS), default='deepseek')
+    parser.add_argument('--matches', default='matches.csv', help='Matcher output csv')
+    parser.add_argument('--imdb-links', help='IMDb title urls, one per line (posters stage)')
+    parser.add_argument('--posters-output', default='imdb_posters_500px.txt')
+    parser.add_argument('--posters-ttl-hours', type=float, default=24,
+                        help='Run the posters stage again after this long so its cache can revalidate '
+                             'expired and missing posters (0: every time)')
+    for stage in ('search', 'json', 'images', 'match', 'poster'):
+        parser.add_argument(f'--{stage}-args', default='',
+                            help=f"Extra arguments for the {stage} script, e.g. --{stage}-args='-q' "
+                                 "(part of the stage's fingerprint)")
+    parser.add_argument('--state', default='.pipeline_state.json', help='Fingerprints of the last successful runs')
+    parser.add_argument('--jobs', type=int, default=3, help='Independent stages run at once')
+    parser.add_argument('--force', default='', help='Comma separated stages to rerun regardless')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would run')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.videos and not (args.match_main or args.movies):
+        parser.error("--videos needs --match-main or --movies")
+    return args
+
+
+def main():
+    args = parse_args()
+    metrics.setup(args)
+    stages = build_stages(args)
+    if not stages:
+        log.error("Nothing to run: pass --movies, --videos and/or --imdb-links")
+        sys.exit(2)
+
+    state = load_state(args.state)
+    force = {name for name in args.force.split(',') if name}
+    failed = run_pipeline(stages, state, args.state, args.jobs, force, args.dry_run)
+    metrics.finish(args)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
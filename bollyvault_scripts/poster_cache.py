@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+import time
+
+
+class PosterCache:
+    """Resolved poster urls keyed by IMDb tt id, with HTTP validators.
+
+    Entries younger than max_age are used as-is; older ones are revalidated
+    with a conditional GET using the stored ETag / Last-Modified. A page
+    without og:image is kept only for negative_max_age, since IMDb often adds
+    the poster later.
+    """
+
+    def __init__(self, path, max_age=30 * 24 * 3600, negative_max_age=24 * 3600):
+        self.max_age = max_age
+        self.negative_max_age = negative_max_age
+        self.counts = {'fresh': 0, 'not_modified': 0, 'fetched': 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS posters ('
+            ' imdb_id TEXT PRIMARY KEY,'
+            ' poster_url TEXT,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' fetched_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, imdb_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT poster_url, etag, last_modified, fetched_at FROM posters WHERE imdb_id = ?',
+                (imdb_id,)).fetchone()
+        if row is None:
+            return None
+        return {'poster_url': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def is_fresh(self, entry):
+        max_age = self.max_age if entry['poster_url'] else self.negative_max_age
+        return time.time() - entry['fetched_at'] < max_age
+
+    def put(self, imdb_id, poster_url, etag=None, last_modified=None):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO posters (imdb_id, poster_url, etag, last_modified, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (imdb_id, poster_url, etag, last_modified, time.time()))
+            self._conn.commit()
+
+    def touch(self, imdb_id):
+        # a 304 confirms the stored poster, restart its age
+        with self._lock:
+            self._conn.execute('UPDATE posters SET fetched_at = ? WHERE imdb_id = ?', (time.time(), imdb_id))
+            self._conn.commit()
+
+    def count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
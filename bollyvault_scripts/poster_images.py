@@ -0,0 +1,219 @@
+import argparse
+import csv
+import hashlib
+import io
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import metrics
+from atomic_io import atomic_open
+from image_manifest import IMAGE_COLUMNS, load_manifest, save_manifest
+from metrics import METRICS, log
+from rate_limit import TokenBucket
+from extract_imdb_posters import make_session
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Local copies of the posters and thumbnails the site shows. Each source
+# image is downloaded once, resized to a few WebP widths and written to
+# public/img under a name taken from its own bytes (<sha256 prefix>.webp), so
+# Caddy can serve that directory with an immutable cache header. A manifest
+# kept outside public/ records, per source url, the HTTP validators, the
+# sha256 of the source bytes and the files made from it. Fresh entries are
+# not refetched, and a 304 or an unchanged source hash skips the resize.
+#
+# Without Pillow the source bytes are stored as they are, under the same
+# kind of content-addressed name, and the page gets no srcset.
+
+WIDTHS = [160, 320, 480]
+SAVE_EVERY = 200
+MAGIC_EXTENSIONS = [(b'\xff\xd8', 'jpg'), (b'\x89PNG', 'png'), (b'GIF8', 'gif'), (b'RIFF', 'webp')]
+HASH_LENGTH = 20
+# the only names store_file() makes, and so the only files prune() may remove
+STORED_NAME_RE = re.compile(r'[0-9a-f]{%d}\.(?:webp|jpg|png|gif|img)' % HASH_LENGTH)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Download posters and thumbnails once and store resized WebP copies.')
+    parser.add_argument('--input', default='output.csv', help='Search stage output csv with the image columns')
+    parser.add_argument('--columns', default=','.join(IMAGE_COLUMNS), help='Comma separated image url columns')
+    parser.add_argument('--output-dir', default='../public/img', help='Content-addressed image files')
+    parser.add_argument('--manifest', default='image_manifest.json',
+                        help='Source url -> validators, hash and files; keep it outside the served directory')
+    parser.add_argument('--widths', default=','.join(map(str, WIDTHS)), help='Comma separated WebP widths')
+    parser.add_argument('--quality', type=int, default=80, help='WebP quality')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads and resizes')
+    parser.add_argument('--rate', type=float, default=5.0, help='Global download rate limit per second')
+    parser.add_argument('--max-age-days', type=float, default=30,
+                        help='Images checked more recently than this are not requested again')
+    parser.add_argument('--no-prune', action='store_true', help='Keep stored copies no manifest entry refers to')
+    metrics.add_arguments(parser)
+    return parser.parse_args()
+
+
+def source_urls(csv_path, columns):
+    """Distinct image urls of the given columns, in first-seen order."""
+    urls = {}
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for column in columns:
+                url = (row.get(column) or '').strip()
+                if url.startswith(('http://', 'https://', 'file://')):
+                    urls[url] = None
+    return list(urls)
+
+
+def is_local(url):
+    return urlparse(url).scheme in ('', 'file')
+
+
+def fetch_source(url, entry, session, bucket):
+    """(bytes or None for not modified, etag, last_modified)."""
+    if is_local(url):
+        # local files, e.g. fixtures; the source hash decides whether anything changed
+        with open(url2pathname(urlparse(url).path), 'rb') as f:
+            return f.read(), None, None
+    headers = {}
+    if entry and entry['files']:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    bucket.acquire()
+    response = session.get(url, headers=headers, timeout=20)
+    if response.status_code == 304 and headers:
+        return None, entry.get('etag'), entry.get('last_modified')
+    response.raise_for_status()
+    return response.content, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+def sniff_extension(data):
+    for magic, extension in MAGIC_EXTENSIONS:
+        if data.startswith(magic):
+            return extension
+    return 'img'
+
+
+def render_variants(data, widths, quality):
+    """[(width, bytes, extension)], widths never above the source; [(0, data, ext)] without Pillow."""
+    if Image is None:
+        return [(0, data, sniff_extension(data))]
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        variants = []
+        for width in sorted(set(min(width, image.width) for width in widths)):
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, 'WEBP', quality=quality)
+            variants.append((width, buffer.getvalue(), 'webp'))
+        return variants
+
+
+def store_file(output_dir, data, extension):
+    name = f"{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.{extension}"
+    path = os.path.join(output_dir, name)
+    # same name, same bytes: a file that exists is already right
+    if not os.path.exists(path):
+        with atomic_open(path, 'wb') as f:
+            f.write(data)
+    return name
+
+
+def update_image(url, entry, output_dir, settings, session, bucket, max_age):
+    """(new entry, outcome) for one source url."""
+    has_files = bool(entry and entry['files']) and all(
+        os.path.exists(os.path.join(output_dir, name)) for _, name in entry['files'])
+    if not has_files:
+        entry = dict(entry or {}, files=[])
+    elif time.time() - entry['checked_at'] < max_age and not is_local(url):
+        return entry, 'fresh'
+
+    data, etag, last_modified = fetch_source(url, entry, session, bucket)
+    checked = dict(entry, etag=etag, last_modified=last_modified, checked_at=time.time())
+    if data is None:
+        return checked, 'not_modified'
+    source_hash = hashlib.sha256(data).hexdigest()
+    if has_files and source_hash == entry.get('sha256'):
+        return checked, 'unchanged'
+    files = [[width, store_file(output_dir, payload, extension)]
+             for width, payload, extension in render_variants(data, settings['widths'], settings['quality'])]
+    return dict(checked, sha256=source_hash, files=files), 'rendered'
+
+
+def update_images(urls, manifest, output_dir, workers=8, rate=5.0, max_age=30 * 86400,
+                  session=None, on_progress=None):
+    """Bring manifest['images'] up to date for urls on a bounded pool; return outcome counts."""
+    os.makedirs(output_dir, exist_ok=True)
+    session = session or make_session(workers)
+    bucket = TokenBucket(rate, capacity=workers)
+    images = manifest['images']
+    counts = {'fresh': 0, 'not_modified': 0, 'unchanged': 0, 'rendered': 0, 'failed': 0}
+
+    def work(url):
+        try:
+            return url, *update_image(url, images.get(url), output_dir, manifest['settings'],
+                                      session, bucket, max_age)
+        except Exception as e:
+            log.warning(f"[IMAGES] {url}: {e}")
+            # a failed refresh keeps serving the files made last time
+            return url, images.get(url), 'failed'
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for done, (url, entry, outcome) in enumerate(pool.map(work, urls), 1):
+            if entry is not None:
+                images[url] = entry
+            counts[outcome] += 1
+            METRICS.incr('images_' + outcome)
+            if on_progress and done % SAVE_EVERY == 0:
+                on_progress()
+    return counts
+
+
+def prune(output_dir, manifest):
+    """Remove stored copies no manifest entry refers to; return how many.
+
+    Anything else in output_dir (files put there by hand, other tools) is left alone.
+    """
+    referenced = {name for entry in manifest['images'].values() for _, name in entry['files']}
+    removed = 0
+    for name in os.listdir(output_dir):
+        if name not in referenced and STORED_NAME_RE.fullmatch(name):
+            os.remove(os.path.join(output_dir, name))
+            removed += 1
+    return removed
+
+
+def main():
+    args = parse_args()
+    metrics.setup(args)
+    settings = {'widths': sorted(int(w) for w in args.widths.split(',') if w.strip()),
+                'quality': args.quality, 'webp': Image is not None}
+    if Image is None:
+        log.warning("[IMAGES] Pillow is not installed, storing source images without resizing")
+    manifest = load_manifest(args.manifest, settings)
+    urls = source_urls(args.input, [c.strip() for c in args.columns.split(',') if c.strip()])
+    log.info(f"[IMAGES] {len(urls)} source images in {args.input}")
+
+    with METRICS.stage('images'):
+        counts = update_images(urls, manifest, args.output_dir, args.workers, args.rate,
+                               args.max_age_days * 86400, on_progress=lambda: save_manifest(args.manifest, manifest))
+    # entries for urls no longer in the csv are dropped, and their files with them
+    manifest['images'] = {url: manifest['images'][url] for url in urls if url in manifest['images']}
+    save_manifest(args.manifest, manifest)
+    removed = 0 if args.no_prune else prune(args.output_dir, manifest)
+    log.info("[IMAGES] " + ' '.join(f"{key}={value}" for key, value in counts.items()) + f" pruned={removed}")
+    metrics.finish(args)
+
+
+if __name__ == '__main__':
+    main()
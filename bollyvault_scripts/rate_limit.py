@@ -0,0 +1,53 @@
+import asyncio
+import inspect
+import threading
+import time
+
+
+class TokenBucket:
+    """Global rate limiter: `rate` requests per second, bursts up to `capacity`.
+
+    acquire() blocks the calling thread, acquire_async() suspends the calling
+    task; both draw from the same bucket so mixed callers share one budget.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # take one token (possibly going negative) and return how long to wait
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+def rate_limited(backend, bucket):
+    """Wrap a sync or async search backend so every call takes a token first."""
+    if inspect.iscoroutinefunction(backend):
+        async def limited(query):
+            await bucket.acquire_async()
+            return await backend(query)
+    else:
+        def limited(query):
+            bucket.acquire()
+            return backend(query)
+    return limited
@@ -0,0 +1,123 @@
+import inspect
+import json
+import sqlite3
+import threading
+import time
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class SearchCache:
+    """SQLite-backed cache of raw search result lists.
+
+    Entries are keyed by (query, filter), expire after `ttl` seconds and the
+    least recently used ones are evicted once more than `max_entries` exist.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, max_entries=500000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS search_results ('
+            ' query TEXT NOT NULL,'
+            ' filter TEXT NOT NULL,'
+            ' fetched_at REAL NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' results TEXT NOT NULL,'
+            ' PRIMARY KEY (query, filter))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON search_results (last_used)')
+        self._conn.commit()
+
+    def get(self, query, search_filter=''):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT fetched_at, results FROM search_results WHERE query = ? AND filter = ?',
+                (query, search_filter)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl is not None and now - row[0] > self.ttl:
+                self.misses += 1
+                self.stale += 1
+                return None
+            self._conn.execute(
+                'UPDATE search_results SET last_used = ? WHERE query = ? AND filter = ?',
+                (now, query, search_filter))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[1])
+
+    def put(self, query, search_filter, results):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO search_results (query, filter, fetched_at, last_used, results) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (query, search_filter, now, now, json.dumps(results, ensure_ascii=False)))
+            self._puts_since_evict += 1
+            # evicting on every put would mean a COUNT(*) per search
+            if self._puts_since_evict >= 100:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._puts_since_evict = 0
+        count = self._conn.execute('SELECT COUNT(*) FROM search_results').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM search_results WHERE rowid IN '
+                '(SELECT rowid FROM search_results ORDER BY last_used LIMIT ?)', (excess,))
+
+    def wrap(self, backend, search_filter='', cache_only=False):
+        """Return a backend that answers from the cache and stores fresh results.
+
+        With cache_only, misses raise CacheMiss instead of going to the network.
+        """
+        def lookup(query):
+            results = self.get(query, search_filter)
+            if results is None and cache_only:
+                raise CacheMiss(f"no fresh cache entry for {query!r}")
+            return results
+
+        if inspect.iscoroutinefunction(backend):
+            async def cached(query):
+                results = lookup(query)
+                if results is None:
+                    results = await backend(query)
+                    self.put(query, search_filter, results)
+                return results
+        else:
+            def cached(query):
+                results = lookup(query)
+                if results is None:
+                    results = backend(query)
+                    self.put(query, search_filter, results)
+                return results
+        return cached
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
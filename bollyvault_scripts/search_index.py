@@ -0,0 +1,79 @@
+import os
+import re
+
+from atomic_io import write_json_atomic
+from metrics import METRICS, log
+from text_normalize import fold_title, normalize_many
+
+# Prebuilt search index for the site, written next to bollyvault.json:
+#
+#   {"version": 1, "count": <records>,
+#    "fields": {"title":  {"vocab": [sorted tokens], "postings": [[record ids], ...]},
+#               "people": {...}, "genre": {...}}}
+#
+# Record ids are positions in the bollyvault.json array. Every vocab is
+# sorted, so the page answers a prefix query with a binary search and a
+# union over one contiguous slice of postings instead of scanning movies.
+
+INDEX_VERSION = 1
+SEARCH_FIELDS = ['title', 'actors', 'directors', 'writers', 'genres']
+# words as the page tokenizes them; Devanagari vowel signs are not \w
+TOKEN_RE = re.compile(r'[\w\u0900-\u097F]+')
+
+
+def tokens(text):
+    return TOKEN_RE.findall(text.lower()) if isinstance(text, str) else []
+
+
+def title_tokens(title, normalized):
+    # the title as written plus its romanized form, so Devanagari and
+    # transliterated queries both land on the same record
+    found = set(tokens(fold_title(title))) if isinstance(title, str) else set()
+    if found:
+        found.update(tokens(normalized))
+    return found
+
+
+def _name_tokens(names):
+    found = set()
+    for name in names if isinstance(names, list) else []:
+        found.update(tokens(name))
+    return found
+
+
+def _field(postings):
+    vocab = sorted(postings)
+    return {'vocab': vocab, 'postings': [postings[token] for token in vocab]}
+
+
+def build_search_index(records):
+    """records: mappings with SEARCH_FIELDS, in bollyvault.json order."""
+    fields = {'title': {}, 'people': {}, 'genre': {}}
+    records = list(records)
+    # the romanized title column in one batch, each distinct title once
+    normalized = normalize_many([record.get('title') for record in records])
+    count = 0
+    for record_id, record in enumerate(records):
+        count += 1
+        people = (_name_tokens(record.get('actors')) | _name_tokens(record.get('directors'))
+                  | _name_tokens(record.get('writers')))
+        for field, found in (('title', title_tokens(record.get('title'), normalized[record_id])),
+                             ('people', people), ('genre', _name_tokens(record.get('genres')))):
+            postings = fields[field]
+            for token in found:
+                postings.setdefault(token, []).append(record_id)
+    return {'version': INDEX_VERSION, 'count': count,
+            'fields': {name: _field(postings) for name, postings in fields.items()}}
+
+
+def search_index_path(output_json):
+    return os.path.splitext(output_json)[0] + '.search.json'
+
+
+def write_search_index(path, records):
+    index = build_search_index(records)
+    write_json_atomic(path, index)
+    vocab = sum(len(field['vocab']) for field in index['fields'].values())
+    METRICS.gauge('search_index_tokens', vocab)
+    log.info(f"[INDEX] Wrote {vocab} tokens over {index['count']} records to {path}")
+    return index
@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import sqlite3
+
+from atomic_io import atomic_open
+
+
+class SearchJournal:
+    """Progress store for the YouTube search stage.
+
+    Every processed row and every newly discovered channel is committed to a
+    SQLite WAL database as it happens. Startup only opens the database, and
+    output.csv / output_channels.csv are materialized from it on demand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # separate --batch-index processes may share one journal; wait out their writes
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' imdb_id TEXT NOT NULL UNIQUE,'
+            ' row TEXT NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS channels ('
+            ' channel_id TEXT PRIMARY KEY,'
+            ' name TEXT, link TEXT, subscribers INTEGER);'
+        )
+        self._conn.commit()
+
+    def is_empty(self):
+        return self._conn.execute('SELECT 1 FROM results LIMIT 1').fetchone() is None
+
+    def is_processed(self, imdb_id):
+        return self._conn.execute('SELECT 1 FROM results WHERE imdb_id = ?', (imdb_id,)).fetchone() is not None
+
+    def get_fieldnames(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'fieldnames'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_fieldnames(self, fieldnames):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fieldnames', ?)",
+                           (json.dumps(list(fieldnames)),))
+        self._conn.commit()
+
+    def record(self, imdb_id, output_row):
+        # an upsert keeps the row's seq, so a rescored row stays in place in the csv
+        self._conn.execute('INSERT INTO results (imdb_id, row) VALUES (?, ?) '
+                           'ON CONFLICT (imdb_id) DO UPDATE SET row = excluded.row',
+                           (imdb_id, json.dumps(output_row, ensure_ascii=False)))
+        self._conn.commit()
+
+    def add_channel(self, channel_id, data):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO channels (channel_id, name, link, subscribers) VALUES (?, ?, ?, ?)',
+            (channel_id, data['name'], data['link'], data['subscribers']))
+        self._conn.commit()
+
+    def channels(self):
+        return {
+            channel_id: {'name': name, 'link': link, 'subscribers': subscribers}
+            for channel_id, name, link, subscribers in
+            self._conn.execute('SELECT channel_id, name, link, subscribers FROM channels')
+        }
+
+    def import_csv(self, output_csv, channel_cache):
+        # one-time migration of a run that predates the journal
+        if os.path.exists(output_csv):
+            with open(output_csv, 'r', newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                if reader.fieldnames and 'imdb_id' in reader.fieldnames:
+                    self._conn.executemany(
+                        'INSERT OR REPLACE INTO results (imdb_id, row) VALUES (?, ?)',
+                        ((row['imdb_id'], json.dumps(row, ensure_ascii=False)) for row in reader))
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO channels (channel_id, name, link, subscribers) VALUES (?, ?, ?, ?)',
+            ((cid, d['name'], d['link'], d['subscribers']) for cid, d in channel_cache.items()))
+        self._conn.commit()
+
+    def iter_rows(self):
+        for (row,) in self._conn.execute('SELECT row FROM results ORDER BY seq'):
+            yield json.loads(row)
+
+    def materialize_csv(self, output_csv, fieldnames=None):
+        fieldnames = fieldnames or self.get_fieldnames()
+        with atomic_open(output_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.iter_rows())
+
+    def close(self):
+        self._conn.close()
@@ -1,18 +1,26 @@
 import argparse
 import csv
+import importlib
 import re
-import time
 import os
-import pandas as pd
-from difflib import SequenceMatcher
 from typing import Dict, Optional, Any
 from youtubesearchpython import VideosSearch, CustomSearch, VideoDurationFilter
-from indic_transliteration import sanscript
-from indic_transliteration.sanscript import transliterate  # Added missing import
-
-# Channel lists (to be populated later)
-whitelisted_channels = []
-blacklisted_channels = []
+from similarity import title_similarity, similarity_scorer
+from channel_rules import ChannelRules
+from rate_limit import TokenBucket, rate_limited
+from search_cache import CacheMiss, SearchCache
+from async_search import run_search_rows
+from search_workers import search_with_workers
+from json_export import export_json, export_json_incremental, write_json_atomic
+from search_journal import SearchJournal
+from search_index import search_index_path, write_search_index
+from category_shards import write_site_files
+from image_manifest import apply_image_manifest, load_manifest
+import metrics
+from metrics import METRICS, log
+
+# Accept-everything rules; process_csv loads --channel-rules per run and passes them down
+NO_RULES = ChannelRules()
 
 # Channel cache to reduce API calls
 channel_cache = {}
@@ -24,22 +32,52 @@ def parse_args():
     parser.add_argument('--batch-size', type=int, help='Number of rows to process in each batch')
     parser.add_argument('--batch-index', type=int, help='Index of the current batch (0-based)')
     parser.add_argument('--only-process-json', default=False, help='Only create output json using output csv arg')
-    return parser.parse_args()
-
-def initialize_output(output_csv, fieldnames):
-    if not os.path.exists(output_csv):
-        with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-
-def get_processed_ids(output_csv):
-    processed = set()
-    if os.path.exists(output_csv):
-        with open(output_csv, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            if reader.fieldnames and 'imdb_id' in reader.fieldnames:
-                processed = {row['imdb_id'] for row in reader}
-    return processed
+    parser.add_argument('--skip-json', action='store_true',
+                        help='Stop after the search; pipeline.py runs the json export as its own stage')
+    parser.add_argument('--incremental-json', action='store_true',
+                        help='Only recompute rows that changed since the last json export')
+    parser.add_argument('--frame-cache', default=None,
+                        help='Parquet copy of the cleaned output frame, reused by the json export while '
+                             'the output csv is unchanged (needs pyarrow)')
+    parser.add_argument('--image-manifest', default=None,
+                        help='Manifest written by poster_images.py; the json export then points poster and '
+                             'thumbnail urls at the local WebP copies')
+    parser.add_argument('--image-url-prefix', default='/img/', help='Where the site serves poster_images.py files')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Searches in flight at once; above 1 runs the async search engine')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Search the pending rows on N workers sharing one rate limit, channel cache '
+                             'and journal; replaces launching one process per --batch-index by hand')
+    parser.add_argument('--rate', type=float, default=1 / 1.5,
+                        help='Global search rate limit in requests per second (default: one per 1.5s)')
+    parser.add_argument('--burst', type=float, default=1.0, help='Token bucket capacity for the rate limit')
+    parser.add_argument('--channel-rules', default=None,
+                        help='JSON file of allowed/denied channels and denied title keywords '
+                             '(see channel_rules.example.json)')
+    parser.add_argument('--search-backend', default=None,
+                        help='Search backend as module:function taking a query and returning '
+                             'CustomSearch-shaped results (default: youtubesearchpython CustomSearch)')
+    parser.add_argument('--cache-db', default=None,
+                        help='SQLite file caching raw search results (default: <output-csv>_search_cache.sqlite)')
+    parser.add_argument('--no-cache', action='store_true', help='Always query the network')
+    parser.add_argument('--cache-ttl-days', type=float, default=30, help='Age after which cached results are refetched')
+    parser.add_argument('--cache-max-entries', type=int, default=500000, help='LRU bound on cached queries')
+    parser.add_argument('--cache-only', action='store_true',
+                        help='Never hit the network; rows without a fresh cache entry are skipped and left '
+                             'for an online run')
+    parser.add_argument('--rescore', action='store_true',
+                        help='Pick the best video again for every row, processed or not, from cached results '
+                             'of any age; never hits the network')
+    parser.add_argument('--journal-db', default=None,
+                        help='SQLite progress journal (default: <output-csv>_journal.sqlite); '
+                             'output csvs are materialized from it')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.workers > 1 and args.concurrency > 1:
+        parser.error("--workers and --concurrency are alternative engines, pick one")
+    if args.rescore and args.no_cache:
+        parser.error("--rescore reads the search cache, it cannot be combined with --no-cache")
+    return args
 
 def read_channels_csv(filename):
     cache = {}
@@ -76,30 +114,6 @@ def format_duration(seconds: int) -> str:
     seconds = seconds % 60
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}" if hours > 0 else f"{minutes:02d}:{seconds:02d}"
 
-def normalize_text(text: str) -> str:
-    text = re.sub(r'(full movie|hd|official|पूरी फिल्म)', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'[^a-zA-Z0-9\u0900-\u097F ]', '', text).strip()
-    if re.search(r'[\u0900-\u097F]', text):
-        text = transliterate(text, sanscript.DEVANAGARI, sanscript.ITRANS)
-    return text.lower()
-
-def contains_foreign_script(text: str) -> bool:
-    clean_text = re.sub(r'[♤☆♥♦♣♠•●■►▼▲►▼◄►▼►►▼◄►▼►►▼◄►▼►►▼◄►▼►►▼◄►▼》→←↑↓↔↕↨©®™°²³‰§¶¥¢£€]', '', text)
-    clean_text = re.sub(r'[^\w\u0900-\u097F\s\-\|]', '', clean_text)
-    foreign_pattern = re.compile(r'[^\u0000-\u00FF\u0900-\u097F]')
-    return bool(foreign_pattern.search(clean_text))
-
-def title_similarity(a: str, b: str) -> float:
-    core_text = re.sub(r'[^\w\u0900-\u097F\s]', '', b)
-    foreign_penalty = 0.5 if contains_foreign_script(core_text) else 1.0
-    a_norm = normalize_text(a)
-    b_norm = normalize_text(b)
-    seq_match = SequenceMatcher(None, a_norm, b_norm).ratio()
-    a_words = set(a_norm.split())
-    b_words = set(b_norm.split())
-    word_overlap = len(a_words & b_words) / max(len(a_words), 1)
-    return ((seq_match * 0.7) + (word_overlap * 0.3)) * foreign_penalty
-
 def parse_duration(duration_str: str) -> int:
     """Convert duration string (HH:MM:SS or MM:SS) to total seconds"""
     try:
@@ -108,90 +122,183 @@ def parse_duration(duration_str: str) -> int:
     except:
         return 0
 
-def search_youtube_noapi(movie_name: str, year: str) -> Optional[Dict]:
-    base_query = f"{movie_name} {clean_year(year)} full movie -songs -song -lyrics -lyric -album -albums -review -reviews -fact -facts -bioscope -part -episode -cinemaghar"
-    print(f"\n[DEBUG] Search Query: {base_query}")
+def build_search_query(movie_name: str, year: str) -> str:
+    return f"{movie_name} {clean_year(year)} full movie -songs -song -lyrics -lyric -album -albums -review -reviews -fact -facts -bioscope -part -episode -cinemaghar"
+
+SEARCH_FILTER = VideoDurationFilter.long
+
+def custom_search_backend(query: str) -> list:
+    videos_search = CustomSearch(query, SEARCH_FILTER, limit=10)
+    return videos_search.result()['result']
+
+def load_search_backend(spec: Optional[str]):
+    if not spec:
+        return custom_search_backend
+    module_name, _, func_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), func_name or 'search')
+
+# a cache-only run had no results for the row; it is not written, so it stays unprocessed
+UNCACHED = object()
+
+def skip_uncached(backend):
+    def search(query):
+        try:
+            return backend(query)
+        except CacheMiss:
+            return UNCACHED
+    return search
+
+def search_youtube_noapi(movie_name: str, year: str, backend=custom_search_backend,
+                         rules: ChannelRules = NO_RULES) -> Optional[Dict]:
+    base_query = build_search_query(movie_name, year)
+    log.debug("[SEARCH] Query: %s", base_query)
     
     try:
-        videos_search = CustomSearch(base_query, VideoDurationFilter.long, limit=10)
-        results = videos_search.result()['result']
-        print(f"[DEBUG] Found {len(results)} results")
+        results = backend(base_query)
+        if results is UNCACHED:
+            return UNCACHED
+        log.debug("[SEARCH] Found %d results", len(results))
     except Exception as e:
-        print(f"Search Error: {e}")
+        log.warning(f"Search Error: {e}")
+        METRICS.incr('search_errors')
         return None
 
-    filtered_results = []
+    return pick_best_video(movie_name, results, rules)
+
+def video_info_for(video, duration_sec, similarity, duration_score, total_score) -> Dict:
+    channel = video.get('channel', {})
+    return {
+        'title': video['title'],
+        'link': video['link'],
+        'duration': duration_sec,
+        'thumbnail': video['thumbnails'][-1]['url'] if video['thumbnails'] else '',
+        'channel': channel.get('name', ''),
+        'channel_id': channel.get('id', ''),
+        'views': video.get('viewCount', {}).get('text', ''),
+        'similarity_score': similarity,
+        'duration_score': duration_score,
+        'total_score': total_score
+    }
+
+def pick_best_video(movie_name: str, results: list, rules: ChannelRules = NO_RULES) -> Optional[Dict]:
+    candidates = []
     for video in results:
-        channel = video.get('channel', {})
-        channel_id = channel.get('id', '')
-        if channel_id in blacklisted_channels:
-            print(f"[BLACKLIST] Skipping {video['title'][:50]}...")
+        channel_id = video.get('channel', {}).get('id', '')
+        duration_sec = parse_duration(video.get('duration', '0:00'))
+        reason = rules.reject_reason(channel_id, video['title'], duration_sec)
+        if reason:
+            log.debug("[RULES] Skipping %s... (%s)", video['title'][:50], reason)
+            METRICS.incr('results_rejected')
             continue
-        filtered_results.append(video)
 
-    print(f"[DEBUG] {len(filtered_results)} results after blacklist filtering")
+        if rules.is_allowed(channel_id):
+            similarity = title_similarity(movie_name, video['title'])
+            duration_score = min(duration_sec / 7200, 1.0)
+            total_score = (similarity * 0.8) + (duration_score * 0.2)
+            log.debug("[WHITELIST] Found match: %s... (Score: %.2f)", video['title'][:50], total_score)
+            return video_info_for(video, duration_sec, similarity, duration_score, total_score)
 
-    whitelisted_videos = [v for v in filtered_results if v.get('channel', {}).get('id', '') in whitelisted_channels]
-    if whitelisted_videos:
-        video = whitelisted_videos[0]
-        channel = video.get('channel', {})
-        duration_sec = parse_duration(video.get('duration', '0:00'))
-        similarity = title_similarity(movie_name, video['title'])
-        duration_score = min(duration_sec / 7200, 1.0)
-        total_score = (similarity * 0.8) + (duration_score * 0.2)
-        
-        print(f"[WHITELIST] Found match: {video['title'][:50]}... (Score: {total_score:.2f})")
-        return {
-            'title': video['title'],
-            'link': video['link'],
-            'duration': duration_sec,
-            'thumbnail': video['thumbnails'][-1]['url'] if video['thumbnails'] else '',
-            'channel': channel.get('name', ''),
-            'channel_id': channel.get('id', ''),
-            'views': video.get('viewCount', {}).get('text', ''),
-            'similarity_score': similarity,
-            'duration_score': duration_score,
-            'total_score': total_score
-        }
+        candidates.append((video, duration_sec, min(duration_sec / 7200, 1.0)))
+
+    log.debug("[SEARCH] %d results after channel rules", len(candidates))
 
+    # Branch and bound: similarity is at most 1, so 0.8 + 0.2 * duration_score
+    # bounds a result's total. Visiting results by that bound, everything past
+    # the first bound below the best total can be skipped unscored; ties keep
+    # the earliest result, exactly like a full scan. The scorer's cheaper LCS
+    # bound then skips the difflib ratio for results that cannot win either.
+    score = similarity_scorer(movie_name)
     best_video = None
     best_score = -1
-    for idx, video in enumerate(filtered_results):
-        title = video['title']
-        duration_sec = parse_duration(video.get('duration', '0:00'))
-        similarity = title_similarity(movie_name, title)
-        duration_score = min(duration_sec / 7200, 1.0)
+    best_idx = None
+    order = sorted(range(len(candidates)), key=lambda i: -candidates[i][2])
+    for rank, idx in enumerate(order):
+        video, duration_sec, duration_score = candidates[idx]
+        bound = (1.0 * 0.8) + (duration_score * 0.2)
+        if bound < best_score:
+            METRICS.incr('results_pruned', len(order) - rank)
+            break
+        if bound == best_score and idx > best_idx:
+            METRICS.incr('results_pruned')
+            continue
+        bound = (score.upper_bound(video['title']) * 0.8) + (duration_score * 0.2)
+        if bound < best_score or (bound == best_score and idx > best_idx):
+            METRICS.incr('results_pruned')
+            continue
+        similarity = score(video['title'])
         total_score = (similarity * 0.8) + (duration_score * 0.2)
-        
-        print(f"[SCORING {idx+1}/{len(filtered_results)}] {title[:50]}... | Similarity: {similarity:.2f} | Duration: {duration_sec}s | Total: {total_score:.2f}")
-        if total_score > best_score:
+        METRICS.incr('results_scored')
+
+        log.debug("[SCORING %d/%d] %s... | Similarity: %.2f | Duration: %ds | Total: %.2f",
+                  idx + 1, len(candidates), video['title'][:50], similarity, duration_sec, total_score)
+        if total_score > best_score or (total_score == best_score and idx < best_idx):
             best_score = total_score
-            channel = video.get('channel', {})
-            best_video = {
-                'title': title,
-                'link': video['link'],
-                'duration': duration_sec,
-                'thumbnail': video['thumbnails'][-1]['url'] if video['thumbnails'] else '',
-                'channel': channel.get('name', ''),
-                'channel_id': channel.get('id', ''),
-                'views': video.get('viewCount', {}).get('text', ''),
-                'similarity_score': similarity,
-                'duration_score': duration_score,
-                'total_score': total_score
-            }
+            best_idx = idx
+            best_video = video_info_for(video, duration_sec, similarity, duration_score, total_score)
 
     if best_video:
-        print(f"[BEST MATCH] Selected: {best_video['title'][:50]}... (Score: {best_score:.2f})")
+        log.debug("[BEST MATCH] Selected: %s... (Score: %.2f)", best_video['title'][:50], best_score)
     else:
-        print("[WARNING] No suitable video found")
+        log.debug("[SEARCH] No suitable video found")
 
     return best_video
 
+def build_output_row(row, video_info, journal=None, rules=NO_RULES):
+    output_row = row.copy()
+    if video_info:
+        channel_id = video_info.get('channel_id', '')
+        if channel_id and channel_id not in channel_cache:
+            log.info(f"[NEW CHANNEL] Adding {channel_id} to cache")
+            METRICS.incr('new_channels')
+            channel_cache[channel_id] = {
+                'name': video_info['channel'],
+                'link': f"https://www.youtube.com/channel/{channel_id}",
+                'subscribers': None
+            }
+            if journal is not None:
+                journal.add_channel(channel_id, channel_cache[channel_id])
+
+        subs = channel_cache.get(channel_id, {}).get('subscribers', 0)
+        relevance = 'H' if rules.is_allowed(channel_id) else 'M' if (subs or 0) >= 100000 else 'L'
+
+        output_row.update({
+            'YouTube Link': video_info['link'],
+            'Video Title': video_info['title'],
+            'Duration (HH:MM:SS)': format_duration(video_info['duration']),
+            'Thumbnail': video_info['thumbnail'],
+            'Channel': video_info['channel'],
+            'Channel ID': channel_id,
+            'Channel Link': channel_cache.get(channel_id, {}).get('link', ''),
+            'Subscribers': channel_cache.get(channel_id, {}).get('subscribers', ''),
+            'Relevance': relevance,
+            'Similarity Score': video_info['similarity_score'],
+            'Duration Score': video_info['duration_score'],
+            'Total Score': video_info['total_score'],
+            'Views': video_info['views']
+        })
+        log.debug("[SUCCESS] Found match for %s", row['title'])
+        METRICS.incr('rows_matched')
+    else:
+        output_row.update({
+            'YouTube Link': '', 'Video Title': '', 'Duration (HH:MM:SS)': '',
+            'Thumbnail': '', 'Channel': '', 'Channel ID': '', 'Channel Link': '',
+            'Subscribers': '', 'Relevance': '', 'Similarity Score': '',
+            'Duration Score': '', 'Total Score': '', 'Views': ''
+        })
+        log.debug("[NO MATCH] No match found for %s", row['title'])
+        METRICS.incr('rows_unmatched')
+    return output_row
+
 def process_csv(args):
     global channel_cache
+    rules = ChannelRules.load(args.channel_rules) if args.channel_rules else NO_RULES
     channels_csv = os.path.splitext(args.output_csv)[0] + '_channels.csv'
-    channel_cache = read_channels_csv(channels_csv)
-    processed_ids = get_processed_ids(args.output_csv)
+    journal_db = args.journal_db or os.path.splitext(args.output_csv)[0] + '_journal.sqlite'
+    journal_exists = os.path.exists(journal_db)
+    journal = SearchJournal(journal_db)
+    if not journal_exists:
+        journal.import_csv(args.output_csv, read_channels_csv(channels_csv))
+    channel_cache = journal.channels()
 
     with open(args.input_csv, 'r', newline='', encoding='utf-8') as infile:
         reader = csv.DictReader(infile)
@@ -200,126 +307,125 @@ def process_csv(args):
             'Channel', 'Channel ID', 'Channel Link', 'Subscribers', 'Relevance',
             'Similarity Score', 'Duration Score', 'Total Score', 'Views'
         ]
-        initialize_output(args.output_csv, fieldnames)
+        journal.set_fieldnames(fieldnames)
 
-        all_rows = [row for row in reader if row['imdb_id'] not in processed_ids]
+        all_rows = list(reader)
         if args.batch_size and args.batch_index is not None:
             start = args.batch_index * args.batch_size
             all_rows = all_rows[start:start+args.batch_size]
+        # batches are cut from the input before finished rows are dropped, so a
+        # resumed batch still owns the same rows; repeated ids are searched once
+        seen_ids = set()
+        pending = []
+        for row in all_rows:
+            # a rescore revisits processed rows too
+            if row['imdb_id'] in seen_ids or (not args.rescore and journal.is_processed(row['imdb_id'])):
+                continue
+            seen_ids.add(row['imdb_id'])
+            pending.append(row)
+        all_rows = pending
 
         total_rows = len(all_rows)
-        for idx, row in enumerate(all_rows, 1):
-            print(f"\n[{idx}/{total_rows}] Processing {row['imdb_id']}: {row['title']}")
-            video_info = None
-            try:
-                video_info = search_youtube_noapi(row['title'], row['year_of_release'])
-            except Exception as e:
-                print(f"Error: {e}")
-
-            output_row = row.copy()
-            if video_info:
-                channel_id = video_info.get('channel_id', '')
-                if channel_id and channel_id not in channel_cache:
-                    print(f"[NEW CHANNEL] Adding {channel_id} to cache")
-                    channel_cache[channel_id] = {
-                        'name': video_info['channel'],
-                        'link': f"https://www.youtube.com/channel/{channel_id}",
-                        'subscribers': None
-                    }
-
-                subs = channel_cache.get(channel_id, {}).get('subscribers', 0)
-                relevance = 'H' if channel_id in whitelisted_channels else 'M' if (subs or 0) >= 100000 else 'L'
-
-                output_row.update({
-                    'YouTube Link': video_info['watch_link'],
-                    'Video Title': video_info['title'],
-                    'Duration (HH:MM:SS)': format_duration(video_info['duration']),
-                    'Thumbnail': video_info['thumbnail'],
-                    'Channel': video_info['channel'],
-                    'Channel ID': channel_id,
-                    'Channel Link': channel_cache.get(channel_id, {}).get('link', ''),
-                    'Subscribers': channel_cache.get(channel_id, {}).get('subscribers', ''),
-                    'Relevance': relevance,
-                    'Similarity Score': video_info['similarity_score'],
-                    'Duration Score': video_info['duration_score'],
-                    'Total Score': video_info['total_score'],
-                    'Views': video_info['views']
-                })
-                print(f"[SUCCESS] Found match for {row['title']}")
-            else:
-                output_row.update({
-                    'YouTube Link': '', 'Video Title': '', 'Duration (HH:MM:SS)': '',
-                    'Thumbnail': '', 'Channel': '', 'Channel ID': '', 'Channel Link': '',
-                    'Subscribers': '', 'Relevance': '', 'Similarity Score': '',
-                    'Duration Score': '', 'Total Score': '', 'Views': ''
-                })
-                print(f"[WARNING] No match found for {row['title']}")
-
-            with open(args.output_csv, 'a', newline='', encoding='utf-8') as outfile:
-                writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-                writer.writerow(output_row)
-                print(f"[WRITTEN] Updated record for {row['title']}")
-
-            processed_ids.add(row['imdb_id'])
-            time.sleep(1.5)
-
-    write_channels_csv(channels_csv, channel_cache)
+        backend = load_search_backend(args.search_backend)
+        search_filter = str(getattr(backend, 'search_filter', SEARCH_FILTER))
+        # only network calls take a rate-limit token or count as search latency
+        backend = rate_limited(metrics.timed_call(backend, 'search_latency_seconds'),
+                               TokenBucket(args.rate, args.burst))
+        cache = None
+        if not args.no_cache:
+            cache_db = args.cache_db or os.path.splitext(args.output_csv)[0] + '_search_cache.sqlite'
+            # results of any age are good enough to rescore
+            ttl = None if args.rescore else args.cache_ttl_days * 86400
+            cache = SearchCache(cache_db, ttl=ttl, max_entries=args.cache_max_entries)
+            backend = cache.wrap(backend, search_filter, cache_only=args.cache_only or args.rescore)
+            backend = skip_uncached(backend)
+
+        def write_result(idx, row, video_info):
+            if video_info is UNCACHED:
+                log.debug("[UNCACHED] Leaving %s for an online run", row['title'])
+                METRICS.incr('rows_uncached')
+                return
+            output_row = build_output_row(row, video_info, journal, rules)
+            journal.record(row['imdb_id'], output_row)
+            log.debug("[WRITTEN] Updated record for %s", row['title'])
+            METRICS.incr('rows_written')
+            if METRICS.counters['rows_written'] % 100 == 0:
+                log.info(f"[PROGRESS] {METRICS.counters['rows_written']}/{total_rows} rows written")
+
+        if args.concurrency > 1:
+            log.info(f"[ASYNC] Searching {total_rows} rows with concurrency {args.concurrency}, rate {args.rate:.2f}/s")
+            run_search_rows(
+                all_rows,
+                make_query=lambda row: build_search_query(row['title'], row['year_of_release']),
+                backend=backend,
+                score=lambda row, results: (UNCACHED if results is UNCACHED
+                                            else pick_best_video(row['title'], results, rules)),
+                on_result=write_result,
+                concurrency=args.concurrency,
+            )
+        elif args.workers > 1:
+            log.info(f"[WORKERS] Searching {total_rows} rows on {args.workers} workers, rate {args.rate:.2f}/s")
+            search_with_workers(
+                all_rows,
+                search=lambda row: search_youtube_noapi(row['title'], row['year_of_release'], backend, rules),
+                on_result=write_result,
+                workers=args.workers,
+            )
+        else:
+            for idx, row in enumerate(all_rows, 1):
+                log.debug("[%d/%d] Processing %s: %s", idx, total_rows, row['imdb_id'], row['title'])
+                video_info = None
+                try:
+                    video_info = search_youtube_noapi(row['title'], row['year_of_release'], backend, rules)
+                except Exception as e:
+                    log.warning(f"Error: {e}")
+                write_result(idx, row, video_info)
+
+        if cache is not None:
+            stats = cache.stats()
+            METRICS.gauge('cache', stats)
+            log.info(f"[CACHE] hits={stats['hits']} misses={stats['misses']} stale={stats['stale']} "
+                     f"hit_rate={stats['hit_rate']:.1%}")
+            cache.close()
+
+    # csv outputs are a materialized view of the journal
+    journal.materialize_csv(args.output_csv, fieldnames)
+    write_channels_csv(channels_csv, journal.channels())
+    journal.close()
 
 def process_json(args):
     output_json = os.path.splitext(args.output_csv)[0] + '.json'
-    df = pd.read_csv(args.output_csv)
-    
-    # Clean data
-    df['year_of_release'] = pd.to_numeric(df['year_of_release'], errors='coerce')
-    df = df[df['year_of_release'].between(1900, 2025)]
-    
-    df['runtime'] = pd.to_numeric(df['runtime'], errors='coerce').replace(-1, pd.NA)
-    
-    # Handle string columns safely
-    df['imdb_votes'] = df['imdb_votes'].astype(str).str.replace(',', '').replace('nan', '0').astype(int)
-    df['genres'] = df['genres'].fillna('').apply(lambda x: x.split('|') if x else [])
-    df['directors'] = df['directors'].fillna('').apply(lambda x: x.split('|') if x else [])
-    df['writers'] = df['writers'].fillna('').apply(lambda x: x.split('|') if x else [])
-    df['actors'] = df['actors'].fillna('').apply(lambda x: x.split('|') if x else [])
-    df['imdb_rating'] = pd.to_numeric(df['imdb_rating'], errors='coerce')
-    df['has_wins_nominations'] = df['wins_nominations'].notna() & (df['wins_nominations'] != '')
- 
-    # Calculate movie era
-    def get_movie_era(year):
-        if pd.isna(year):
-            return 'Unknown'
-        if year <= 1980:
-            return 'Classic'
-        elif 1981 <= year <= 2000:
-            return 'Golden'
-        elif 2001 <= year <= 2020:
-            return 'Modern'
-        else:
-            return 'Contemporary'
-    df['movie_era'] = df['year_of_release'].apply(get_movie_era)
-    
-    # Calculate IMDb relevance
-    min_votes = df['imdb_votes'].min()
-    max_votes = df['imdb_votes'].max()
-    df['normalized_votes'] = (df['imdb_votes'] - min_votes) / (max_votes - min_votes) if max_votes != min_votes else 0.0
-    df['imdb_relevance'] = (df['imdb_rating'] / 10 * 0.6) + (df['normalized_votes'] * 0.3) + (df['has_wins_nominations'] * 0.1)
-    
-    # Convert to JSON
-    df.to_json(output_json, orient='records', indent=2)
-    print(f"[JSON] Successfully wrote {len(df)} records to {output_json}")
+    if args.incremental_json:
+        records = export_json_incremental(args.output_csv, output_json)
+    else:
+        records = export_json(args.output_csv, output_json, args.frame_cache)
+    if args.image_manifest:
+        replaced = apply_image_manifest(records, load_manifest(args.image_manifest), args.image_url_prefix)
+        write_json_atomic(output_json, records)
+        log.info(f"[IMAGES] {replaced} image urls point at local copies")
+    index_path = search_index_path(output_json)
+    write_search_index(index_path, records)
+    write_site_files(output_json, records, index_path)
 
 def main():
     args = parse_args()
+    metrics.setup(args)
     if(args.only_process_json):
         if(args.output_csv is None):
-            print(f"Pass an --output-csv as well to process json from it")
+            log.error(f"Pass an --output-csv as well to process json from it")
             return None
         
-        process_json(args)
+        with METRICS.stage('json_export'), metrics.profiled(args.profile is not None, args.profile or None):
+            process_json(args)
+        metrics.finish(args)
         return None
 
-    process_csv(args)
-    process_json(args)
+    with METRICS.stage('search'), metrics.profiled(args.profile is not None, args.profile or None):
+        process_csv(args)
+    if not args.skip_json:
+        with METRICS.stage('json_export'):
+            process_json(args)
+    metrics.finish(args)
 
 if __name__ == '__main__':
     main()
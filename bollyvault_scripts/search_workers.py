@@ -0,0 +1,54 @@
+import queue
+import threading
+
+from metrics import METRICS, log
+
+
+def search_with_workers(rows, search, on_result, workers=4):
+    """Run search(row) on `workers` threads and hand results back in input order.
+
+    Rows are dealt out one at a time from a shared cursor, so every row goes
+    to exactly one worker and the reorder buffer never grows much beyond the
+    worker count. on_result(idx, row, result) runs on the calling thread only,
+    which keeps the journal, the channel cache and the output single-writer.
+    A search that raises is reported as None, like the serial path.
+    """
+    rows = list(rows)
+    cursor = iter(enumerate(rows))
+    cursor_lock = threading.Lock()
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            with cursor_lock:
+                item = next(cursor, None)
+            if item is None:
+                break
+            idx, row = item
+            try:
+                result = search(row)
+            except Exception as e:
+                log.warning(f"Search Error: {e}")
+                METRICS.incr('search_errors')
+                result = None
+            results.put((idx, row, result))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(workers, len(rows))))]
+    for thread in threads:
+        thread.start()
+
+    done = {}
+    next_idx = 0
+    try:
+        while next_idx < len(rows):
+            idx, row, result = results.get()
+            done[idx] = (row, result)
+            while next_idx in done:
+                on_result(next_idx, *done.pop(next_idx))
+                next_idx += 1
+    finally:
+        # on an error in on_result, let workers finish their current row and quit
+        stop.set()
+        for thread in threads:
+            thread.join()
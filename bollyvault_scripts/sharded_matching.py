@@ -0,0 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+def shard_bounds(total, shards):
+    # contiguous [start, stop) ranges, so merged results keep the input order
+    shards = max(1, min(shards, total))
+    size, extra = divmod(total, shards)
+    bounds = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def merge_shard_candidates(results):
+    # results arrive in shard order; concatenating per key preserves video order
+    merged = {}
+    for shard in results:
+        for key, candidates in shard.items():
+            merged.setdefault(key, []).extend(candidates)
+    return merged
+
+
+def discover_sharded(discover, shard_args, workers):
+    """Run discover(*args) for every shard in a process pool and merge.
+
+    discover must be a module-level function returning {key: [candidate, ...]}.
+    The greedy assignment is left to the caller, which runs it once over the
+    merged lists, so the outcome does not depend on the worker count.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(discover, *args) for args in shard_args]
+        return merge_shard_candidates(f.result() for f in futures)
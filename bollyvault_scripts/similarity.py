@@ -0,0 +1,101 @@
+from difflib import SequenceMatcher
+
+from text_normalize import normalize_text, contains_foreign_script, strip_non_core
+
+# Title similarity: 0.7 * difflib sequence ratio + 0.3 * word overlap, halved
+# for results in a foreign script. A scorer made by similarity_scorer also
+# offers upper_bound(): the same formula with 2*LCS/(len(a)+len(b)) in place
+# of the Ratcliff-Obershelp ratio. The LCS is computed bit-parallel (Hyyro
+# 2004) over Python ints and is never shorter than the matching blocks
+# difflib finds, so callers can skip results whose bound cannot win.
+
+SEQUENCE_WEIGHT = 0.7
+OVERLAP_WEIGHT = 0.3
+FOREIGN_PENALTY = 0.5
+
+
+class _Pattern:
+    __slots__ = ('text', 'masks', 'full', 'words')
+
+    def __init__(self, text):
+        self.text = text
+        masks = {}
+        for i, ch in enumerate(text):
+            masks[ch] = masks.get(ch, 0) | (1 << i)
+        self.masks = masks
+        self.full = (1 << len(text)) - 1
+        self.words = set(text.split())
+
+    def lcs(self, other):
+        masks, full = self.masks, self.full
+        v = full
+        for ch in other:
+            u = v & masks.get(ch, 0)
+            if u:
+                v = ((v + u) | (v - u)) & full
+        return len(self.text) - bin(v).count('1')
+
+    def ratio(self, other):
+        total = len(self.text) + len(other)
+        if not total:
+            return 1.0
+        return 2.0 * self.lcs(other) / total
+
+
+def _combine(seq_match, word_overlap, candidate):
+    foreign_penalty = FOREIGN_PENALTY if contains_foreign_script(strip_non_core(candidate)) else 1.0
+    return ((seq_match * SEQUENCE_WEIGHT) + (word_overlap * OVERLAP_WEIGHT)) * foreign_penalty
+
+
+class _Scorer:
+    __slots__ = ('pattern',)
+
+    def __init__(self, query):
+        self.pattern = _Pattern(normalize_text(query))
+
+    def _overlap(self, b_norm):
+        words = self.pattern.words
+        return len(words & set(b_norm.split())) / max(len(words), 1)
+
+    def __call__(self, candidate):
+        b_norm = normalize_text(candidate)
+        seq_match = SequenceMatcher(None, self.pattern.text, b_norm).ratio()
+        return _combine(seq_match, self._overlap(b_norm), candidate)
+
+    def upper_bound(self, candidate):
+        """Never below self(candidate)."""
+        b_norm = normalize_text(candidate)
+        return _combine(self.pattern.ratio(b_norm), self._overlap(b_norm), candidate)
+
+
+def title_similarity(a: str, b: str) -> float:
+    return _Scorer(a)(b)
+
+
+def similarity_scorer(query: str):
+    """candidate -> title_similarity(query, candidate), with the query prepared once."""
+    return _Scorer(query)
+
+
+def score_many(query: str, candidates) -> list:
+    """Similarity of query against each candidate title, query prepared once.
+
+    Candidates are scored in order of their upper bound and the scan stops at
+    the first bound below the best score, so only the entries that could win
+    get the difflib ratio. The rest are None; the best score and the first
+    candidate holding it are always computed exactly.
+    """
+    candidates = list(candidates)
+    score = similarity_scorer(query)
+    bounds = [score.upper_bound(candidate) for candidate in candidates]
+    scores = [None] * len(candidates)
+    best, best_idx = -1.0, None
+    for idx in sorted(range(len(candidates)), key=lambda i: -bounds[i]):
+        if bounds[idx] < best:
+            break
+        if bounds[idx] == best and idx > best_idx:
+            continue
+        value = scores[idx] = score(candidates[idx])
+        if value > best or (value == best and idx < best_idx):
+            best, best_idx = value, idx
+    return scores
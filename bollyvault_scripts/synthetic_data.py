@@ -0,0 +1,129 @@
+import argparse
+import csv
+import os
+import random
+
+# Synthetic but realistic-looking inputs for the benchmarks: a movie list,
+# scraped video rows whose descriptions embed movie titles, and a search
+# stage output CSV for the json export.
+
+TITLE_WORDS = [
+    'dil', 'pyaar', 'ishq', 'mohabbat', 'zindagi', 'raja', 'rani', 'deewana', 'dulhania',
+    'jayenge', 'kabhi', 'khushi', 'gham', 'kuch', 'kuch', 'hota', 'hai', 'main', 'hoon',
+    'naa', 'sholay', 'sangam', 'don', 'ghayal', 'andaz', 'apna', 'mera', 'naam', 'joker',
+    'shree', 'bhagat', 'singh', 'lagaan', 'devdas', 'barsaat', 'awara', 'aandhi', 'toofan',
+    'jawani', 'diwani', 'yaarana', 'dostana', 'khiladi', 'baazigar', 'darr', 'ziddi',
+    'mr', 'india', 'hero', 'no', '1', '2', '3', 'idiots', 'october', 'china', 'town',
+]
+DEVANAGARI_WORDS = ['दिल', 'प्यार', 'ज़िंदगी', 'राजा', 'रानी', 'संगम', 'शोले', 'दीवाना', 'मोहब्बत']
+ACTORS = [
+    'Shah Rukh Khan', 'Kajol', 'Amitabh Bachchan', 'Rekha', 'Raj Kapoor', 'Nargis', 'Dharmendra',
+    'Hema Malini', 'Aamir Khan', 'Madhuri Dixit', 'Govinda', 'Karisma Kapoor', 'Rajesh Khanna',
+    'Sridevi', 'Anil Kapoor', 'Juhi Chawla', 'Sunny Deol', 'Vyjayanthimala', 'Dev Anand',
+]
+GENRES = ['Drama', 'Romance', 'Action', 'Comedy', 'Thriller', 'Musical', 'Crime', 'Family']
+FILLER = ['full movie', 'hindi movie', 'hd', 'superhit', 'bollywood', 'classic', 'blockbuster',
+          'with english subtitles', 'romantic drama', 'action movie', 'official']
+CHANNELS = [(f'UC{i:022d}', f'Channel {i}') for i in range(200)]
+
+
+def make_title(rng):
+    if rng.random() < 0.08:
+        return ' '.join(rng.sample(DEVANAGARI_WORDS, rng.randint(1, 3)))
+    return ' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 5))).title()
+
+
+def generate_movies(n, rng):
+    return [{'title': make_title(rng), 'year_of_release': rng.randint(1950, 2024)} for _ in range(n)]
+
+
+def generate_videos(movies, n, rng):
+    videos = []
+    for i in range(n):
+        parts = []
+        year = ''
+        if movies and rng.random() < 0.7:
+            movie = rng.choice(movies)
+            parts.append(movie['title'].lower())
+            if rng.random() < 0.5:
+                year = str(movie['year_of_release'] if rng.random() < 0.8 else rng.randint(1950, 2024))
+                parts.append(year)
+        parts += rng.sample(FILLER, 3)
+        parts += [a.lower() for a in rng.sample(ACTORS, 3)]
+        parts += [rng.choice(TITLE_WORDS) for _ in range(rng.randint(5, 25))]
+        normalized = ' '.join(parts)
+        videos.append({
+            'url': f'https://www.youtube.com/watch?v={i:011d}',
+            'normalized_translated_title_n_desc': normalized,
+            'year_optional': year,
+            'translated_title_n_desc': normalized.title(),
+        })
+    return videos
+
+
+def generate_search_output(movies, rng):
+    rows = []
+    for i, movie in enumerate(movies):
+        found = rng.random() < 0.8
+        channel_id, channel_name = rng.choice(CHANNELS)
+        rows.append({
+            'imdb_id': f'tt{i + 1000000:07d}',
+            'title': movie['title'],
+            'year_of_release': movie['year_of_release'],
+            'runtime': rng.choice([-1, rng.randint(80, 200)]),
+            'imdb_votes': f'{rng.randint(5, 900000):,}',
+            'genres': '|'.join(rng.sample(GENRES, rng.randint(1, 3))),
+            'directors': rng.choice(ACTORS),
+            'writers': '|'.join(rng.sample(ACTORS, 2)),
+            'actors': '|'.join(rng.sample(ACTORS, 4)),
+            'imdb_rating': round(rng.uniform(2, 9.5), 1),
+            'wins_nominations': rng.choice(['', '', '3 wins & 5 nominations']),
+            'YouTube Link': f'https://www.youtube.com/watch?v={i:011d}' if found else '',
+            'Video Title': f"{movie['title']} Full Movie HD" if found else '',
+            'Duration (HH:MM:SS)': '02:31:07' if found else '',
+            'Thumbnail': f'https://i.ytimg.com/vi/{i:011d}/hqdefault.jpg' if found else '',
+            'Channel': channel_name if found else '',
+            'Channel ID': channel_id if found else '',
+            'Channel Link': f'https://www.youtube.com/channel/{channel_id}' if found else '',
+            'Subscribers': '',
+            'Relevance': 'L' if found else '',
+            'Similarity Score': round(rng.random(), 4) if found else '',
+            'Duration Score': 1.0 if found else '',
+            'Total Score': round(rng.random(), 4) if found else '',
+            'Views': f'{rng.randint(1000, 9000000):,} views' if found else '',
+        })
+    return rows
+
+
+def write_csv(path, rows, fieldnames=None):
+    fieldnames = fieldnames or list(rows[0].keys())
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_dataset(directory, rows, seed=0, movie_ratio=0.1):
+    """Write movies.csv, videos.csv and output.csv for `rows` videos; return their paths."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    movies = generate_movies(max(1, int(rows * movie_ratio)), rng)
+    paths = {
+        'movies': os.path.join(directory, 'movies.csv'),
+        'videos': os.path.join(directory, 'videos.csv'),
+        'output': os.path.join(directory, 'output.csv'),
+    }
+    write_csv(paths['movies'], movies, ['title', 'year_of_release'])
+    write_csv(paths['videos'], generate_videos(movies, rows, rng))
+    write_csv(paths['output'], generate_search_output(movies, rng))
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic pipeline CSVs.')
+    parser.add_argument('directory')
+    parser.add_argument('--rows', type=int, default=10000, help='Number of video rows')
+    parser.add_argument('--movie-ratio', type=float, default=0.1, help='Movies per video row')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(write_dataset(args.directory, args.rows, args.seed, args.movie_ratio))
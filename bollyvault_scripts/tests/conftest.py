@@ -0,0 +1,20 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+# the scripts are flat modules imported by name, as when run from bollyvault_scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def search_script():
+    # the real package is only needed for live searches
+    if 'youtubesearchpython' not in sys.modules:
+        fake = types.ModuleType('youtubesearchpython')
+        fake.VideosSearch = fake.CustomSearch = object
+        fake.VideoDurationFilter = types.SimpleNamespace(long='long')
+        sys.modules['youtubesearchpython'] = fake
+    return importlib.import_module('search_video_full_movie_and_process_output_json')
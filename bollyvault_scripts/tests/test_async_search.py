@@ -0,0 +1,189 @@
+import asyncio
+import csv
+import random
+import sys
+import time
+
+import pytest
+
+from async_search import search_rows
+from rate_limit import TokenBucket
+from search_cache import SearchCache
+
+TITLES = [f'movie {i}' for i in range(30)]
+FAILING = {'movie 3': asyncio.TimeoutError, 'movie 11': ConnectionError, 'movie 20': KeyError}
+
+
+def custom_search_payload(title, rng):
+    # what CustomSearch(...).result() returns: a handful of long and short uploads
+    videos = []
+    for n in range(rng.randint(1, 5)):
+        channel_id = f'UC{rng.randrange(5):022d}'
+        videos.append({
+            'type': 'video',
+            'id': f'{title.replace(" ", "")}v{n}',
+            'title': rng.choice([f'{title} full movie', f'{title} {rng.randint(1950, 2020)} hd',
+                                 f'{title} songs jukebox', 'unrelated trailer']),
+            'link': f'https://www.youtube.com/watch?v={title.replace(" ", "")}v{n}',
+            'duration': rng.choice(['2:31:07', '1:58:00', '4:12', '45:30']),
+            'thumbnails': [{'url': f'https://i.ytimg.com/vi/{n}/default.jpg'},
+                           {'url': f'https://i.ytimg.com/vi/{n}/hqdefault.jpg'}],
+            'channel': {'name': f'Channel {channel_id[-1]}', 'id': channel_id},
+            'viewCount': {'text': f'{rng.randint(1, 10 ** 6)} views'},
+        })
+    return {'result': videos}
+
+
+class FakeBackend:
+    """Async search backend with CustomSearch-shaped results, random latency and chosen failures."""
+
+    def __init__(self, delays, failing=()):
+        rng = random.Random(3)
+        self.payloads = {title: custom_search_payload(title, rng) for title in TITLES}
+        self.delays = delays
+        self.failing = dict(failing)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    def title_for(self, query):
+        return next(title for title in TITLES if query.startswith(title + ' '))
+
+    async def search(self, query):
+        title = self.title_for(query)
+        self.calls.append(title)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(title, 0))
+            if title in self.failing:
+                raise self.failing[title](f'search for {title!r} failed')
+            return self.payloads[title]['result']
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def scoring(search_script):
+    def make_query(row):
+        return search_script.build_search_query(row['title'], row['year_of_release'])
+
+    def score(row, results):
+        return search_script.pick_best_video(row['title'], results)
+    return make_query, score
+
+
+def movie_rows(count=len(TITLES)):
+    return [{'imdb_id': f'tt{i}', 'title': title, 'year_of_release': '1990'} for i, title in enumerate(TITLES[:count])]
+
+
+def run(rows, backend, scoring, **kwargs):
+    make_query, score = scoring
+    seen = []
+    asyncio.run(search_rows(rows, make_query, backend.search, score,
+                            lambda idx, row, info: seen.append((idx, row['title'], info)), **kwargs))
+    return seen
+
+
+def test_output_order_and_failures_match_serial(search_script, scoring):
+    rng = random.Random(7)
+    rows = movie_rows()
+    # random delays make the searches finish out of order
+    backend = FakeBackend({title: rng.uniform(0, 0.02) for title in TITLES}, FAILING)
+    serial = [(idx, row['title'], search_script.search_youtube_noapi(row['title'], row['year_of_release'],
+                                                                     lambda q: asyncio.run(backend.search(q))))
+              for idx, row in enumerate(rows)]
+
+    seen = run(rows, backend, scoring, concurrency=8)
+    assert seen == serial
+    # the failed searches are reported as None and the rest still picked a video
+    assert [title for _, title, info in seen if info is None] == sorted(FAILING, key=TITLES.index)
+    assert all(info['link'].startswith('https://www.youtube.com/watch?v=')
+               for _, title, info in seen if title not in FAILING)
+
+
+def test_concurrency_limit(scoring):
+    rows = movie_rows()
+    backend = FakeBackend({title: 0.01 for title in TITLES})
+
+    run(rows, backend, scoring, concurrency=4)
+
+    assert backend.max_in_flight == 4
+    assert len(backend.calls) == len(rows)
+
+
+def test_rate_limit(scoring):
+    rows = movie_rows(6)
+    backend = FakeBackend({})
+
+    started = time.monotonic()
+    run(rows, backend, scoring, concurrency=6, bucket=TokenBucket(20, capacity=1))
+
+    # one token up front, then one every 1/20 s
+    assert time.monotonic() - started >= 5 / 20 - 0.01
+
+
+class FakeCustomSearch:
+    """Stands in for youtubesearchpython.CustomSearch inside custom_search_backend."""
+
+    backend = None
+
+    def __init__(self, query, search_filter, limit=10):
+        self.query = query
+
+    def result(self):
+        backend = self.backend
+        title = backend.title_for(self.query)
+        time.sleep(backend.delays.get(title, 0))
+        if title in backend.failing:
+            raise backend.failing[title](f'search for {title!r} failed')
+        return backend.payloads[title]
+
+
+def process(search_script, monkeypatch, directory, *flags):
+    directory.mkdir(exist_ok=True)
+    with open(directory / 'movies.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['imdb_id', 'title', 'year_of_release'])
+        writer.writeheader()
+        writer.writerows(movie_rows())
+    monkeypatch.setattr(sys, 'argv', ['search', str(directory / 'movies.csv'),
+                                      '--output-csv', str(directory / 'output.csv'),
+                                      '--skip-json', '--rate', '1000', '-q', *flags])
+    search_script.main()
+    with open(directory / 'output.csv', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_process_csv_with_concurrency_matches_serial(search_script, monkeypatch, tmp_path):
+    rng = random.Random(11)
+    FakeCustomSearch.backend = FakeBackend({title: rng.uniform(0, 0.01) for title in TITLES}, FAILING)
+    monkeypatch.setattr(search_script, 'CustomSearch', FakeCustomSearch)
+
+    serial = process(search_script, monkeypatch, tmp_path / 'serial')
+    concurrent = process(search_script, monkeypatch, tmp_path / 'concurrent', '--concurrency', '6')
+
+    assert concurrent == serial
+    assert [row['imdb_id'] for row in concurrent] == [row['imdb_id'] for row in movie_rows()]
+    assert {row['title'] for row in concurrent if not row['YouTube Link']} == set(FAILING)
+    assert all(row['YouTube Link'] for row in concurrent if row['title'] not in FAILING)
+
+
+def test_process_csv_with_concurrency_leaves_uncached_rows(search_script, monkeypatch, tmp_path):
+    backend = FakeBackend({})
+    for run_dir in ('serial', 'concurrent'):
+        (tmp_path / run_dir).mkdir()
+        cache = SearchCache(str(tmp_path / run_dir / 'output_search_cache.sqlite'))
+        for title in TITLES[::3]:
+            cache.put(search_script.build_search_query(title, '1990'), str(search_script.SEARCH_FILTER),
+                      backend.payloads[title]['result'])
+        cache.close()
+
+    def offline(query):
+        raise AssertionError(f"network search for {query!r}")
+    monkeypatch.setattr(search_script, 'custom_search_backend', offline)
+
+    serial = process(search_script, monkeypatch, tmp_path / 'serial', '--cache-only')
+    concurrent = process(search_script, monkeypatch, tmp_path / 'concurrent', '--cache-only', '--concurrency', '6')
+
+    assert concurrent == serial
+    assert [row['title'] for row in concurrent] == TITLES[::3]
@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+
+import pytest
+
+import checkpointed_output
+import match_movies_to_videos_algo_chatgpt as chatgpt
+import match_movies_to_videos_algo_deepseek as deepseek
+from checkpointed_output import CheckpointedCSVWriter
+from synthetic_data import write_dataset
+
+HEADER = ['idx', 'title']
+MATCHERS = {
+    'chatgpt': (chatgpt, '--main_csv', '--video_csv', '--output_csv', '--batch_rows'),
+    'deepseek': (deepseek, '--main', '--video-links', '--output', '--batch-rows'),
+}
+
+
+class Killed(Exception):
+    pass
+
+
+def kill_at_checkpoint(monkeypatch, survived):
+    # the rows of a batch are fsynced, then the process dies before its checkpoint lands
+    real_atomic_open = checkpointed_output.atomic_open
+    calls = []
+
+    def atomic_open(*args, **kwargs):
+        calls.append(args)
+        if len(calls) > survived:
+            raise Killed
+        return real_atomic_open(*args, **kwargs)
+    monkeypatch.setattr(checkpointed_output, 'atomic_open', atomic_open)
+    return calls
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def write_rows(writer, start, stop):
+    for idx in range(start, stop):
+        writer.writerow([idx, f'movie {idx}'])
+        writer.mark(idx + 1, lambda: {'seen': idx + 1})
+
+
+def test_resume_truncates_rows_after_the_checkpoint(monkeypatch, tmp_path):
+    path = str(tmp_path / 'out.csv')
+    expected = str(tmp_path / 'expected.csv')
+    writer = CheckpointedCSVWriter(expected, HEADER, batch_size=3)
+    write_rows(writer, 0, 10)
+    writer.close(10)
+
+    kill_at_checkpoint(monkeypatch, survived=2)
+    writer = CheckpointedCSVWriter(path, HEADER, batch_size=3)
+    with pytest.raises(Killed):
+        write_rows(writer, 0, 10)
+    writer._f.close()
+    # rows 6-8 reached the file, the checkpoint still says 6
+    assert read(path).count('\n') == 1 + 9
+    monkeypatch.undo()
+
+    writer = CheckpointedCSVWriter(path, HEADER, batch_size=3, resume=True)
+    assert writer.next_index == 6
+    assert writer.state == {'seen': 6}
+    assert read(path).splitlines() == read(expected).splitlines()[:7]
+    write_rows(writer, writer.next_index, 10)
+    writer.close(10)
+
+    assert read(path) == read(expected)
+    assert not os.path.exists(path + '.ckpt')
+
+
+def test_resume_without_a_checkpoint_starts_over(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('stale,output\n')
+    writer = CheckpointedCSVWriter(path, HEADER, resume=True)
+    assert (writer.next_index, writer.state) == (0, None)
+    write_rows(writer, 0, 2)
+    writer.close(2)
+    assert read(path) == 'idx,title\n0,movie 0\n1,movie 1\n'
+
+
+@pytest.mark.parametrize('matcher', sorted(MATCHERS))
+@pytest.mark.parametrize('killed_at', [0, 0.3, 0.8])
+def test_matcher_resume_equals_an_uninterrupted_run(monkeypatch, tmp_path, matcher, killed_at):
+    module, movies_flag, videos_flag, output_flag, batch_flag = MATCHERS[matcher]
+    paths = write_dataset(str(tmp_path), 1000)
+
+    def run(output, *flags):
+        monkeypatch.setattr(sys, 'argv', [matcher, movies_flag, paths['movies'], videos_flag, paths['videos'],
+                                          output_flag, output, batch_flag, '7', '-q', *flags])
+        module.main()
+
+    expected = str(tmp_path / 'expected.csv')
+    with monkeypatch.context() as patch:
+        checkpoints = kill_at_checkpoint(patch, survived=float('inf'))
+        run(expected)
+    survived = int(len(checkpoints) * killed_at)
+
+    output = str(tmp_path / 'output.csv')
+    with monkeypatch.context() as patch:
+        kill_at_checkpoint(patch, survived)
+        with pytest.raises(Killed):
+            run(output)
+    if not survived:
+        assert not os.path.exists(output + '.ckpt')
+    elif killed_at > 0.5:
+        # the killed run got rows past its last checkpoint onto disk; earlier on,
+        # deepseek is still checkpointing its best-match phase and has written none
+        with open(output + '.ckpt', encoding='utf-8') as f:
+            assert os.path.getsize(output) > json.load(f)['offset']
+    run(output, '--resume')
+
+    assert read(output) == read(expected)
+    assert not os.path.exists(output + '.ckpt')
@@ -0,0 +1,39 @@
+import json
+import pickle
+
+from fuzzy_index import FuzzyCandidates, MinHashLSH, load_or_build
+from video_store import VideoStore
+
+TEXTS = ['dilwale dulhaniya le jayenge full movie', 'kuch kuch hota hai', 'dilwale dulhania le jayenge 1995',
+         'sholay remastered', 'the dilwale story']
+
+
+def store(texts):
+    videos = VideoStore()
+    for i, text in enumerate(texts):
+        videos.append(f'https://youtu.be/{i}', text, None)
+    return videos
+
+
+def test_index_round_trips_through_plain_json(tmp_path):
+    path = str(tmp_path / 'videos.lsh')
+    built, added = load_or_build(path, TEXTS)
+    assert added == len(built) > 0
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['tokens'].keys() == built._tokens.keys()
+
+    loaded, added = load_or_build(path, TEXTS)
+    assert added == 0
+    assert loaded._buckets == built._buckets
+    fuzzy = FuzzyCandidates(store(TEXTS), loaded, threshold=0.5)
+    assert [idx for idx, _ in fuzzy.search('dilwale dulhania le jayenge')] == [0, 2]
+
+
+def test_unreadable_index_is_rebuilt(tmp_path):
+    path = tmp_path / 'videos.lsh'
+    # an index from the pickle era, and one cut off mid-write
+    for payload in (pickle.dumps({'version': 1, 'lsh': None}), b'{"version": 2, "settings": {'):
+        path.write_bytes(payload)
+        lsh, added = load_or_build(str(path), TEXTS)
+        assert added == len(lsh) > 0
+        assert isinstance(MinHashLSH.load(str(path)), MinHashLSH)
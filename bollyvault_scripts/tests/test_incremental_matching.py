@@ -0,0 +1,67 @@
+import csv
+import random
+import sys
+
+import pytest
+
+import match_movies_to_videos_algo_chatgpt as chatgpt
+import match_movies_to_videos_algo_deepseek as deepseek
+from metrics import METRICS
+from synthetic_data import write_dataset
+
+MATCHERS = {
+    'chatgpt': (chatgpt, '--main_csv', '--video_csv', '--output_csv', '--candidate_state'),
+    'deepseek': (deepseek, '--main', '--video-links', '--output', '--candidate-state'),
+}
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def write_rows(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def mutate(rows, rng, step):
+    # a daily scrape: a few videos gone, some descriptions edited, new uploads
+    rows = [dict(row) for row in rows if rng.random() > 0.01]
+    for row in rng.sample(rows, 20):
+        other = rng.choice(rows)
+        row['normalized_translated_title_n_desc'] = other['normalized_translated_title_n_desc']
+        row['year_optional'] = other['year_optional']
+    for i in range(30):
+        new = dict(rng.choice(rows), url=f'https://www.youtube.com/watch?v=new{step}x{i:06d}')
+        rows.insert(rng.randrange(len(rows) + 1), new)
+    return rows
+
+
+def run(monkeypatch, matcher, paths, output, state, *flags):
+    module, movies_flag, videos_flag, output_flag, state_flag = MATCHERS[matcher]
+    METRICS.gauges.pop('rematched_movies', None)
+    monkeypatch.setattr(sys, 'argv', [matcher, movies_flag, paths['movies'], videos_flag, paths['videos'],
+                                      output_flag, output, state_flag, state, '-q', *flags])
+    module.main()
+    return 'rematched_movies' in METRICS.gauges
+
+
+@pytest.mark.parametrize('matcher', sorted(MATCHERS))
+@pytest.mark.parametrize('flags', [[], ['--fuzzy']])
+def test_incremental_run_matches_full_run(monkeypatch, tmp_path, matcher, flags):
+    paths = write_dataset(str(tmp_path), 1500)
+    rows = read_rows(paths['videos'])
+    incremental, full = str(tmp_path / 'incremental.csv'), str(tmp_path / 'full.csv')
+    state = str(tmp_path / 'incremental.candidates')
+    assert not run(monkeypatch, matcher, paths, incremental, state, '--incremental', *flags)
+
+    rng = random.Random(5)
+    for step in range(2):
+        rows = mutate(rows, rng, step)
+        write_rows(paths['videos'], rows)
+        assert run(monkeypatch, matcher, paths, incremental, state, '--incremental', *flags)
+        run(monkeypatch, matcher, paths, full, str(tmp_path / 'full.candidates'), *flags)
+        assert read_rows(incremental) == read_rows(full)
@@ -0,0 +1,107 @@
+import json
+import os
+
+from image_manifest import load_manifest, missing_files
+from pipeline import FileHasher, Stage, fingerprint, load_state, run_pipeline
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    # FileHasher keys its memo on size and mtime; make every edit visible
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_fingerprint_covers_imported_modules(tmp_path):
+    write(tmp_path / 'stage.py', 'import json\nimport helper\n')
+    write(tmp_path / 'helper.py', 'def run():\n    from deep import value\n    return value\n')
+    write(tmp_path / 'deep.py', 'value = 1\n')
+    write(tmp_path / 'unrelated.py', 'value = 1\n')
+    write(tmp_path / 'input.csv', 'a\n1\n')
+    stage = Stage('stage', str(tmp_path / 'stage.py'), [], [str(tmp_path / 'input.csv')], [])
+    memo = {}
+    before = fingerprint(stage, FileHasher(memo))
+
+    write(tmp_path / 'unrelated.py', 'value = 2\n')
+    assert fingerprint(stage, FileHasher(memo)) == before
+    # a module imported lazily by an imported module
+    write(tmp_path / 'deep.py', 'value = 2\n')
+    assert fingerprint(stage, FileHasher(memo)) != before
+
+
+def test_dry_run_leaves_state_alone(tmp_path):
+    write(tmp_path / 'stage.py', 'raise SystemExit(1)\n')
+    write(tmp_path / 'input.csv', 'a\n1\n')
+    stage = Stage('stage', str(tmp_path / 'stage.py'), [], [str(tmp_path / 'input.csv')],
+                  [str(tmp_path / 'output.csv')])
+    state_path = str(tmp_path / 'state.json')
+
+    failed = run_pipeline([stage], load_state(state_path), state_path, dry_run=True)
+    assert failed == set()
+    assert not os.path.exists(state_path)
+
+
+IMAGES_SCRIPT = """
+import json, os, sys
+directory, manifest, runs = sys.argv[1:]
+with open(runs, 'a') as f:
+    f.write('run\\n')
+os.makedirs(directory, exist_ok=True)
+for name in ('0123456789abcdef0123.webp', '3210fedcba9876543210.webp'):
+    with open(os.path.join(directory, name), 'w') as f:
+        f.write(name)
+with open(manifest, 'w') as f:
+    json.dump({'version': 1, 'settings': None, 'images': {
+        'https://img/a.jpg': {'files': [[160, '0123456789abcdef0123.webp'], [320, '3210fedcba9876543210.webp']]}}}, f)
+"""
+
+
+def images_stage(tmp_path, **kwargs):
+    write(tmp_path / 'images.py', IMAGES_SCRIPT)
+    write(tmp_path / 'output.csv', 'poster_path\nhttps://img/a.jpg\n')
+    directory, manifest = str(tmp_path / 'img'), str(tmp_path / 'image_manifest.json')
+    return Stage('images', str(tmp_path / 'images.py'), [directory, manifest, str(tmp_path / 'runs.log')],
+                 [str(tmp_path / 'output.csv')], [manifest], **kwargs)
+
+
+def runs(tmp_path):
+    with open(tmp_path / 'runs.log', encoding='utf-8') as f:
+        return len(f.read().split())
+
+
+def test_images_stage_reruns_when_a_referenced_file_is_gone(tmp_path):
+    stage = images_stage(tmp_path, check=lambda: missing_files(
+        load_manifest(str(tmp_path / 'image_manifest.json')), str(tmp_path / 'img')))
+    state_path = str(tmp_path / 'state.json')
+    for _ in range(2):
+        assert run_pipeline([stage], load_state(state_path), state_path) == set()
+    assert runs(tmp_path) == 1
+
+    # pruned or deleted by hand: the manifest is unchanged, the copies are not
+    os.remove(tmp_path / 'img' / '3210fedcba9876543210.webp')
+    assert run_pipeline([stage], load_state(state_path), state_path) == set()
+    assert runs(tmp_path) == 2
+    assert os.path.exists(tmp_path / 'img' / '3210fedcba9876543210.webp')
+
+
+def test_stage_ttl(tmp_path):
+    state_path = str(tmp_path / 'state.json')
+    stage = images_stage(tmp_path, ttl=3600)
+    for _ in range(2):
+        run_pipeline([stage], load_state(state_path), state_path)
+    assert runs(tmp_path) == 1
+
+    # unchanged inputs, but the last run is older than the ttl
+    with open(state_path, encoding='utf-8') as f:
+        state = json.load(f)
+    state['stages']['images']['ran_at'] -= 3600
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    run_pipeline([stage], load_state(state_path), state_path)
+    assert runs(tmp_path) == 2
+
+    # a ttl of 0 never skips
+    stage.ttl = 0
+    run_pipeline([stage], load_state(state_path), state_path)
+    assert runs(tmp_path) == 3
@@ -0,0 +1,134 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import extract_imdb_posters
+from extract_imdb_posters import extract_posters, get_modified_poster_url, make_session
+from poster_cache import PosterCache
+
+PAGE = '<html><head><title>{id}</title>{meta}</head><body>{padding}</body></html>'
+
+
+class TitlePages(BaseHTTPRequestHandler):
+    # /title/<id>/ with an og:image and an ETag; a matching If-None-Match gets a 304
+    protocol_version = 'HTTP/1.1'
+    pages = {}
+    requests = []
+    connections = set()
+    body_size = 20000
+
+    def do_GET(self):
+        imdb_id = self.path.split('/')[2]
+        poster, etag = self.pages[imdb_id]
+        self.requests.append((imdb_id, self.headers.get('If-None-Match')))
+        self.connections.add(self.client_address)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        meta = f'<meta property="og:image" content="{poster}">' if poster else ''
+        body = PAGE.format(id=imdb_id, meta=meta, padding='x' * self.body_size).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def imdb(tmp_path):
+    TitlePages.pages = {}
+    TitlePages.requests = []
+    TitlePages.connections = set()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TitlePages)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    cache = PosterCache(str(tmp_path / 'posters.sqlite'))
+    yield f'http://127.0.0.1:{server.server_port}', cache
+    cache.close()
+    server.shutdown()
+    server.server_close()
+
+
+def poster(name):
+    return f'https://m.media-amazon.com/images/M/{name}._V1_FMjpg_UX1000_.jpg'
+
+
+def expire(cache, imdb_id):
+    cache._conn.execute('UPDATE posters SET fetched_at = 0 WHERE imdb_id = ?', (imdb_id,))
+
+
+def test_fresh_hit_then_304_then_200_refresh(imdb):
+    base, cache = imdb
+    url = f'{base}/title/tt0001/'
+    TitlePages.pages['tt0001'] = (poster('first'), '"v1"')
+
+    first = get_modified_poster_url(url, cache=cache)
+    assert first == 'https://m.media-amazon.com/images/M/first._V1_UX384_.jpg'
+    assert TitlePages.requests == [('tt0001', None)]
+
+    # fresh: answered from the cache without a request
+    assert get_modified_poster_url(url, cache=cache) == first
+    assert len(TitlePages.requests) == 1
+
+    # stale, page unchanged: a conditional GET, a 304 and a restarted age
+    expire(cache, 'tt0001')
+    assert get_modified_poster_url(url, cache=cache) == first
+    assert TitlePages.requests[-1] == ('tt0001', '"v1"')
+    assert cache.is_fresh(cache.get('tt0001'))
+
+    # stale, page changed: the 200 replaces poster and validators
+    TitlePages.pages['tt0001'] = (poster('second'), '"v2"')
+    expire(cache, 'tt0001')
+    assert get_modified_poster_url(url, cache=cache) == 'https://m.media-amazon.com/images/M/second._V1_UX384_.jpg'
+    assert TitlePages.requests[-1] == ('tt0001', '"v1"')
+    assert cache.get('tt0001')['etag'] == '"v2"'
+    assert cache.counts == {'fresh': 1, 'not_modified': 1, 'fetched': 2}
+
+
+def test_missing_poster_is_only_cached_briefly(imdb):
+    base, cache = imdb
+    url = f'{base}/title/tt0002/'
+    TitlePages.pages['tt0002'] = (None, '"v1"')
+    assert get_modified_poster_url(url, cache=cache) is None
+    assert get_modified_poster_url(url, cache=cache) is None
+    assert len(TitlePages.requests) == 1
+
+    # past the short negative max age the page is asked again, long before max_age
+    cache.negative_max_age = 0
+    TitlePages.pages['tt0002'] = (poster('late'), '"v2"')
+    assert get_modified_poster_url(url, cache=cache) == 'https://m.media-amazon.com/images/M/late._V1_UX384_.jpg'
+    assert TitlePages.requests[-1] == ('tt0002', '"v1"')
+    assert cache.is_fresh(cache.get('tt0002'))
+
+
+def test_extract_posters_keeps_input_order(imdb):
+    base, cache = imdb
+    urls = []
+    for i in range(12):
+        TitlePages.pages[f'tt{i:04d}'] = (poster(f'p{i}'), f'"{i}"')
+        urls.append(f'{base}/title/tt{i:04d}/')
+    found = list(extract_posters(urls, workers=4, rate=1000, cache=cache))
+    assert [url for url, _ in found] == urls
+    assert [poster_url for _, poster_url in found] == [
+        f'https://m.media-amazon.com/images/M/p{i}._V1_UX384_.jpg' for i in range(12)]
+
+
+# IMDb title pages run to a few hundred KB; a page past DRAIN_LIMIT is cut off
+# at og:image and its fetch pays for a new connection
+@pytest.mark.parametrize('body_size, connections', [(500 * 1024, 1), (4 * extract_imdb_posters.DRAIN_LIMIT, 10)])
+def test_pooled_session_reuses_the_connection(imdb, monkeypatch, body_size, connections):
+    base, _ = imdb
+    monkeypatch.setattr(TitlePages, 'body_size', body_size)
+    TitlePages.pages['tt0003'] = (poster('big'), '"v1"')
+    session = make_session(1)
+    for _ in range(10):
+        assert get_modified_poster_url(f'{base}/title/tt0003/', session=session)
+    session.close()
+    assert len(TitlePages.connections) == connections
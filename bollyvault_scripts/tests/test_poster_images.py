@@ -0,0 +1,110 @@
+import hashlib
+import os
+
+import pytest
+
+import poster_images
+from image_manifest import apply_image_manifest, load_manifest, save_manifest
+from poster_images import HASH_LENGTH, STORED_NAME_RE, prune, store_file, update_images
+
+SETTINGS = {'widths': [160, 320], 'quality': 80, 'webp': False}
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # the Pillow-less path stores source bytes as they are, so any bytes with an image magic do
+    monkeypatch.setattr(poster_images, 'Image', None)
+    source_dir = tmp_path / 'src'
+    source_dir.mkdir()
+    paths = {'a': source_dir / 'a.png', 'b': source_dir / 'b.jpg'}
+    paths['a'].write_bytes(b'\x89PNG poster a')
+    paths['b'].write_bytes(b'\xff\xd8 thumbnail b')
+    output_dir = tmp_path / 'img'
+    output_dir.mkdir()
+    # files that share the directory with the copies
+    for name in ('logo.png', 'index.html', 'deadbeef.webp', '.keep'):
+        (output_dir / name).write_text(name)
+    return paths, str(output_dir)
+
+
+def test_store_file_is_content_addressed(tmp_path):
+    first = store_file(str(tmp_path), b'\x89PNG same bytes', 'png')
+    assert store_file(str(tmp_path), b'\x89PNG same bytes', 'png') == first
+    assert STORED_NAME_RE.fullmatch(first)
+    other = store_file(str(tmp_path), b'\x89PNG other bytes', 'png')
+    assert other != first
+    # no temp files left behind
+    assert sorted(os.listdir(tmp_path)) == sorted([first, other])
+
+
+def test_update_and_prune_file_sources(sources, tmp_path):
+    paths, output_dir = sources
+    urls = [path.as_uri() for path in paths.values()]
+    manifest_path = str(tmp_path / 'image_manifest.json')
+    manifest = load_manifest(manifest_path, SETTINGS)
+
+    assert update_images(urls, manifest, output_dir, session=object())['rendered'] == 2
+    save_manifest(manifest_path, manifest)
+    stored = {url: manifest['images'][url]['files'][0][1] for url in urls}
+    assert prune(output_dir, manifest) == 0
+
+    # local sources are read every run; an unchanged hash skips the copy
+    manifest = load_manifest(manifest_path, SETTINGS)
+    assert update_images(urls, manifest, output_dir, session=object())['unchanged'] == 2
+
+    paths['a'].write_bytes(b'\x89PNG poster a, recut')
+    counts = update_images(urls, manifest, output_dir, session=object())
+    assert (counts['rendered'], counts['unchanged']) == (1, 1)
+    assert manifest['images'][urls[0]]['files'][0][1] != stored[urls[0]]
+
+    # the replaced copy goes, and so does the copy of a url no longer listed
+    del manifest['images'][urls[1]]
+    assert prune(output_dir, manifest) == 2
+    assert sorted(os.listdir(output_dir)) == sorted(
+        ['.keep', 'deadbeef.webp', 'index.html', 'logo.png', manifest['images'][urls[0]]['files'][0][1]])
+
+    records = [{'poster_path': urls[0], 'Thumbnail': 'https://i.ytimg.com/elsewhere.jpg'}]
+    assert apply_image_manifest(records, manifest) == 1
+    assert records[0]['poster_path'] == '/img/' + manifest['images'][urls[0]]['files'][0][1]
+    assert records[0]['Thumbnail'] == 'https://i.ytimg.com/elsewhere.jpg'
+
+
+def test_rendered_variants_are_webp_at_each_width(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    source_dir = tmp_path / 'src'
+    source_dir.mkdir()
+    # a 400x600 poster with an alpha channel and a 200x112 thumbnail, smaller than the largest width
+    poster, thumbnail = source_dir / 'poster.png', source_dir / 'thumbnail.jpg'
+    Image.new('RGBA', (400, 600), (200, 30, 60, 128)).save(poster, 'PNG')
+    Image.linear_gradient('L').resize((200, 112)).convert('RGB').save(thumbnail, 'JPEG')
+    urls = [poster.as_uri(), thumbnail.as_uri()]
+    output_dir = tmp_path / 'img'
+    manifest = load_manifest(str(tmp_path / 'image_manifest.json'),
+                             {'widths': [160, 320, 480], 'quality': 80, 'webp': True})
+
+    assert update_images(urls, manifest, str(output_dir), session=object())['rendered'] == 2
+
+    expected = {urls[0]: [(160, 240), (320, 480), (400, 600)], urls[1]: [(160, 90), (200, 112)]}
+    for url, sizes in expected.items():
+        files = manifest['images'][url]['files']
+        assert [width for width, _ in files] == [width for width, _ in sizes]
+        for (width, name), size in zip(files, sizes):
+            data = (output_dir / name).read_bytes()
+            assert name == hashlib.sha256(data).hexdigest()[:HASH_LENGTH] + '.webp'
+            assert STORED_NAME_RE.fullmatch(name)
+            with Image.open(output_dir / name) as image:
+                assert (image.format, image.size) == ('WEBP', size)
+    assert sorted(os.listdir(output_dir)) == sorted(name for url in urls for _, name in manifest['images'][url]['files'])
+
+    records = [{'poster_path': urls[0], 'Thumbnail': urls[1]}]
+    assert apply_image_manifest(records, manifest) == 2
+    poster_files = dict(manifest['images'][urls[0]]['files'])
+    thumbnail_files = dict(manifest['images'][urls[1]]['files'])
+    assert records[0] == {
+        'poster_path': '/img/' + poster_files[320],
+        'poster_path_srcset': f"/img/{poster_files[160]} 160w, /img/{poster_files[320]} 320w, "
+                              f"/img/{poster_files[400]} 400w",
+        # nothing reaches the default width, so the largest copy is the src
+        'Thumbnail': '/img/' + thumbnail_files[200],
+        'Thumbnail_srcset': f"/img/{thumbnail_files[160]} 160w, /img/{thumbnail_files[200]} 200w",
+    }
@@ -0,0 +1,62 @@
+import csv
+import json
+import sys
+
+from search_cache import SearchCache
+
+
+def video(title, channel_id):
+    return {'title': f'{title} full movie', 'link': f'https://youtu.be/{title.replace(" ", "_")}',
+            'duration': '2:30:00', 'thumbnails': [{'url': 'https://i.ytimg.com/t.jpg'}],
+            'channel': {'name': channel_id, 'id': channel_id}, 'viewCount': {'text': '1 view'}}
+
+
+def run(search_script, monkeypatch, tmp_path, backend, *flags):
+    monkeypatch.setattr(search_script, 'custom_search_backend', backend)
+    monkeypatch.setattr(sys, 'argv', ['search', str(tmp_path / 'movies.csv'),
+                                      '--output-csv', str(tmp_path / 'output.csv'),
+                                      '--skip-json', '--rate', '1000', '-q', *flags])
+    search_script.main()
+    with open(tmp_path / 'output.csv', newline='', encoding='utf-8') as f:
+        return [(row['imdb_id'], row['YouTube Link']) for row in csv.DictReader(f)]
+
+
+def test_cache_only_leaves_misses_for_online_runs_and_rescore(search_script, monkeypatch, tmp_path):
+    titles = [f'movie {i}' for i in range(10)]
+    with open(tmp_path / 'movies.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['imdb_id', 'title', 'year_of_release'])
+        writer.writerows([f'tt{i}', title, '1990'] for i, title in enumerate(titles))
+
+    cache = SearchCache(str(tmp_path / 'output_search_cache.sqlite'))
+    for title in titles[::2]:
+        cache.put(search_script.build_search_query(title, '1990'), str(search_script.SEARCH_FILTER),
+                  [video(title, 'UCold')])
+    cache.close()
+
+    def offline(query):
+        raise AssertionError(f"network search for {query!r}")
+
+    rows = run(search_script, monkeypatch, tmp_path, offline, '--cache-only')
+    assert rows == [(f'tt{i}', f'https://youtu.be/movie_{i}') for i in range(0, 10, 2)]
+
+    searched = []
+
+    def online(query):
+        searched.append(query)
+        title = next(t for t in titles if query.startswith(t + ' '))
+        return [video(title, 'UCnew')]
+
+    rows = run(search_script, monkeypatch, tmp_path, online)
+    assert len(searched) == 5
+    assert sorted(rows) == sorted((f'tt{i}', f'https://youtu.be/movie_{i}') for i in range(10))
+
+    # rescoring under new rules revisits every processed row, in place, without the network
+    rules = tmp_path / 'rules.json'
+    rules.write_text(json.dumps({'deny_channels': ['UCold']}))
+    before = [imdb_id for imdb_id, _ in rows]
+    rows = run(search_script, monkeypatch, tmp_path, offline, '--rescore', '--channel-rules', str(rules))
+    assert [imdb_id for imdb_id, _ in rows] == before
+    assert dict(rows) == {f'tt{i}': '' if i % 2 == 0 else f'https://youtu.be/movie_{i}' for i in range(10)}
+    # the rules applied to that run only
+    assert search_script.pick_best_video('movie 0', [video('movie 0', 'UCold')])['link'] == 'https://youtu.be/movie_0'
@@ -0,0 +1,26 @@
+import csv
+import os
+
+from search_journal import SearchJournal
+
+
+def read_ids(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['imdb_id'] for row in csv.DictReader(f)]
+
+
+def test_materialize_csv_from_overlapping_processes(tmp_path):
+    db = str(tmp_path / 'journal.sqlite')
+    output = str(tmp_path / 'output.csv')
+    first, second = SearchJournal(db), SearchJournal(db)
+    first.set_fieldnames(['imdb_id', 'title'])
+    for i in range(3):
+        first.record(f'tt{i}', {'imdb_id': f'tt{i}', 'title': f'movie {i}'})
+
+    # a sibling --batch-index process materializes while this one is still writing
+    rows = first.iter_rows
+    first.iter_rows = lambda: (second.materialize_csv(output), *rows())[1:]
+    first.materialize_csv(output)
+
+    assert read_ids(output) == ['tt0', 'tt1', 'tt2']
+    assert [name for name in os.listdir(tmp_path) if not name.startswith('journal')] == ['output.csv']
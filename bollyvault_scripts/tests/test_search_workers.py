@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+
+import pytest
+
+from search_workers import search_with_workers
+
+
+class SleepyBackend:
+    """Sync search that sleeps a random while and raises on chosen rows."""
+
+    def __init__(self, failing=(), seed=1):
+        rng = random.Random(seed)
+        self.delays = [rng.uniform(0, 0.01) for _ in range(100)]
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.threads = set()
+        self.calls = []
+
+    def search(self, row):
+        with self.lock:
+            self.calls.append(row)
+            self.threads.add(threading.get_ident())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delays[row])
+            if row in self.failing:
+                raise TimeoutError(f'search for row {row} timed out')
+            return f'video {row}'
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_results_come_back_in_input_order_despite_a_failure():
+    rows = list(range(60))
+    backend = SleepyBackend(failing={17})
+    seen = []
+
+    def on_result(idx, row, result):
+        seen.append((idx, row, result, threading.get_ident()))
+
+    search_with_workers(rows, backend.search, on_result, workers=6)
+
+    assert [(idx, row, result) for idx, row, result, _ in seen] == [
+        (row, row, None if row == 17 else f'video {row}') for row in rows]
+    # every row searched once, on the worker threads; results handed back on this one
+    assert sorted(backend.calls) == rows
+    assert 1 < backend.max_in_flight <= 6
+    assert threading.get_ident() not in backend.threads
+    assert {ident for *_, ident in seen} == {threading.get_ident()}
+
+
+def test_an_error_in_on_result_stops_the_workers():
+    rows = list(range(60))
+    backend = SleepyBackend()
+
+    def on_result(idx, row, result):
+        if idx == 5:
+            raise RuntimeError('journal is gone')
+
+    with pytest.raises(RuntimeError):
+        search_with_workers(rows, backend.search, on_result, workers=4)
+    # the workers finished the rows they held and took no new ones
+    assert len(backend.calls) < len(rows)
+    assert backend.in_flight == 0
@@ -0,0 +1,38 @@
+import sys
+
+import pytest
+
+import match_movies_to_videos_algo_chatgpt as chatgpt
+import match_movies_to_videos_algo_deepseek as deepseek
+from sharded_matching import merge_shard_candidates, shard_bounds
+from synthetic_data import write_dataset
+
+MATCHERS = {
+    'chatgpt': (chatgpt, '--main_csv', '--video_csv', '--output_csv'),
+    'deepseek': (deepseek, '--main', '--video-links', '--output'),
+}
+
+
+def test_shard_bounds_cover_the_input_in_order():
+    assert shard_bounds(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert shard_bounds(2, 8) == [(0, 1), (1, 2)]
+    assert merge_shard_candidates([{'a': [1]}, {'b': [2], 'a': [3]}]) == {'a': [1, 3], 'b': [2]}
+
+
+@pytest.mark.parametrize('matcher', sorted(MATCHERS))
+@pytest.mark.parametrize('flags', [[], ['--fuzzy']])
+def test_workers_write_the_serial_output(monkeypatch, tmp_path, matcher, flags):
+    module, movies_flag, videos_flag, output_flag = MATCHERS[matcher]
+    paths = write_dataset(str(tmp_path), 1000)
+    outputs = {}
+    for workers in (1, 2, 3):
+        outputs[workers] = tmp_path / f'workers{workers}.csv'
+        monkeypatch.setattr(sys, 'argv', [matcher, movies_flag, paths['movies'], videos_flag, paths['videos'],
+                                          output_flag, str(outputs[workers]), '--workers', str(workers),
+                                          '-q', *flags])
+        module.main()
+
+    serial = outputs[1].read_text(encoding='utf-8')
+    assert serial.count('https://www.youtube.com/') > 100
+    assert outputs[2].read_text(encoding='utf-8') == serial
+    assert outputs[3].read_text(encoding='utf-8') == serial
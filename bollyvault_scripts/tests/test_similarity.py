@@ -0,0 +1,145 @@
+import random
+
+import pytest
+
+from similarity import _Pattern, score_many, similarity_scorer, title_similarity
+from text_normalize import normalize_text
+
+WORDS = ['Yaarana', 'Kuch', 'Awara', 'Bhagat', 'Joker', 'Dil', 'Pyaar', 'Kabhi', 'Khushi', 'Gham',
+         'Dilwale', 'Dulhania', 'Le', 'Jayenge', 'Sholay', 'Deewar', 'Zanjeer', 'Don', 'Singh', 'Raja',
+         'Rani', 'Hero', 'No', '1', '2', 'Returns', 'Ki', 'Ka', 'Ek', 'Tha', 'Tiger']
+EXTRAS = ['full movie', 'Full Hindi Movie', 'HD', '(1998)', '| Superhit', 'Bollywood Movie',
+          'with English subtitles', 'हिंदी फिल्म', 'Official', '4K']
+
+
+def longest_common_substring(a, b):
+    # (i, j, k) of the longest a[i:i+k] == b[j:j+k], earliest in a, then earliest in b
+    best = (0, 0, 0)
+    previous = [0] * (len(b) + 1)
+    for i in range(len(a)):
+        current = [0] * (len(b) + 1)
+        for j in range(len(b)):
+            if a[i] == b[j]:
+                current[j + 1] = previous[j] + 1
+                k = current[j + 1]
+                start = (i - k + 1, j - k + 1, k)
+                if k > best[2] or (k == best[2] and start[:2] < best[:2]):
+                    best = start
+        previous = current
+    return best
+
+
+def ratcliff_obershelp(a, b):
+    # the ratio written out from the algorithm's definition, without difflib
+    def matches(a, b):
+        i, j, k = longest_common_substring(a, b)
+        if not k:
+            return 0
+        return k + matches(a[:i], b[:j]) + matches(a[i + k:], b[j + k:])
+    return 2.0 * matches(a, b) / (len(a) + len(b)) if a or b else 1.0
+
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for ch in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if ch == other else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def reference_similarity(a, b):
+    a_norm, b_norm = normalize_text(a), normalize_text(b)
+    a_words = set(a_norm.split())
+    overlap = len(a_words & set(b_norm.split())) / max(len(a_words), 1)
+    penalty = 0.5 if any(ord(ch) > 0xFF and not 0x900 <= ord(ch) <= 0x97F and ch.isalnum() for ch in b) else 1.0
+    return (0.7 * ratcliff_obershelp(a_norm, b_norm) + 0.3 * overlap) * penalty
+
+
+def generated_pairs(count=2000, seed=7):
+    rng = random.Random(seed)
+    pairs = [('Yaarana', 'Yaarana Kuch Awara Bhagat Joker'), ('Kuch Awara Bhagat Joker', 'Yaarana')]
+    for _ in range(count):
+        query = ' '.join(rng.sample(WORDS, rng.randint(1, 4)))
+        if rng.random() < 0.5:
+            title = query + ' ' + ' '.join(rng.sample(EXTRAS, rng.randint(0, 3)))
+        else:
+            title = ' '.join(rng.sample(WORDS, rng.randint(1, 8)) + rng.sample(EXTRAS, rng.randint(0, 2)))
+        pairs.append((query, title))
+    return pairs
+
+
+@pytest.mark.parametrize('query, title, expected', [
+    ('Sholay', 'Sholay Full Movie', 1.0),
+    # 2 * 3 / 8 of the characters, the one query word
+    ('Don', 'Don 2', 0.7 * 0.75 + 0.3),
+    # a 3-character block 'dil' out of 12 characters, both words
+    ('Dil Se', 'Se Dil', 0.7 * 0.5 + 0.3),
+    # one block: 'a' leaves nothing to match on either side, though the LCS 'ba' is 2
+    ('aba', 'bca', 0.7 / 3),
+    # foreign script halves the score
+    ('Dil', 'Dil 日本', 0.5),
+])
+def test_hand_computed_scores(query, title, expected):
+    assert title_similarity(query, title) == pytest.approx(expected)
+    assert similarity_scorer(query).upper_bound(title) >= expected
+
+
+def test_scorer_matches_an_independent_ratcliff_obershelp():
+    pairs = generated_pairs(500)
+    drift = max(abs(title_similarity(a, b) - reference_similarity(a, b)) for a, b in pairs)
+    assert drift <= 1e-9
+
+
+def test_bit_parallel_lcs_and_upper_bound_on_random_strings():
+    rng = random.Random(3)
+    for _ in range(3000):
+        a = ''.join(rng.choice('ab cdल') for _ in range(rng.randint(0, 12)))
+        b = ''.join(rng.choice('ab cdल') for _ in range(rng.randint(0, 12)))
+        assert _Pattern(a).lcs(b) == lcs_length(a, b)
+        score = similarity_scorer(a)
+        assert score.upper_bound(b) >= score(b)
+
+
+def test_scorer_matches_title_similarity_and_bound_holds():
+    scorers = {}
+    for query, title in generated_pairs():
+        score = scorers.setdefault(query, similarity_scorer(query))
+        assert score(title) == title_similarity(query, title)
+        assert score.upper_bound(title) >= score(title)
+
+
+def test_score_many_scores_the_best_exactly_and_prunes_the_rest():
+    rng = random.Random(5)
+    scored = total = 0
+    for _ in range(300):
+        query = ' '.join(rng.sample(WORDS, rng.randint(1, 3)))
+        titles = [' '.join(rng.sample(WORDS, rng.randint(1, 5)) + rng.sample(EXTRAS, rng.randint(0, 2)))
+                  for _ in range(rng.randint(1, 12))]
+        full = [title_similarity(query, title) for title in titles]
+        scores = score_many(query, titles)
+        best = max(full)
+        assert scores.index(best) == full.index(best)
+        assert all(score is None or score == exact for score, exact in zip(scores, full))
+        scored += sum(score is not None for score in scores)
+        total += len(scores)
+    assert scored < total * 0.6
+
+
+def test_pick_best_video_matches_a_full_scan(search_script):
+    rng = random.Random(11)
+    for _ in range(300):
+        query = ' '.join(rng.sample(WORDS, rng.randint(1, 3)))
+        results = []
+        for i in range(rng.randint(1, 12)):
+            title = ' '.join(rng.sample(WORDS, rng.randint(1, 5)) + rng.sample(EXTRAS, rng.randint(0, 2)))
+            seconds = rng.choice([5400, 7200, 8400, rng.randint(600, 9000)])
+            results.append({'title': title, 'link': f'https://youtu.be/{i}', 'thumbnails': [],
+                            'duration': f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}',
+                            'channel': {'id': f'UC{i}'}})
+        totals = [title_similarity(query, video['title']) * 0.8
+                  + min(search_script.parse_duration(video['duration']) / 7200, 1.0) * 0.2
+                  for video in results]
+        expected = totals.index(max(totals))
+        assert search_script.pick_best_video(query, results)['link'] == f'https://youtu.be/{expected}'
@@ -0,0 +1,79 @@
+import csv
+import sys
+
+import match_movies_to_videos_algo_chatgpt as chatgpt
+from text_normalize import title_pattern
+from title_automaton import TitleAutomaton
+
+MOVIES = [
+    ('Mr. India', 1987), ('Mr.', 1990), ('Kya Kehna!', 2000), ('(500) Days', 2009), ('Dil Se..', 1998),
+    ('Dil', 1990), ('Dilwale', 2015), ('Don', 1978), ('Don 2', 2011), ('Tiger', 2010),
+    ('Ek Tha Tiger', 2012), ('C/O Kancharapalem', 2018), ('_underscore_', 2001), ('ABCD 2', 2015),
+    ('दिल', 1990), ('दिल से', 1998), ('शोले', 1975), ('रा.वन', 2011),
+]
+VIDEOS = [
+    ('mr. india full movie 1987 hd', '1987'),
+    ('mr.india 1987', ''),
+    ('mr. indiana jones', ''),
+    ('kya kehna! hindi movie', '2000'),
+    ('kya kehna!! superhit', ''),
+    ('(500) days of summer', '2009'),
+    ('x(500) days', ''),
+    ('dil se.. 1998 full movie', '1998'),
+    ('dil se... shah rukh khan', ''),
+    ('dilwale 2015 dil', '2015'),
+    ('dil-wale dil_wale', ''),
+    ('don 2 the chase continues', '2011'),
+    ('don2 london', ''),
+    ('ek tha tiger full movie', '2012'),
+    ('tigers of the sundarbans', ''),
+    ('c/o kancharapalem telugu', '2018'),
+    ('_underscore_ test', '2001'),
+    ('a_underscore_ test', ''),
+    ('abcd 2 varun dhawan', '2015'),
+    ('abcd 23', ''),
+    ('दिल से शाहरुख़ 1998', '1998'),
+    ('दिलवाले 2015', '2015'),
+    ('शोले 1975 धर्मेंद्र', '1975'),
+    ('शोलेगीत', ''),
+    ('रा.वन शाहरुख़', '2011'),
+    ('दिल', '1990'),
+]
+
+
+def test_search_agrees_with_word_bounded_regex():
+    titles = [title.lower() for title, _ in MOVIES]
+    ac = TitleAutomaton()
+    for key, title in enumerate(titles):
+        ac.add(title, key)
+    ac.build()
+    for text, _ in VIDEOS:
+        found = {key for tid in ac.search(text) for key in ac.keys_for(tid)}
+        assert found == {key for key, title in enumerate(titles) if title_pattern(title).search(text)}, text
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def test_automaton_and_regex_engines_write_the_same_csv(monkeypatch, tmp_path):
+    movies, videos = str(tmp_path / 'movies.csv'), str(tmp_path / 'videos.csv')
+    write_csv(movies, ['title', 'year_of_release'], MOVIES)
+    write_csv(videos, ['url', 'normalized_translated_title_n_desc', 'year_optional', 'translated_title_n_desc'],
+              [(f'https://youtu.be/{i:03d}', text, year, text) for i, (text, year) in enumerate(VIDEOS)])
+
+    outputs = {}
+    for engine in ('automaton', 'regex'):
+        outputs[engine] = str(tmp_path / f'{engine}.csv')
+        monkeypatch.setattr(sys, 'argv', ['chatgpt', '--main_csv', movies, '--video_csv', videos,
+                                          '--output_csv', outputs[engine], '--engine', engine, '-q'])
+        chatgpt.main()
+
+    with open(outputs['automaton'], encoding='utf-8') as a, open(outputs['regex'], encoding='utf-8') as r:
+        automaton, regex = a.read(), r.read()
+    assert automaton == regex
+    # the fixture exercises matches, not just empty rows
+    assert automaton.count('https://youtu.be/') >= 15
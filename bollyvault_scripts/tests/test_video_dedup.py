@@ -0,0 +1,124 @@
+import hashlib
+import random
+
+import pytest
+
+from synthetic_data import generate_movies, generate_videos
+from text_normalize import TOKEN_RE
+from video_dedup import MAX_DISTANCE, MAX_TOKENS, collapse_videos, hamming, simhash, word_overlap
+from video_store import VideoStore
+
+DDLJ = 'dilwale dulhania le jayenge 1995 full movie shah rukh khan kajol amrish puri yash raj films romantic drama'
+KKHH = 'kuch kuch hota hai 1998 full movie shah rukh khan kajol rani mukerji dharma productions romantic drama'
+
+
+def reference_simhash(text):
+    # one counter per bit, no lanes
+    tokens = TOKEN_RE.findall(text)[:MAX_TOKENS]
+    counts = [0] * 64
+    for token in tokens:
+        value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        for bit in range(64):
+            counts[bit] += (value >> bit) & 1
+    return sum(1 << bit for bit in range(64) if 2 * counts[bit] > len(tokens))
+
+
+def reference_collapse(videos, mode, max_distance=MAX_DISTANCE):
+    # every earlier representative of the same year is compared, no buckets
+    members, exact, reps = [], {}, []
+    for row, (_, text, year) in enumerate(videos.rows()):
+        cluster = exact.get((year, text))
+        if cluster is None and mode == 'simhash':
+            fingerprint, words = simhash(text), set(TOKEN_RE.findall(text))
+            matches = [c for c, (rep_year, rep_fingerprint, rep_words) in enumerate(reps)
+                       if rep_year == year and hamming(rep_fingerprint, fingerprint) <= max_distance
+                       and word_overlap(words, rep_words) >= 0.8]
+            if matches:
+                cluster = exact[(year, text)] = matches[0]
+        if cluster is None:
+            cluster = exact[(year, text)] = len(members)
+            members.append([])
+            reps.append((year, simhash(text), set(TOKEN_RE.findall(text))))
+        members[cluster].append(row)
+    return members
+
+
+def store(rows):
+    videos = VideoStore()
+    for i, (text, year) in enumerate(rows):
+        videos.append(f'https://youtu.be/{i:04d}', text, year)
+    return videos
+
+
+def test_simhash_matches_a_bit_by_bit_count():
+    rng = random.Random(2)
+    words = ['dil', 'pyaar', 'hd', '1995', 'दिल', 'full', 'movie', 'x' * 40]
+    texts = ['', 'dil', 'dil dil dil', ' '.join(['hd'] * (MAX_TOKENS + 50) + ['dil'] * 10)]
+    texts += [' '.join(rng.choice(words) for _ in range(rng.randint(1, 60))) for _ in range(300)]
+    for text in texts:
+        assert simhash(text) == reference_simhash(text), text
+
+
+def test_exact_mode_needs_the_same_text_and_year():
+    videos = store([(DDLJ, 1995), (KKHH, 1998), (DDLJ, 1995), (DDLJ, None), (DDLJ + ' hd', 1995), (KKHH, 1998)])
+    clusters = collapse_videos(videos, 'exact')
+    assert clusters.members == [[0, 2], [1, 5], [3], [4]]
+    assert [clusters.videos.url(i) for i in range(len(clusters))] == [
+        'https://youtu.be/0000', 'https://youtu.be/0001', 'https://youtu.be/0003', 'https://youtu.be/0004']
+
+
+def test_reuploads_cluster_at_the_default_distance_and_other_films_stay_apart(tmp_path):
+    reuploads = [DDLJ, 'hd ' + DDLJ + ' 1080p', DDLJ.replace('kajol', 'kaajol'), DDLJ + ' official',
+                 DDLJ.replace('full movie', 'full hindi movie')]
+    others = [KKHH, KKHH + ' hd', DDLJ.replace('dilwale dulhania le jayenge', 'dil to pagal hai')]
+    assert all(hamming(simhash(DDLJ), simhash(text)) <= MAX_DISTANCE for text in reuploads)
+    videos = store([(text, 1995) for text in reuploads[:2] + others + reuploads[2:]] + [(DDLJ, 1996)])
+
+    clusters = collapse_videos(videos, 'simhash')
+
+    assert clusters.members == [[0, 1, 5, 6, 7], [2, 3], [4], [8]]
+    report = tmp_path / 'clusters.csv'
+    clusters.write_report(str(report))
+    assert report.read_text(encoding='utf-8').splitlines() == [
+        'cluster,year,size,representative_url,member_urls',
+        '0,1995,5,https://youtu.be/0000,https://youtu.be/0001 https://youtu.be/0005 '
+        'https://youtu.be/0006 https://youtu.be/0007',
+        '1,1995,2,https://youtu.be/0002,https://youtu.be/0003']
+
+
+def test_unrelated_videos_with_close_simhashes_stay_apart():
+    # two synthetic descriptions 6 bits apart that only share some stock words
+    first = ('kuch andaz barsaat devdas full movie hindi movie with english subtitles hema malini rajesh khanna '
+             'karisma kapoor hoon darr idiots china town lagaan china ishq shree khushi ghayal october raja')
+    second = ('diwani china full movie hindi movie official rajesh khanna hema malini madhuri dixit rani devdas '
+              'no ghayal lagaan idiots town ishq')
+    assert hamming(simhash(first), simhash(second)) <= MAX_DISTANCE
+
+    assert len(collapse_videos(store([(first, None), (second, None)]), 'simhash')) == 2
+    assert len(collapse_videos(store([(first, None), (second, None)]), 'simhash', min_overlap=0)) == 1
+
+
+@pytest.mark.parametrize('max_distance', [3, MAX_DISTANCE])
+def test_buckets_find_what_a_full_comparison_finds(max_distance):
+    rng = random.Random(4)
+    movies = generate_movies(200, rng)
+    rows = []
+    for video in generate_videos(movies, 2000, rng):
+        text = video['normalized_translated_title_n_desc']
+        year = int(video['year_optional']) if video['year_optional'] else None
+        rows.append((text, year))
+        if rng.random() < 0.3:
+            # a reupload with a word added or dropped
+            words = text.split()
+            if rng.random() < 0.5:
+                words.insert(rng.randrange(len(words) + 1), rng.choice(['hd', '720p', 'new', 'official']))
+            else:
+                del words[rng.randrange(len(words))]
+            rows.append((' '.join(words), year))
+    videos = store(rows)
+
+    clusters = collapse_videos(videos, 'simhash', max_distance)
+
+    assert clusters.members == reference_collapse(videos, 'simhash', max_distance)
+    assert collapse_videos(videos, 'exact').members == reference_collapse(videos, 'exact')
+    assert len(clusters) < len(videos)
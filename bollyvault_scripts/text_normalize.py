@@ -0,0 +1,94 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+# Shared, precompiled text normalization for the search and matcher scripts.
+# Every per-string helper is memoized, so repeated titles cost one lookup.
+
+FILLER_RE = re.compile(r'(full movie|hd|official|पूरी फिल्म)', re.IGNORECASE)
+NON_TEXT_RE = re.compile(r'[^a-zA-Z0-9\u0900-\u097F ]')
+DEVANAGARI_RE = re.compile(r'[\u0900-\u097F]')
+SYMBOLS_RE = re.compile(r'[♤☆♥♦♣♠•●■►▼▲►▼◄►▼►►▼◄►▼►►▼◄►▼►►▼◄►▼►►▼◄►▼》→←↑↓↔↕↨©®™°²³‰§¶¥¢£€]')
+NON_SCRIPT_RE = re.compile(r'[^\w\u0900-\u097F\s\-\|]')
+NON_CORE_RE = re.compile(r'[^\w\u0900-\u097F\s]')
+FOREIGN_RE = re.compile(r'[^\u0000-\u00FF\u0900-\u097F]')
+# the matchers' word: token index, fuzzy lookups and SimHash all split on it
+TOKEN_RE = re.compile(r'\w+')
+
+CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def transliterate_devanagari(text: str) -> str:
+    # imported lazily so the matchers do not need indic_transliteration
+    from indic_transliteration import sanscript
+    return sanscript.transliterate(text, sanscript.DEVANAGARI, sanscript.ITRANS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    text = FILLER_RE.sub('', text)
+    text = NON_TEXT_RE.sub('', text).strip()
+    if DEVANAGARI_RE.search(text):
+        text = transliterate_devanagari(text)
+    return text.lower()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def contains_foreign_script(text: str) -> bool:
+    clean_text = SYMBOLS_RE.sub('', text)
+    clean_text = NON_SCRIPT_RE.sub('', clean_text)
+    return bool(FOREIGN_RE.search(clean_text))
+
+
+def strip_non_core(text: str) -> str:
+    return NON_CORE_RE.sub('', text)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def fold_title(text: str) -> str:
+    # matcher form of a title or description: trimmed and lowercased
+    return text.strip().lower()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def title_pattern(title: str):
+    # \b ensures standalone words/spaces; escape special chars
+    return re.compile(r'\b' + re.escape(title) + r'\b')
+
+
+def build_token_index(texts):
+    # token -> ascending list of positions of the texts containing it
+    index = defaultdict(list)
+    for position, text in enumerate(texts):
+        for token in set(TOKEN_RE.findall(text)):
+            index[token].append(position)
+    return index
+
+
+def _map_distinct(func, values, missing):
+    # batch form: each distinct string is processed once per call, without
+    # pushing a whole column of one-off descriptions through the LRU caches
+    seen = {}
+    out = []
+    for value in values:
+        if not isinstance(value, str):
+            out.append(missing)
+            continue
+        result = seen.get(value)
+        if result is None:
+            result = seen[value] = func(value)
+        out.append(result)
+    return out
+
+
+def normalize_many(values, missing=''):
+    return _map_distinct(normalize_text.__wrapped__, values, missing)
+
+
+def lower_many(values, missing=''):
+    return _map_distinct(str.lower, values, missing)
+
+
+def fold_many(values, missing=''):
+    return _map_distinct(fold_title.__wrapped__, values, missing)
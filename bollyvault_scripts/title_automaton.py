@@ -0,0 +1,99 @@
+from collections import deque
+
+
+def _is_word(ch):
+    # same notion of a "word" character as re's \b for str patterns
+    return ch.isalnum() or ch == '_'
+
+
+class TitleAutomaton:
+    """Aho-Corasick automaton over many titles with \\b...\\b semantics.
+
+    One pass over a text reports every key whose title occurs in it at a
+    position where r'\\b' + re.escape(title) + r'\\b' would have matched.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]          # title ids ending exactly at this state
+        self._dict_link = [-1]    # nearest fail-ancestor with output
+        self._titles = []         # title id -> (title, starts_word, ends_word)
+        self._keys = []           # title id -> keys sharing that title
+        self._title_ids = {}
+        self._built = False
+
+    def add(self, title, key):
+        if self._built:
+            raise RuntimeError("automaton already built")
+        if not title:
+            raise ValueError("empty title cannot be matched")
+        tid = self._title_ids.get(title)
+        if tid is None:
+            tid = len(self._titles)
+            self._title_ids[title] = tid
+            self._titles.append((title, _is_word(title[0]), _is_word(title[-1])))
+            self._keys.append([])
+            state = 0
+            for ch in title:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._dict_link.append(-1)
+                state = nxt
+            self._out[state].append(tid)
+        self._keys[tid].append(key)
+
+    def build(self):
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f if f != nxt else 0
+                dict_link[nxt] = fail[nxt] if out[fail[nxt]] else dict_link[fail[nxt]]
+        self._built = True
+        return self
+
+    def search(self, text):
+        """Return the set of title ids matching somewhere in text."""
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        titles = self._titles
+        found = set()
+        state = 0
+        n = len(text)
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            s = state if out[state] else dict_link[state]
+            while s > 0:
+                for tid in out[s]:
+                    if tid in found:
+                        continue
+                    title, starts_word, ends_word = titles[tid]
+                    start = end - len(title) + 1
+                    before = _is_word(text[start - 1]) if start > 0 else False
+                    after = _is_word(text[end + 1]) if end + 1 < n else False
+                    if before != starts_word and after != ends_word:
+                        found.add(tid)
+                s = dict_link[s]
+        return found
+
+    def title(self, tid):
+        return self._titles[tid][0]
+
+    def keys_for(self, tid):
+        return self._keys[tid]
+
+    def __len__(self):
+        return len(self._titles)
@@ -0,0 +1,208 @@
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from atomic_io import atomic_open
+from columnar_io import source_signature
+
+# Columnar in-memory table of scraped videos for the matchers. Instead of one
+# dict (or pandas row) per video it keeps a few flat columns: interned url
+# ids, every matcher text back to back in one utf-8 buffer with offsets, and
+# years as int16 with a sentinel for "no year". A few million rows fit in a
+# fraction of the memory the per-row dicts took.
+
+NO_YEAR = -32768  # smallest int16, never a real year
+CHUNK_ROWS = 50000
+MAGIC = b'BVSTORE1'
+# column name -> array typecode; 'B' columns are raw utf-8 buffers
+COLUMNS = [('text', 'B'), ('offsets', 'q'), ('url_col', 'q'), ('years', 'h'),
+           ('url_text', 'B'), ('url_offsets', 'q')]
+
+
+def parse_year(value):
+    # deepseek's rule: only a plain run of digits counts
+    value = (value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def parse_numeric_year(value):
+    # chatgpt's rule: anything numeric, like pd.to_numeric(errors='coerce')
+    try:
+        year = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(year) if math.isfinite(year) else None
+
+
+class _StringColumn:
+    # read-only list of strings over a utf-8 buffer and its offsets
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        return str(self._data[self._offsets[idx]:self._offsets[idx + 1]], 'utf-8')
+
+
+def _pack_strings(values):
+    data = bytearray()
+    offsets = array('q', [0])
+    for value in values:
+        data += value.encode('utf-8')
+        offsets.append(len(data))
+    return data, offsets
+
+
+class VideoStore:
+    def __init__(self):
+        self._url_ids = {}
+        self._urls = []                # url id -> url
+        self._url_col = array('l')     # row -> url id
+        self._text = bytearray()
+        self._offsets = array('q', [0])
+        self._years = array('h')
+
+    def __len__(self):
+        return len(self._url_col)
+
+    def append(self, url, text, year=None):
+        if self._url_ids is None:
+            raise TypeError("a store loaded from disk is read-only")
+        url_id = self._url_ids.get(url)
+        if url_id is None:
+            url_id = self._url_ids[url] = len(self._urls)
+            self._urls.append(url)
+        self._url_col.append(url_id)
+        self._text += text.encode('utf-8')
+        self._offsets.append(len(self._text))
+        self._years.append(year if year is not None and NO_YEAR < year <= 32767 else NO_YEAR)
+
+    def url(self, idx):
+        return self._urls[self._url_col[idx]]
+
+    def text(self, idx):
+        return str(self._text[self._offsets[idx]:self._offsets[idx + 1]], 'utf-8')
+
+    def year(self, idx):
+        year = self._years[idx]
+        return None if year == NO_YEAR else year
+
+    def rows(self, start=0, stop=None):
+        """Yield (url, text, year) for rows [start, stop), decoding one text at a time."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for idx in range(start, stop):
+            yield self.url(idx), self.text(idx), self.year(idx)
+
+    def texts(self, start=0, stop=None):
+        return (text for _, text, _ in self.rows(start, stop))
+
+    def slice(self, start, stop):
+        # a standalone store for one shard, so workers only get their own rows
+        shard = VideoStore()
+        for url, text, year in self.rows(start, stop):
+            shard.append(url, text, year)
+        return shard
+
+    def save(self, path, meta=None):
+        """Write the columns to one file that load() can map without parsing."""
+        url_text, url_offsets = _pack_strings(self._urls)
+        columns = {
+            'text': self._text, 'offsets': self._offsets, 'url_col': array('q', self._url_col),
+            'years': self._years, 'url_text': url_text, 'url_offsets': url_offsets,
+        }
+        layout = {}
+        position = 0
+        for name, _ in COLUMNS:
+            nbytes = len(memoryview(columns[name]).cast('B'))
+            layout[name] = [position, nbytes]
+            position += nbytes + (-nbytes % 8)  # keep every column 8-byte aligned
+        header = json.dumps({'byteorder': sys.byteorder, 'rows': len(self), 'columns': layout,
+                             'meta': meta or {}}).encode('utf-8')
+        header += b' ' * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+        with atomic_open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<q', len(header)) + header)
+            for name, _ in COLUMNS:
+                data = memoryview(columns[name]).cast('B')
+                f.write(data)
+                f.write(b'\0' * (-len(data) % 8))
+
+    @classmethod
+    def load(cls, path):
+        """Map a saved store read-only; columns are views into the file, not copies."""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a video store")
+        header_len, = struct.unpack_from('<q', mapped, len(MAGIC))
+        body = len(MAGIC) + 8 + header_len
+        header = json.loads(mapped[len(MAGIC) + 8:body])
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine")
+
+        view = memoryview(mapped)
+        columns = {}
+        for name, typecode in COLUMNS:
+            start, nbytes = header['columns'][name]
+            column = view[body + start:body + start + nbytes]
+            columns[name] = column if typecode == 'B' else column.cast(typecode)
+
+        store = cls.__new__(cls)
+        store._url_ids = None
+        store._urls = _StringColumn(columns['url_text'], columns['url_offsets'])
+        store._url_col = columns['url_col']
+        store._text = columns['text']
+        store._offsets = columns['offsets']
+        store._years = columns['years']
+        store.meta = header['meta']
+        return store
+
+    @classmethod
+    def from_csv_cached(cls, csv_path, store_path, **kwargs):
+        """from_csv(), reusing store_path while the CSV and load options are unchanged."""
+        meta = {
+            'source': source_signature(csv_path),
+            'options': {key: getattr(value, '__name__', value) for key, value in sorted(kwargs.items())
+                        if key != 'chunk_rows'},
+        }
+        if os.path.exists(store_path):
+            try:
+                store = cls.load(store_path)
+            except (OSError, ValueError, KeyError):
+                store = None
+            if store is not None and store.meta == meta:
+                return store
+        store = cls.from_csv(csv_path, **kwargs)
+        store.save(store_path, meta)
+        return store
+
+    @classmethod
+    def from_csv(cls, path, text_column='normalized_translated_title_n_desc', normalize=None,
+                 year_parser=parse_year, chunk_rows=CHUNK_ROWS):
+        """Load the videos CSV chunk by chunk.
+
+        normalize(list of raw texts) -> list of matcher texts runs per chunk,
+        so only chunk_rows raw rows are ever held at once.
+        """
+        store = cls()
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            while True:
+                chunk = [(row['url'], row[text_column] or '', row['year_optional'])
+                         for _, row in zip(range(chunk_rows), reader)]
+                if not chunk:
+                    break
+                urls, texts, years = zip(*chunk)
+                if normalize is not None:
+                    texts = normalize(texts)
+                for url, text, year in zip(urls, texts, years):
+                    store.append(url, text, year_parser(year))
+        return store